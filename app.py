@@ -3,10 +3,26 @@ import os
 import requests
 import json
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
+import time
 import base64
 from io import BytesIO
+import zipfile
+import csv
+import gzip
+import bisect
+import hashlib
+import sys
+import math
+import mmap
+import array
+import heapq
+import random
+import threading
+import textwrap
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Optional imports with fallback handling
 try:
@@ -27,6 +43,12 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
 
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
 # Set page config
 st.set_page_config(
     page_title="Lawtrax Immigration Assistant",
@@ -306,13 +328,22 @@ US_VISA_CATEGORIES = {
     }
 }
 
-def extract_text_from_file(uploaded_file):
+def report_error(message, notices=None, hint=None):
+    """st.error on the script thread; worker threads pass a notices list that collects the message instead"""
+    if notices is not None:
+        notices.append(message)
+        return
+    st.error(message)
+    if hint:
+        st.info(hint)
+
+def extract_text_from_file(uploaded_file, notices=None):
     """Extract text from uploaded file with fallback handling"""
     try:
         if uploaded_file.type == "application/pdf":
             if not PDF_AVAILABLE:
-                st.error("PDF processing not available. Please install PyPDF2 or upload a TXT file instead.")
-                st.info("Alternative: Copy and paste the RFE text directly into the manual input field below.")
+                report_error("PDF processing not available. Please install PyPDF2 or upload a TXT file instead.", notices,
+                             "Alternative: Copy and paste the RFE text directly into the manual input field below.")
                 return None
             pdf_reader = PyPDF2.PdfReader(uploaded_file)
             text = ""
@@ -322,8 +353,8 @@ def extract_text_from_file(uploaded_file):
         
         elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
             if not DOCX_AVAILABLE:
-                st.error("DOCX processing not available. Please install python-docx or upload a TXT file instead.")
-                st.info("Alternative: Copy and paste the RFE text directly into the manual input field below.")
+                report_error("DOCX processing not available. Please install python-docx or upload a TXT file instead.", notices,
+                             "Alternative: Copy and paste the RFE text directly into the manual input field below.")
                 return None
             doc = docx.Document(uploaded_file)
             text = ""
@@ -335,46 +366,170 @@ def extract_text_from_file(uploaded_file):
             return str(uploaded_file.read(), "utf-8")
         
         else:
-            st.error("Unsupported file format. Please upload TXT files or copy/paste content manually.")
+            report_error("Unsupported file format. Please upload TXT files or copy/paste content manually.", notices)
             return None
             
     except Exception as e:
-        st.error(f"Error extracting text from file: {str(e)}")
-        st.info("Please try uploading a TXT file or copy/paste the content manually.")
+        report_error(f"Error extracting text from file: {str(e)}", notices,
+                     "Please try uploading a TXT file or copy/paste the content manually.")
         return None
 
-def analyze_rfe_document(rfe_text):
+RFE_ISSUE_TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rfe_issue_taxonomy.yaml")
+
+# Built-in taxonomy used when PyYAML or the taxonomy file is unavailable
+DEFAULT_RFE_ISSUE_TAXONOMY = [
+    {"label": "Specialty Occupation Requirements", "category": "H-1B",
+     "keywords": ["specialty occupation", "bachelor's degree", "job duties", "position requirements"]},
+    {"label": "Beneficiary Qualifications", "category": "H-1B",
+     "keywords": ["beneficiary", "qualifications", "education", "experience", "credentials"]},
+    {"label": "Employer-Employee Relationship", "category": "H-1B",
+     "keywords": ["employer-employee relationship", "right to control", "staffing", "client site"]},
+    {"label": "Ability to Pay", "category": "General",
+     "keywords": ["ability to pay", "financial capacity", "tax returns", "financial statements"]}
+]
+
+# Characters of context kept on each side of a keyword hit
+RFE_EVIDENCE_SNIPPET_RADIUS = 80
+RFE_MAX_EVIDENCE_PER_ISSUE = 5
+
+class IssueKeywordAutomaton:
+    """Aho-Corasick automaton over every taxonomy keyword.
+    
+    Built once per taxonomy; ``scan`` reports every keyword occurrence in a
+    single left-to-right pass, so cost grows with text length rather than
+    with the number of issue types.
+    """
+    
+    def __init__(self, taxonomy):
+        self.issues = []
+        self.keywords = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        for issue in taxonomy:
+            issue_index = len(self.issues)
+            self.issues.append({"label": issue["label"], "category": issue.get("category", "")})
+            for keyword in issue.get("keywords", []):
+                keyword = str(keyword).lower().strip()
+                if keyword:
+                    self._add_keyword(keyword, issue_index)
+        
+        self._build_failure_links()
+    
+    def _add_keyword(self, keyword, issue_index):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(len(self.keywords))
+        self.keywords.append((keyword, issue_index))
+    
+    def _build_failure_links(self):
+        # Breadth-first, so every state's failure target is finished before it;
+        # each state's transition table is then expanded into a full DFA row
+        # and scanning never has to walk failure links.
+        self.delta = [dict(self.goto[0])] + [None] * (len(self.goto) - 1)
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+            row = dict(self.delta[self.fail[state]])
+            row.update(self.goto[state])
+            self.delta[state] = row
+    
+    def scan(self, text):
+        """Return (start, end, keyword_index) for every keyword occurrence"""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Some characters expand when lowercased; keep offsets aligned with the original
+            lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        
+        delta, output, keywords = self.delta, self.output, self.keywords
+        matches = []
+        state = 0
+        for position, char in enumerate(lowered):
+            state = delta[state].get(char, 0)
+            if output[state]:
+                end = position + 1
+                for keyword_index in output[state]:
+                    matches.append((end - len(keywords[keyword_index][0]), end, keyword_index))
+        return matches
+
+def load_issue_taxonomy(path=RFE_ISSUE_TAXONOMY_PATH):
+    """Load the RFE issue taxonomy from YAML, falling back to the built-in issues"""
+    if YAML_AVAILABLE and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                taxonomy = (yaml.safe_load(handle) or {}).get("issues", [])
+            if taxonomy:
+                return taxonomy
+        except (OSError, yaml.YAMLError) as e:
+            st.warning(f"Could not load RFE issue taxonomy ({e}); using built-in issues.")
+    return DEFAULT_RFE_ISSUE_TAXONOMY
+
+@st.cache_resource(show_spinner=False)
+def get_issue_automaton(path=RFE_ISSUE_TAXONOMY_PATH):
+    """Compile the issue taxonomy once per process"""
+    return IssueKeywordAutomaton(load_issue_taxonomy(path))
+
+def classify_rfe_issues(rfe_text, automaton=None):
+    """Find every taxonomy issue in one pass, with offsets and evidence snippets"""
+    automaton = automaton or get_issue_automaton()
+    details = {}
+    
+    for start, end, keyword_index in automaton.scan(rfe_text):
+        keyword, issue_index = automaton.keywords[keyword_index]
+        detail = details.get(issue_index)
+        if detail is None:
+            detail = details[issue_index] = {
+                **automaton.issues[issue_index],
+                "match_count": 0,
+                "matches": []
+            }
+        detail["match_count"] += 1
+        if len(detail["matches"]) < RFE_MAX_EVIDENCE_PER_ISSUE:
+            snippet = rfe_text[max(0, start - RFE_EVIDENCE_SNIPPET_RADIUS):end + RFE_EVIDENCE_SNIPPET_RADIUS]
+            detail["matches"].append({
+                "keyword": keyword,
+                "start": start,
+                "end": end,
+                "snippet": re.sub(r'\s+', ' ', snippet).strip()
+            })
+    
+    return [details[index] for index in sorted(details)]
+
+def analyze_rfe_document(rfe_text, notices=None):
     """Analyze RFE document and extract key issues"""
     try:
         rfe_analysis = {
             "issues_identified": [],
+            "issue_details": [],
             "deadline_mentioned": None,
             "receipt_number": None,
             "case_type": None,
             "specific_requirements": []
         }
         
-        specialty_occupation_keywords = ["specialty occupation", "bachelor's degree", "job duties", "position requirements"]
-        beneficiary_keywords = ["beneficiary", "qualifications", "education", "experience", "credentials"]
-        employer_keywords = ["employer-employee relationship", "right to control", "staffing", "client site"]
-        ability_to_pay_keywords = ["ability to pay", "financial capacity", "tax returns", "financial statements"]
-        
-        rfe_text_lower = rfe_text.lower()
-        
-        if any(keyword in rfe_text_lower for keyword in specialty_occupation_keywords):
-            rfe_analysis["issues_identified"].append("Specialty Occupation Requirements")
-            
-        if any(keyword in rfe_text_lower for keyword in beneficiary_keywords):
-            rfe_analysis["issues_identified"].append("Beneficiary Qualifications")
-            
-        if any(keyword in rfe_text_lower for keyword in employer_keywords):
-            rfe_analysis["issues_identified"].append("Employer-Employee Relationship")
-            
-        if any(keyword in rfe_text_lower for keyword in ability_to_pay_keywords):
-            rfe_analysis["issues_identified"].append("Ability to Pay")
+        rfe_analysis["issue_details"] = classify_rfe_issues(rfe_text)
+        rfe_analysis["issues_identified"] = [issue["label"] for issue in rfe_analysis["issue_details"]]
         
         deadline_pattern = r'response.*?due.*?(\d{1,2}\/\d{1,2}\/\d{4})'
-        deadline_match = re.search(deadline_pattern, rfe_text_lower)
+        deadline_match = re.search(deadline_pattern, rfe_text, re.IGNORECASE)
         if deadline_match:
             rfe_analysis["deadline_mentioned"] = deadline_match.group(1)
         
@@ -386,65 +541,419 @@ def analyze_rfe_document(rfe_text):
         return rfe_analysis
         
     except Exception as e:
-        st.error(f"Error analyzing RFE document: {str(e)}")
+        report_error(f"Error analyzing RFE document: {str(e)}", notices)
         return None
 
-def call_openai_api(prompt, max_tokens=3000, temperature=0.2):
-    """Enhanced OpenAI API call with better error handling"""
+OPENAI_CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = "gpt-4"
+
+OPENAI_SYSTEM_MESSAGE = """You are an expert immigration attorney with extensive knowledge of US immigration law, USCIS policies, and legal precedents. Provide comprehensive, well-researched, and professionally formatted responses suitable for legal practice. Include relevant citations to statutes, regulations, case law, and USCIS guidance where appropriate. Structure your responses clearly and provide actionable legal advice."""
+
+# Streamed briefs redraw the placeholder at most this often (seconds)
+STREAM_RENDER_INTERVAL = 0.15
+
+def get_openai_api_key(notices=None):
+    """Look up and validate the OpenAI API key from secrets or environment"""
+    api_key = None
     try:
-        api_key = None
         if hasattr(st, 'secrets') and "OPENAI_API_KEY" in st.secrets:
             api_key = st.secrets["OPENAI_API_KEY"]
-        elif os.getenv("OPENAI_API_KEY"):
-            api_key = os.getenv("OPENAI_API_KEY")
-        else:
-            st.error("[ERROR] OpenAI API key not found. Please configure your API key in Streamlit secrets.")
-            return None
-        
-        if not api_key or not api_key.startswith('sk-'):
-            st.error("[ERROR] Invalid API key format. Please check your configuration.")
+    except Exception:
+        # No secrets.toml present; fall back to the environment
+        pass
+    
+    if not api_key and os.getenv("OPENAI_API_KEY"):
+        api_key = os.getenv("OPENAI_API_KEY")
+    elif not api_key:
+        report_error("[ERROR] OpenAI API key not found. Please configure your API key in Streamlit secrets.", notices)
+        return None
+    
+    if not api_key or not api_key.startswith('sk-'):
+        report_error("[ERROR] Invalid API key format. Please check your configuration.", notices)
+        return None
+    
+    return api_key
+
+def build_chat_request(api_key, prompt, max_tokens, temperature, stream=False):
+    """Build headers and JSON body for a chat completions request"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    
+    data = {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": OPENAI_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    if stream:
+        data["stream"] = True
+        # Usage arrives in a final chunk with empty choices
+        data["stream_options"] = {"include_usage": True}
+    
+    return headers, data
+
+def record_api_call_metrics(metrics):
+    """Keep per-call latency numbers in the session for display"""
+    try:
+        if 'api_call_metrics' not in st.session_state:
+            st.session_state.api_call_metrics = []
+        st.session_state.api_call_metrics.append(dict(metrics))
+        del st.session_state.api_call_metrics[:-50]
+    except Exception:
+        # Worker threads have no session; the caller still holds its metrics dict
+        pass
+
+# Shared by every worker pool (RFE windows, batch documents, letter sections) so
+# nested pools cannot multiply the number of requests in flight
+OPENAI_MAX_CONCURRENT_CALLS = 8
+OPENAI_CALL_SLOTS = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENT_CALLS)
+
+def call_openai_api(prompt, max_tokens=3000, temperature=0.2, metrics=None, call_label="openai", notices=None):
+    """Enhanced OpenAI API call with better error handling.
+    
+    Worker threads pass ``notices`` (a list) to collect errors instead of
+    calling st.error, which has no effect outside the script thread.
+    """
+    if metrics is None:
+        metrics = {}
+    metrics.update({
+        "label": call_label,
+        "streamed": False,
+        "time_to_first_token": None,
+        "total_latency": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+    
+    try:
+        api_key = get_openai_api_key(notices)
+        if not api_key:
+            metrics["error"] = "OpenAI API key not configured"
             return None
         
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        system_message = """You are an expert immigration attorney with extensive knowledge of US immigration law, USCIS policies, and legal precedents. Provide comprehensive, well-researched, and professionally formatted responses suitable for legal practice. Include relevant citations to statutes, regulations, case law, and USCIS guidance where appropriate. Structure your responses clearly and provide actionable legal advice."""
+        headers, data = build_chat_request(api_key, prompt, max_tokens, temperature)
         
-        data = {
-            "model": "gpt-4",
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=120
-        )
+        with OPENAI_CALL_SLOTS:
+            start_time = time.perf_counter()
+            response = requests.post(
+                OPENAI_CHAT_COMPLETIONS_URL,
+                headers=headers,
+                json=data,
+                timeout=120
+            )
+        metrics["total_latency"] = time.perf_counter() - start_time
+        # Without streaming the first token only arrives with the full body
+        metrics["time_to_first_token"] = metrics["total_latency"]
         
         if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
+            result = response.json()
+            usage = result.get("usage", {})
+            metrics["prompt_tokens"] = usage.get("prompt_tokens")
+            metrics["completion_tokens"] = usage.get("completion_tokens")
+            record_api_call_metrics(metrics)
+            return result["choices"][0]["message"]["content"]
         else:
-            st.error(f"API Error: {response.status_code} - {response.text}")
+            metrics["error"] = f"API Error: {response.status_code}"
+            report_error(f"API Error: {response.status_code} - {response.text}", notices)
             return None
             
     except Exception as e:
-        st.error(f"Error calling OpenAI API: {str(e)}")
+        metrics["error"] = str(e)
+        report_error(f"Error calling OpenAI API: {str(e)}", notices)
+        return None
+
+def stream_openai_api(prompt, max_tokens=3000, temperature=0.2, metrics=None, call_label="openai", notices=None):
+    """Stream a chat completion, yielding content deltas as the server sends them.
+    
+    Time-to-first-token and total latency are written into ``metrics`` (and the
+    session's call log) once the stream is exhausted or closed. The stream holds
+    one OPENAI_CALL_SLOTS slot until then; ``notices`` works as in call_openai_api.
+    """
+    if metrics is None:
+        metrics = {}
+    metrics.update({
+        "label": call_label,
+        "streamed": True,
+        "time_to_first_token": None,
+        "total_latency": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "chunks": 0,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+    
+    api_key = get_openai_api_key(notices)
+    if not api_key:
+        metrics["error"] = "OpenAI API key not configured"
+        return
+    
+    headers, data = build_chat_request(api_key, prompt, max_tokens, temperature, stream=True)
+    
+    start_time = time.perf_counter()
+    try:
+        with OPENAI_CALL_SLOTS:
+            # Latency is measured from when the call gets a slot, as in call_openai_api
+            start_time = time.perf_counter()
+            with requests.post(
+                OPENAI_CHAT_COMPLETIONS_URL,
+                headers=headers,
+                json=data,
+                stream=True,
+                timeout=(10, 120)
+            ) as response:
+                if response.status_code != 200:
+                    metrics["error"] = f"API Error: {response.status_code}"
+                    report_error(f"API Error: {response.status_code} - {response.text}", notices)
+                    return
+            
+                for raw_line in response.iter_lines():
+                    if not raw_line:
+                        continue
+                    line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                
+                    try:
+                        chunk = json.loads(payload)
+                    except json.JSONDecodeError:
+                        continue
+                
+                    usage = chunk.get("usage")
+                    if usage:
+                        metrics["prompt_tokens"] = usage.get("prompt_tokens")
+                        metrics["completion_tokens"] = usage.get("completion_tokens")
+                
+                    choices = chunk.get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        if metrics["time_to_first_token"] is None:
+                            metrics["time_to_first_token"] = time.perf_counter() - start_time
+                        metrics["chunks"] += 1
+                        yield delta
+                    
+    except Exception as e:
+        metrics["error"] = str(e)
+        report_error(f"Error calling OpenAI API: {str(e)}", notices)
+    finally:
+        metrics["total_latency"] = time.perf_counter() - start_time
+        record_api_call_metrics(metrics)
+
+def render_streamed_response(chunks, header_html=""):
+    """Render a streamed response incrementally and return the full text"""
+    placeholder = st.empty()
+    parts = []
+    last_render = 0.0
+    
+    for delta in chunks:
+        parts.append(delta)
+        now = time.perf_counter()
+        if now - last_render >= STREAM_RENDER_INTERVAL:
+            placeholder.markdown("".join(parts) + " ▌")
+            last_render = now
+    
+    response = "".join(parts)
+    if not response:
+        placeholder.empty()
         return None
+    
+    placeholder.markdown(f"""
+    <div class="professional-card">
+        {header_html}{response}
+    </div>
+    """, unsafe_allow_html=True)
+    return response
+
+def format_latency_caption(metrics):
+    """One-line latency summary for a completed API call"""
+    if not metrics or metrics.get("total_latency") is None:
+        return ""
+    
+    caption = f"[LATENCY] Total: {metrics['total_latency']:.1f}s"
+    if metrics.get("streamed") and metrics.get("time_to_first_token") is not None:
+        caption = f"[LATENCY] First token: {metrics['time_to_first_token']:.2f}s | Total: {metrics['total_latency']:.1f}s"
+    if metrics.get("completion_tokens"):
+        caption += f" | Output tokens: {metrics['completion_tokens']}"
+    if metrics.get("full_history_tokens"):
+        caption += (f" | Session context: ~{metrics['context_tokens']:,} tokens"
+                    f" (full history would be ~{metrics['full_history_tokens']:,})")
+    if metrics.get("templated"):
+        caption += f" | {metrics['slot_count']} analysis slots filled in parallel (slowest {metrics['slowest_slot']:.1f}s)"
+        if metrics.get("failed_slots"):
+            caption += f" | Failed: {', '.join(metrics['failed_slots'])}"
+    if metrics.get("sectioned"):
+        caption += (f" | Outline: {metrics['outline_latency'] or 0.0:.1f}s"
+                    f" | {len(EXPERT_LETTER_SECTIONS)} sections in parallel: {metrics['section_wall_time']:.1f}s"
+                    f" (slowest {metrics['slowest_section']:.1f}s)")
+        if metrics.get("failed_sections"):
+            caption += f" | Failed: {', '.join(metrics['failed_sections'])}"
+    if metrics.get("map_windows"):
+        caption += f" | Analyzed {metrics['map_windows']} document sections in {metrics['map_wall_time']:.1f}s"
+        if metrics.get("map_failed_windows"):
+            caption += f" ({metrics['map_failed_windows']} failed)"
+    return caption
+
+# Long RFEs are analyzed in overlapping windows (map) and the compact findings
+# are handed to a single brief-drafting call (reduce)
+RFE_CHUNK_CHARS = 6000
+RFE_CHUNK_OVERLAP = 600
+RFE_MAP_MAX_WORKERS = 8
+RFE_MAP_MAX_TOKENS = 700
+
+RFE_FINDING_KEYS = ["issues", "evidence_requested", "citations", "deadlines"]
 
-def generate_rfe_response_from_document(rfe_text, visa_category, case_details):
-    """Generate comprehensive RFE response based on uploaded document"""
-    rfe_analysis = analyze_rfe_document(rfe_text)
+def split_rfe_into_windows(rfe_text, window_chars=RFE_CHUNK_CHARS, overlap_chars=RFE_CHUNK_OVERLAP):
+    """Split RFE text into overlapping windows that end on paragraph or line breaks"""
+    windows = []
+    text_length = len(rfe_text)
+    start = 0
+    
+    while start < text_length:
+        end = min(start + window_chars, text_length)
+        if end < text_length:
+            # Prefer breaking at a paragraph, then a line, in the last fifth of the window
+            floor = start + int(window_chars * 0.8)
+            for separator in ("\n\n", "\n", ". "):
+                cut = rfe_text.rfind(separator, floor, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        
+        windows.append({
+            "index": len(windows),
+            "start": start,
+            "end": end,
+            "text": rfe_text[start:end]
+        })
+        
+        if end >= text_length:
+            break
+        start = max(end - overlap_chars, start + 1)
+    
+    return windows
+
+def parse_json_object(content):
+    """Pull the first JSON object out of a model response"""
+    if not content or "{" not in content:
+        return None
+    try:
+        return json.loads(content[content.find("{"):content.rfind("}") + 1])
+    except json.JSONDecodeError:
+        return None
+
+def extract_rfe_window_findings(window, total_windows):
+    """Map step: extract issues and evidence requests from one RFE window"""
+    prompt = f"""
+    You are reviewing section {window['index'] + 1} of {total_windows} of a USCIS Request for Evidence.
+    Extract only what this section actually says. Return JSON only, with short phrases:
+
+    {{
+        "issues": ["each deficiency or eligibility issue USCIS raises"],
+        "evidence_requested": ["each specific document or evidence item requested"],
+        "citations": ["each statute, regulation or precedent cited, e.g. 8 CFR 214.2(h)(4)(iii)(A)"],
+        "deadlines": ["any response deadline stated"]
+    }}
+
+    RFE SECTION:
+    {window['text']}
+    """
+    
+    call_metrics = {}
+    content = call_openai_api(prompt, max_tokens=RFE_MAP_MAX_TOKENS, temperature=0.0,
+                              metrics=call_metrics, call_label="rfe_map", notices=[])
+    findings = parse_json_object(content) or {}
+    
+    return {
+        "index": window["index"],
+        "findings": {key: [str(item) for item in findings.get(key, []) if item] for key in RFE_FINDING_KEYS},
+        "latency": call_metrics.get("total_latency"),
+        "tokens": (call_metrics.get("prompt_tokens") or 0) + (call_metrics.get("completion_tokens") or 0),
+        "error": call_metrics.get("error") or (None if content else "Empty response")
+    }
+
+def merge_rfe_findings(window_results):
+    """Combine per-window findings in document order, dropping duplicates from overlaps"""
+    merged = {key: [] for key in RFE_FINDING_KEYS}
+    seen = {key: set() for key in RFE_FINDING_KEYS}
+    
+    for result in sorted(window_results, key=lambda r: r["index"]):
+        for key in RFE_FINDING_KEYS:
+            for item in result["findings"].get(key, []):
+                normalized = re.sub(r'\W+', ' ', item.lower()).strip()
+                if normalized and normalized not in seen[key]:
+                    seen[key].add(normalized)
+                    merged[key].append(item.strip())
+    
+    return merged
+
+def analyze_rfe_in_windows(rfe_text, max_workers=RFE_MAP_MAX_WORKERS):
+    """Run the map step over every window concurrently with a bounded worker pool"""
+    windows = split_rfe_into_windows(rfe_text)
+    start_time = time.perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(windows)))) as executor:
+        window_results = list(executor.map(
+            lambda window: extract_rfe_window_findings(window, len(windows)),
+            windows
+        ))
+    
+    return {
+        "windows": len(windows),
+        "failed_windows": sum(1 for r in window_results if r["error"]),
+        "wall_time": time.perf_counter() - start_time,
+        "slowest_window": max((r["latency"] or 0.0 for r in window_results), default=0.0),
+        "tokens": sum(r["tokens"] for r in window_results),
+        "findings": merge_rfe_findings(window_results)
+    }
+
+def format_rfe_findings(findings):
+    """Render merged window findings as a compact prompt section"""
+    headings = {
+        "issues": "ISSUES RAISED",
+        "evidence_requested": "EVIDENCE REQUESTED",
+        "citations": "AUTHORITIES CITED",
+        "deadlines": "DEADLINES"
+    }
+    sections = []
+    for key in RFE_FINDING_KEYS:
+        if findings.get(key):
+            sections.append(headings[key] + ":\n" + "\n".join(f"- {item}" for item in findings[key]))
+    return "\n\n".join(sections)
+
+def generate_rfe_response_from_document(rfe_text, visa_category, case_details, stream=False, metrics=None,
+                                        rfe_analysis=None, notices=None):
+    """Generate comprehensive RFE response based on uploaded document.
+    
+    Pass an existing ``rfe_analysis`` to skip re-analysis, and ``notices`` from
+    worker threads to collect errors instead of showing them.
+    """
+    rfe_analysis = rfe_analysis or analyze_rfe_document(rfe_text, notices)
     
     if not rfe_analysis:
-        return "Error analyzing RFE document. Please check the file and try again."
+        message = "Error analyzing RFE document. Please check the file and try again."
+        return iter([message]) if stream else message
+    
+    if len(rfe_text) > RFE_CHUNK_CHARS:
+        window_analysis = analyze_rfe_in_windows(rfe_text)
+        if metrics is not None:
+            metrics["map_windows"] = window_analysis["windows"]
+            metrics["map_failed_windows"] = window_analysis["failed_windows"]
+            metrics["map_wall_time"] = window_analysis["wall_time"]
+            metrics["map_tokens"] = window_analysis["tokens"]
+        
+        document_section = f"""RFE FINDINGS (extracted from all {window_analysis['windows']} sections of the {len(rfe_text):,}-character document):
+    {format_rfe_findings(window_analysis['findings']) or 'No findings could be extracted; rely on the issues identified above.'}"""
+    else:
+        document_section = f"""RFE DOCUMENT CONTENT:
+    {rfe_text}"""
     
     prompt = f"""
     As an expert immigration attorney, provide a comprehensive RFE response based on the following uploaded RFE document and case details.
@@ -461,8 +970,7 @@ def generate_rfe_response_from_document(rfe_text, visa_category, case_details):
     - Beneficiary: {case_details.get('beneficiary', 'Not specified')}
     - Position: {case_details.get('position', 'Not specified')}
 
-    RFE DOCUMENT CONTENT:
-    {rfe_text[:4000]}
+    {document_section}
 
     Please provide a comprehensive legal response that:
 
@@ -484,15 +992,667 @@ def generate_rfe_response_from_document(rfe_text, visa_category, case_details):
     Ensure the response is comprehensive, well-cited, and addresses all concerns raised in the RFE.
     """
     
-    return call_openai_api(prompt, max_tokens=4000, temperature=0.2)
+    if stream:
+        return stream_openai_api(prompt, max_tokens=4000, temperature=0.2, metrics=metrics, call_label="rfe_response")
+    return call_openai_api(prompt, max_tokens=4000, temperature=0.2, metrics=metrics, call_label="rfe_response",
+                           notices=notices)
+
+# Batch mode: a ZIP or directory of RFE notices processed through a bounded pool.
+# API calls from every document share OPENAI_CALL_SLOTS with their map windows.
+RFE_BATCH_MAX_WORKERS = 4
+RFE_BATCH_MAX_FILES = 200
+RFE_BATCH_MAX_FILE_BYTES = 25 * 1024 * 1024
+RFE_BATCH_MAX_TOTAL_BYTES = 200 * 1024 * 1024
+# Server directories can only be batch-processed below this root (unset disables directory input)
+RFE_BATCH_ROOT = os.getenv("RFE_BATCH_ROOT", "")
+RFE_BATCH_FILE_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain"
+}
+
+class BatchRFEFile(BytesIO):
+    """In-memory RFE file with the name/type attributes extract_text_from_file expects"""
+    
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.type = RFE_BATCH_FILE_TYPES[os.path.splitext(name)[1].lower()]
+
+def resolve_rfe_batch_directory(directory, root=RFE_BATCH_ROOT):
+    """Real path of a batch directory inside the configured root, or ValueError"""
+    if not root:
+        raise ValueError("Directory batches are disabled (set RFE_BATCH_ROOT to enable them)")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Directory must be inside {root}")
+    if not os.path.isdir(path):
+        raise ValueError(f"Directory not found: {directory}")
+    return path
+
+def collect_rfe_batch_files(zip_file=None, directory=None):
+    """Gather supported RFE files from an uploaded ZIP archive or a directory under RFE_BATCH_ROOT.
+    
+    Raises ValueError when the batch exceeds RFE_BATCH_MAX_FILES, a file exceeds
+    RFE_BATCH_MAX_FILE_BYTES or the total exceeds RFE_BATCH_MAX_TOTAL_BYTES.
+    """
+    batch_files = []
+    total_bytes = [0]
+    
+    def add_file(name, size, read):
+        if len(batch_files) >= RFE_BATCH_MAX_FILES:
+            raise ValueError(f"Batches are limited to {RFE_BATCH_MAX_FILES} documents")
+        if size > RFE_BATCH_MAX_FILE_BYTES:
+            raise ValueError(f"{name} is larger than {RFE_BATCH_MAX_FILE_BYTES // (1024 * 1024)} MB")
+        # Read one byte past the limit so a size header that lies is still caught
+        data = read(RFE_BATCH_MAX_FILE_BYTES + 1)
+        if len(data) > RFE_BATCH_MAX_FILE_BYTES:
+            raise ValueError(f"{name} is larger than {RFE_BATCH_MAX_FILE_BYTES // (1024 * 1024)} MB")
+        total_bytes[0] += len(data)
+        if total_bytes[0] > RFE_BATCH_MAX_TOTAL_BYTES:
+            raise ValueError(f"Batches are limited to {RFE_BATCH_MAX_TOTAL_BYTES // (1024 * 1024)} MB in total")
+        batch_files.append(BatchRFEFile(name, data))
+    
+    if zip_file is not None:
+        with zipfile.ZipFile(zip_file) as archive:
+            for member in archive.infolist():
+                base_name = os.path.basename(member.filename)
+                if member.is_dir() or member.filename.startswith("__MACOSX") or base_name.startswith("."):
+                    continue
+                if os.path.splitext(base_name)[1].lower() in RFE_BATCH_FILE_TYPES:
+                    with archive.open(member) as handle:
+                        add_file(member.filename, member.file_size, handle.read)
+    
+    if directory:
+        directory = resolve_rfe_batch_directory(directory)
+        for root, _, file_names in os.walk(directory):
+            for file_name in sorted(file_names):
+                if file_name.startswith(".") or os.path.splitext(file_name)[1].lower() not in RFE_BATCH_FILE_TYPES:
+                    continue
+                file_path = os.path.join(root, file_name)
+                with open(file_path, "rb") as handle:
+                    add_file(os.path.relpath(file_path, directory), os.path.getsize(file_path), handle.read)
+    
+    return batch_files
+
+def process_batch_rfe_file(rfe_file, visa_category, case_details):
+    """Extract, analyze and draft a response for one RFE in the batch"""
+    result = {
+        "document": rfe_file.name,
+        "receipt_number": None,
+        "deadline": None,
+        "issues": [],
+        "characters": 0,
+        "latency": None,
+        "tokens": 0,
+        "response": None,
+        "error": None
+    }
+    start_time = time.perf_counter()
+    # Runs on a worker thread: errors are collected here rather than shown with st.error
+    notices = []
+    
+    try:
+        rfe_text = extract_text_from_file(rfe_file, notices=notices)
+        if not rfe_text or not rfe_text.strip():
+            result["error"] = notices[0] if notices else "No text could be extracted"
+            return result
+        
+        result["characters"] = len(rfe_text)
+        rfe_analysis = analyze_rfe_document(rfe_text, notices=notices)
+        if not rfe_analysis:
+            result["error"] = notices[0] if notices else "RFE analysis failed"
+            return result
+        result["receipt_number"] = rfe_analysis.get("receipt_number")
+        result["deadline"] = rfe_analysis.get("deadline_mentioned")
+        result["issues"] = rfe_analysis.get("issues_identified", [])
+        
+        call_metrics = {}
+        result["response"] = generate_rfe_response_from_document(rfe_text, visa_category, case_details, metrics=call_metrics,
+                                                                 rfe_analysis=rfe_analysis, notices=notices)
+        result["tokens"] = sum(call_metrics.get(key) or 0 for key in ("prompt_tokens", "completion_tokens", "map_tokens"))
+        if not result["response"]:
+            result["error"] = notices[-1] if notices else call_metrics.get("error", "Response generation failed")
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        result["latency"] = time.perf_counter() - start_time
+    
+    return result
+
+def run_rfe_batch(batch_files, visa_category, case_details, max_workers=RFE_BATCH_MAX_WORKERS, on_result=None):
+    """Process every RFE through a bounded worker pool, reporting each as it finishes"""
+    results = [None] * len(batch_files)
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(process_batch_rfe_file, rfe_file, visa_category, case_details): index
+            for index, rfe_file in enumerate(batch_files)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if on_result:
+                on_result(results[index], sum(1 for r in results if r is not None), len(batch_files))
+    
+    return results
+
+def build_rfe_batch_summary(results):
+    """Summary table for a processed batch"""
+    return pd.DataFrame([
+        {
+            "Document": r["document"],
+            "Receipt Number": r["receipt_number"] or "",
+            "Deadline": r["deadline"] or "",
+            "Issues": "; ".join(r["issues"]),
+            "Latency (s)": round(r["latency"] or 0.0, 1),
+            "Tokens": r["tokens"],
+            "Status": "Error: " + r["error"] if r["error"] else "Drafted"
+        }
+        for r in results
+    ])
+
+def build_rfe_batch_bundle(results, visa_category):
+    """Zip the summary CSV and every drafted response into one download"""
+    bundle = BytesIO()
+    generated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("summary.csv", build_rfe_batch_summary(results).to_csv(index=False))
+        for r in results:
+            if not r["response"]:
+                continue
+            stem = re.sub(r'[^A-Za-z0-9_.-]+', '_', os.path.splitext(r["document"])[0]).strip("_")
+            archive.writestr(
+                f"responses/{r['receipt_number'] or stem}_{stem}_response.txt",
+                f"""LAWTRAX IMMIGRATION SERVICES
+RFE RESPONSE - {visa_category}
+{'='*80}
+
+Source Document: {r['document']}
+Receipt Number: {r['receipt_number'] or 'Not found'}
+Deadline: {r['deadline'] or 'Not found'}
+
+{r['response']}
+
+Generated: {generated}"""
+            )
+    
+    return bundle.getvalue()
+
+# Case docket: every analyzed RFE with a receipt number is upserted into a
+# local SQLite database so response deadlines are not lost between sessions
+DOCKET_DB_PATH = os.getenv(
+    "LAWTRAX_DOCKET_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "docket.db")
+)
+DOCKET_STATUSES = ["open", "filed", "closed"]
+DOCKET_COLUMNS = [
+    "receipt_number", "deadline", "visa_category", "petitioner", "beneficiary",
+    "position", "issues", "source_document"
+]
+
+DOCKET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docket_cases (
+    id INTEGER PRIMARY KEY,
+    receipt_number TEXT NOT NULL,
+    deadline TEXT,
+    visa_category TEXT,
+    petitioner TEXT,
+    beneficiary TEXT,
+    position TEXT,
+    issues TEXT,
+    source_document TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_docket_receipt ON docket_cases (receipt_number);
+CREATE INDEX IF NOT EXISTS idx_docket_status_deadline ON docket_cases (status, deadline);
+"""
+
+# Later analyses fill in fields without erasing what an earlier one found
+DOCKET_UPSERT_SQL = f"""
+INSERT INTO docket_cases ({", ".join(DOCKET_COLUMNS)}, created_at, updated_at)
+VALUES ({", ".join(":" + column for column in DOCKET_COLUMNS)}, :now, :now)
+ON CONFLICT (receipt_number) DO UPDATE SET
+    {", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in DOCKET_COLUMNS[1:])},
+    updated_at = excluded.updated_at
+"""
+
+def open_docket(db_path=DOCKET_DB_PATH):
+    """Connection to the docket database, creating the schema on first use"""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(DOCKET_SCHEMA)
+    return conn
+
+def normalize_docket_deadline(value):
+    """ISO date string (sortable in the index) from a date or an MM/DD/YYYY string"""
+    if not value:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()[:10]
+    for date_format in ("%m/%d/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(value).strip(), date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def build_docket_record(receipt_number, deadline=None, issues=None, **details):
+    """Docket row for one case; None when there is no receipt number to key it on"""
+    if not receipt_number or not str(receipt_number).strip():
+        return None
+    record = {column: None for column in DOCKET_COLUMNS}
+    record.update({key: value or None for key, value in details.items() if key in DOCKET_COLUMNS})
+    record["receipt_number"] = str(receipt_number).strip().upper()
+    record["deadline"] = normalize_docket_deadline(deadline)
+    record["issues"] = "; ".join(issues) if issues else None
+    return record
+
+def upsert_docket_cases(records, db_path=DOCKET_DB_PATH):
+    """Insert or update many cases in a single transaction; returns the count written"""
+    records = [record for record in records if record]
+    if not records:
+        return 0
+    now = datetime.now().isoformat(timespec="seconds")
+    conn = open_docket(db_path)
+    try:
+        with conn:
+            conn.executemany(DOCKET_UPSERT_SQL, [dict(record, now=now) for record in records])
+    finally:
+        conn.close()
+    return len(records)
+
+def record_rfe_in_docket(rfe_analysis, db_path=DOCKET_DB_PATH, **details):
+    """Docket the receipt number and deadline pulled out by analyze_rfe_document"""
+    if not rfe_analysis:
+        return 0
+    try:
+        return upsert_docket_cases([build_docket_record(
+            rfe_analysis.get("receipt_number"),
+            deadline=rfe_analysis.get("deadline_mentioned"),
+            issues=rfe_analysis.get("issues_identified"),
+            **details
+        )], db_path)
+    except sqlite3.Error as e:
+        st.warning(f"Could not update the case docket: {e}")
+        return 0
+
+def import_rfe_batch_into_docket(results, db_path=DOCKET_DB_PATH, **details):
+    """Bulk-docket every batch result that carried a receipt number"""
+    return upsert_docket_cases([
+        build_docket_record(
+            r["receipt_number"],
+            deadline=r["deadline"],
+            issues=r["issues"],
+            source_document=r["document"],
+            **details
+        )
+        for r in results
+    ], db_path)
+
+def get_upcoming_deadlines(limit=25, status="open", db_path=DOCKET_DB_PATH):
+    """Priority queue of cases by earliest deadline, overdue first.
+    
+    The (status, deadline) index returns rows already in deadline order, so
+    this reads only ``limit`` rows however large the docket grows.
+    """
+    conn = open_docket(db_path)
+    try:
+        rows = conn.execute(
+            """SELECT * FROM docket_cases
+               WHERE status = ? AND deadline IS NOT NULL
+               ORDER BY deadline LIMIT ?""",
+            (status, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    
+    today = datetime.now().date()
+    cases = []
+    for row in rows:
+        case = dict(row)
+        case["days_remaining"] = (datetime.strptime(case["deadline"], "%Y-%m-%d").date() - today).days
+        cases.append(case)
+    return cases
+
+def find_docket_case(receipt_number, db_path=DOCKET_DB_PATH):
+    conn = open_docket(db_path)
+    try:
+        row = conn.execute(
+            "SELECT * FROM docket_cases WHERE receipt_number = ?",
+            (receipt_number.strip().upper(),)
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def update_docket_status(receipt_number, status, db_path=DOCKET_DB_PATH):
+    if status not in DOCKET_STATUSES:
+        raise ValueError(f"Unknown docket status: {status}")
+    conn = open_docket(db_path)
+    try:
+        with conn:
+            updated = conn.execute(
+                "UPDATE docket_cases SET status = ?, updated_at = ? WHERE receipt_number = ?",
+                (status, datetime.now().isoformat(timespec="seconds"), receipt_number.strip().upper())
+            ).rowcount
+    finally:
+        conn.close()
+    return updated
+
+def get_docket_stats(db_path=DOCKET_DB_PATH):
+    """Open, overdue and due-soon counts, each answered from the status/deadline index"""
+    today = datetime.now().date()
+    conn = open_docket(db_path)
+    try:
+        def count_open(condition="", params=()):
+            return conn.execute(
+                f"SELECT COUNT(*) FROM docket_cases WHERE status = 'open' {condition}", params
+            ).fetchone()[0]
+        return {
+            "open": count_open(),
+            "overdue": count_open("AND deadline < ?", (today.isoformat(),)),
+            "due_7_days": count_open("AND deadline BETWEEN ? AND ?",
+                                     (today.isoformat(), (today + timedelta(days=7)).isoformat())),
+            "no_deadline": count_open("AND deadline IS NULL")
+        }
+    finally:
+        conn.close()
+
+# Local citation library: a BM25 index over user-supplied statute, regulation
+# and policy-manual text, used to ground research answers
+CITATION_INDEX_DIR = os.getenv(
+    "LAWTRAX_CITATION_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "citation_index")
+)
+CITATION_INDEX_VERSION = 1
+CITATION_CORPUS_EXTENSIONS = (".txt", ".md")
+# Corpus directories can only be indexed below this root (unset disables building from the UI)
+CITATION_CORPUS_ROOT = os.getenv("CITATION_CORPUS_ROOT", "")
+CITATION_PASSAGE_CHARS = 1200
+CITATION_TOP_K = 5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Research answers grounded in retrieved passages need far less generation
+RESEARCH_MAX_TOKENS = 3500
+RESEARCH_GROUNDED_MAX_TOKENS = 2000
+
+CITATION_STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "if", "in", "is", "it",
+    "its", "may", "must", "of", "on", "or", "shall", "such", "that", "the", "this", "to", "was", "which",
+    "will", "with", "what", "how", "does", "do", "can", "should", "under"
+}
+
+SECTION_REFERENCE_PATTERN = re.compile(
+    r'(\d+\s+(?:CFR|C\.F\.R\.)\s+(?:§+\s*)?\d+(?:\.\d+)?(?:\([a-zA-Z0-9]+\))*'
+    r'|INA\s+(?:§+\s*)?\d+[A-Z]?(?:\([a-zA-Z0-9]+\))*'
+    r'|\d+\s+U\.?S\.?C\.?\s+(?:§+\s*)?\d+[a-z]?(?:\([a-zA-Z0-9]+\))*'
+    r'|Volume\s+\d+,?\s+Part\s+[A-Z]+(?:,?\s+Chapter\s+\d+)?'
+    r'|§+\s*\d+(?:\.\d+)*(?:\([a-zA-Z0-9]+\))*)'
+)
+
+def tokenize_citation_text(text):
+    """Lowercase search tokens; section numbers like 214.2 split into their parts"""
+    return [t for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in CITATION_STOP_WORDS]
+
+def split_corpus_into_passages(text, source_name, passage_chars=CITATION_PASSAGE_CHARS):
+    """Group paragraphs into passages, each tagged with its closest section reference"""
+    passages = []
+    current = []
+    current_length = 0
+    heading_reference = ""
+    
+    def flush():
+        if current:
+            passage_text = "\n".join(current).strip()
+            explicit = SECTION_REFERENCE_PATTERN.search(passage_text)
+            passages.append({
+                "source": source_name,
+                "reference": heading_reference or (explicit.group(0) if explicit else ""),
+                "text": passage_text
+            })
+    
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        
+        heading_match = SECTION_REFERENCE_PATTERN.match(paragraph)
+        if heading_match or current_length + len(paragraph) > passage_chars:
+            flush()
+            current, current_length = [], 0
+            if heading_match:
+                heading_reference = re.sub(r'\s+', ' ', heading_match.group(0))
+        
+        # Oversized paragraphs are split so no passage grows without bound
+        for offset in range(0, len(paragraph), passage_chars):
+            piece = paragraph[offset:offset + passage_chars]
+            if current and current_length + len(piece) > passage_chars:
+                flush()
+                current, current_length = [], 0
+            current.append(piece)
+            current_length += len(piece)
+    
+    flush()
+    return passages
+
+def resolve_citation_corpus_directory(directory, root=CITATION_CORPUS_ROOT):
+    """Real path of a corpus directory inside the configured root, or ValueError"""
+    if not root:
+        raise ValueError("Building the citation index is disabled (set CITATION_CORPUS_ROOT to enable it)")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Directory must be inside {root}")
+    if not os.path.isdir(path):
+        raise ValueError(f"Directory not found: {directory}")
+    return path
+
+def build_citation_index(corpus_dir, index_dir=CITATION_INDEX_DIR):
+    """Build the on-disk BM25 index for every .txt/.md file under corpus_dir.
+    
+    Postings are written as flat uint32 (passage_id, term_frequency) pairs so
+    CitationIndex can memory-map them and read one term's list as a slice.
+    Files are written to a staging directory and renamed into place, so an
+    index that is already mapped by a running session is never truncated.
+    Symlinks that resolve outside corpus_dir are skipped.
+    """
+    start_time = time.perf_counter()
+    staging_dir = index_dir.rstrip(os.sep) + ".building"
+    os.makedirs(staging_dir, exist_ok=True)
+    source_count = 0
+    term_postings = {}
+    passage_lengths = array.array("I")
+    passage_offsets = array.array("Q")
+    
+    corpus_root = os.path.realpath(corpus_dir)
+    with open(os.path.join(staging_dir, "passages.jsonl"), "wb") as passage_file:
+        for root, _, file_names in os.walk(corpus_dir):
+            for file_name in sorted(file_names):
+                if not file_name.lower().endswith(CITATION_CORPUS_EXTENSIONS):
+                    continue
+                file_path = os.path.join(root, file_name)
+                if os.path.commonpath([corpus_root, os.path.realpath(file_path)]) != corpus_root:
+                    continue
+                with open(file_path, "r", encoding="utf-8", errors="replace") as handle:
+                    text = handle.read()
+                source_count += 1
+                
+                for passage in split_corpus_into_passages(text, os.path.relpath(file_path, corpus_dir)):
+                    passage_id = len(passage_lengths)
+                    tokens = tokenize_citation_text(passage["text"])
+                    passage_lengths.append(len(tokens))
+                    passage_offsets.append(passage_file.tell())
+                    passage_file.write(json.dumps(passage).encode("utf-8") + b"\n")
+                    
+                    counts = {}
+                    for token in tokens:
+                        counts[token] = counts.get(token, 0) + 1
+                    for token, count in counts.items():
+                        term_postings.setdefault(token, []).extend((passage_id, count))
+    
+    vocabulary = {}
+    postings = array.array("I")
+    for term in sorted(term_postings):
+        entries = term_postings[term]
+        vocabulary[term] = [len(postings), len(entries) // 2]
+        postings.extend(entries)
+    
+    with open(os.path.join(staging_dir, "postings.bin"), "wb") as handle:
+        postings.tofile(handle)
+    with open(os.path.join(staging_dir, "lengths.bin"), "wb") as handle:
+        passage_lengths.tofile(handle)
+    with open(os.path.join(staging_dir, "offsets.bin"), "wb") as handle:
+        passage_offsets.tofile(handle)
+    with open(os.path.join(staging_dir, "vocabulary.json"), "w", encoding="utf-8") as handle:
+        json.dump(vocabulary, handle, separators=(",", ":"))
+    
+    meta = {
+        "version": CITATION_INDEX_VERSION,
+        "byteorder": sys.byteorder,
+        "sources": source_count,
+        "passages": len(passage_lengths),
+        "terms": len(vocabulary),
+        "average_length": (sum(passage_lengths) / len(passage_lengths)) if passage_lengths else 0.0,
+        "corpus_dir": os.path.abspath(corpus_dir),
+        "built": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - start_time, 2)
+    }
+    with open(os.path.join(staging_dir, "meta.json"), "w", encoding="utf-8") as handle:
+        json.dump(meta, handle, indent=2)
+    
+    os.makedirs(index_dir, exist_ok=True)
+    # meta.json goes last so a half-swapped index is never opened
+    for file_name in ["passages.jsonl", "postings.bin", "lengths.bin", "offsets.bin", "vocabulary.json", "meta.json"]:
+        os.replace(os.path.join(staging_dir, file_name), os.path.join(index_dir, file_name))
+    os.rmdir(staging_dir)
+    
+    return meta
+
+class CitationIndex:
+    """Read-only BM25 index whose postings and passages are memory-mapped"""
+    
+    def __init__(self, index_dir=CITATION_INDEX_DIR):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as handle:
+            self.meta = json.load(handle)
+        if self.meta.get("version") != CITATION_INDEX_VERSION or self.meta.get("byteorder") != sys.byteorder:
+            raise ValueError("Citation index was built by an incompatible version; rebuild it.")
+        
+        with open(os.path.join(index_dir, "vocabulary.json"), "r", encoding="utf-8") as handle:
+            self.vocabulary = json.load(handle)
+        
+        self._files = []
+        self._postings = self._map_array(os.path.join(index_dir, "postings.bin"), "I")
+        self._lengths = self._map_array(os.path.join(index_dir, "lengths.bin"), "I")
+        self._offsets = self._map_array(os.path.join(index_dir, "offsets.bin"), "Q")
+        self._passages = self._map_file(os.path.join(index_dir, "passages.jsonl"))
+    
+    def _map_file(self, path):
+        handle = open(path, "rb")
+        self._files.append(handle)
+        if os.path.getsize(path) == 0:
+            return b""
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _map_array(self, path, typecode):
+        mapped = self._map_file(path)
+        return memoryview(mapped).cast(typecode) if mapped else memoryview(array.array(typecode))
+    
+    def passage(self, passage_id):
+        start = self._offsets[passage_id]
+        end = self._passages.find(b"\n", start)
+        return json.loads(self._passages[start:end if end != -1 else len(self._passages)])
+    
+    def search(self, query, k=CITATION_TOP_K):
+        """Top-k passages by BM25, each with its section reference and score"""
+        passage_count = self.meta["passages"]
+        average_length = self.meta["average_length"] or 1.0
+        scores = {}
+        
+        for term in set(tokenize_citation_text(query)):
+            entry = self.vocabulary.get(term)
+            if not entry:
+                continue
+            offset, document_frequency = entry
+            idf = math.log(1 + (passage_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            term_postings = self._postings[offset:offset + 2 * document_frequency]
+            for position in range(0, len(term_postings), 2):
+                passage_id = term_postings[position]
+                frequency = term_postings[position + 1]
+                length_norm = 1 - BM25_B + BM25_B * self._lengths[passage_id] / average_length
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+        
+        results = []
+        for passage_id, score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+            passage = self.passage(passage_id)
+            passage["score"] = round(score, 3)
+            results.append(passage)
+        return results
+
+@st.cache_resource(show_spinner=False)
+def get_citation_index(index_dir=CITATION_INDEX_DIR):
+    """Open the citation index once per process; None when it has not been built"""
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    try:
+        return CitationIndex(index_dir)
+    except (OSError, ValueError) as e:
+        st.warning(f"Citation index unavailable: {e}")
+        return None
+
+def format_citation_passages(passages):
+    """Numbered passage block for the research prompt"""
+    return "\n\n".join(
+        f"[{number}] {passage['reference'] or 'Unreferenced passage'} ({passage['source']})\n{passage['text']}"
+        for number, passage in enumerate(passages, 1)
+    )
+
+def generate_legal_research_response(question, stream=False, metrics=None, passages=None, conversation_context=None):
+    """Enhanced legal research with better prompting.
+    
+    When ``passages`` from the local citation library are supplied they are
+    placed in the prompt as the primary authorities, and the answer budget is
+    reduced since the model no longer has to recall citations from memory.
+    ``conversation_context`` is the compacted session memory from
+    build_research_memory_context, so follow-up questions keep their context.
+    """
+    if conversation_context:
+        conversation = f"""
+    EARLIER IN THIS RESEARCH SESSION:
+    {conversation_context}
+
+    The research question may be a follow-up; resolve references such as "that visa" or "the same client" using the session above.
+    """
+    else:
+        conversation = ""
+    
+    if passages:
+        grounding = f"""
+    AUTHORITIES FROM THE FIRM'S CITATION LIBRARY (quote section references exactly as shown):
+    {format_citation_passages(passages)}
 
-def generate_legal_research_response(question):
-    """Enhanced legal research with better prompting"""
+    Base your analysis on these passages first and cite them by their bracketed number and section reference. 
+    Only cite other authorities when the passages do not cover a point, and say so when you do.
+    """
+        max_tokens = RESEARCH_GROUNDED_MAX_TOKENS
+    else:
+        grounding = ""
+        max_tokens = RESEARCH_MAX_TOKENS
+    
     prompt = f"""
     As an expert immigration attorney with comprehensive knowledge of US immigration law, provide detailed research and analysis on the following question:
 
+    {conversation}
     RESEARCH QUESTION: {question}
-
+    {grounding}
     Please provide a comprehensive response that includes:
 
     1. DIRECT ANSWER - Clear, actionable response to the specific question
@@ -509,10 +1669,395 @@ def generate_legal_research_response(question):
     Focus on providing current, accurate information that would be valuable for immigration attorneys in their practice.
     """
     
-    return call_openai_api(prompt, max_tokens=3500, temperature=0.2)
+    if stream:
+        return stream_openai_api(prompt, max_tokens=max_tokens, temperature=0.2, metrics=metrics, call_label="legal_research")
+    return call_openai_api(prompt, max_tokens=max_tokens, temperature=0.2, metrics=metrics, call_label="legal_research")
+
+# Bounded research memory: the last few exchanges are kept verbatim (answers
+# clipped) and everything older is folded into one running summary, so the
+# context sent with a follow-up question stays the same size all session.
+# Folding is deferred until a follow-up actually needs the memory, so a run
+# of standalone questions never waits on a summarization call
+RESEARCH_MEMORY_RECENT_TURNS = 3
+RESEARCH_MEMORY_MAX_FOLD_TURNS = 6
+RESEARCH_MEMORY_ANSWER_CHARS = 1800
+RESEARCH_MEMORY_SUMMARY_MAX_TOKENS = 350
+RESEARCH_MEMORY_SUMMARY_CHARS = 1600
+RESEARCH_MEMORY_MODES = ["Follow-up questions only", "Always", "Off"]
+
+# Wording that only makes sense against an earlier answer: a leading
+# connective, a back-reference, or a bare pronoun subject/object
+RESEARCH_FOLLOW_UP_PATTERN = re.compile(
+    r'^\s*(?:and|but|also|so|then|what about|how about|what if|and if|follow(?:ing)?[\s-]?up)\b'
+    r'|\b(?:you (?:said|mentioned|suggested|listed)|(?:as )?(?:mentioned|discussed) (?:above|earlier|before)'
+    r'|the (?:above|previous|last|earlier|same) (?:answer|question|case|point|option|one|petition|client)'
+    r'|(?:that|this|those|these) (?:answer|option|options|approach|one|ones|point|points|case|client|petition|strategy)'
+    r'|in that case|the same (?:facts|client|beneficiary|case)|them|they)\b',
+    re.IGNORECASE
+)
+
+def is_research_follow_up(question):
+    """True when the question reads as a reference back to the session"""
+    return bool(RESEARCH_FOLLOW_UP_PATTERN.search(question or ""))
+
+def estimate_prompt_tokens(text):
+    """Rough token count (about four characters per token for English prose)"""
+    return (len(text) + 3) // 4 if text else 0
+
+def new_research_memory():
+    return {
+        "summary": "",
+        "summarized_turns": 0,
+        "recent": [],
+        # What an uncompacted message history would cost on the next call
+        "full_history_tokens": 0,
+        "context_tokens_sent": 0,
+        "full_history_tokens_equivalent": 0
+    }
+
+def build_research_memory_context(memory):
+    """Running summary plus the last exchanges, ready for the research prompt"""
+    parts = []
+    if memory["summary"]:
+        parts.append(f"Summary of {memory['summarized_turns']} earlier questions:\n{memory['summary']}")
+    for turn in memory["recent"]:
+        answer = turn["answer"]
+        if len(answer) > RESEARCH_MEMORY_ANSWER_CHARS:
+            answer = answer[:RESEARCH_MEMORY_ANSWER_CHARS].rsplit(" ", 1)[0] + " [...]"
+        parts.append(f"Q: {turn['question']}\nA: {answer}")
+    return "\n\n".join(parts)
+
+def extractive_research_summary(summary, turns):
+    """Keep each question and the opening of its answer, without an API call"""
+    lines = [summary] if summary else []
+    for turn in turns:
+        opening = re.split(r'(?<=[.!?])\s', turn["answer"].strip(), maxsplit=1)[0]
+        lines.append(f"- {turn['question']} -> {opening[:200]}")
+    return "\n".join(lines)[-RESEARCH_MEMORY_SUMMARY_CHARS:]
 
-def generate_expert_opinion_letter(letter_type, case_details):
-    """Generate expert opinion letter for immigration cases"""
+def summarize_research_turns(summary, turns):
+    """Fold older exchanges into the running summary; falls back to an extractive summary"""
+    transcript = "\n\n".join(f"Q: {turn['question']}\nA: {turn['answer'][:4000]}" for turn in turns)
+    prompt = f"""
+    Update the running summary of an immigration law research session. Keep the client facts, visa
+    categories, deadlines, conclusions reached and the key authorities cited; drop general explanation.
+    Return only the updated summary, at most 200 words.
+
+    CURRENT SUMMARY:
+    {summary or 'None yet.'}
+
+    EXCHANGES TO ADD:
+    {transcript}
+    """
+    
+    call_metrics = {}
+    content = call_openai_api(prompt, max_tokens=RESEARCH_MEMORY_SUMMARY_MAX_TOKENS, temperature=0.0,
+                              metrics=call_metrics, call_label="research_memory_summary")
+    if content:
+        return content.strip()[:RESEARCH_MEMORY_SUMMARY_CHARS]
+    
+    # Keep each question and the opening of its answer rather than losing the turn
+    return extractive_research_summary(summary, turns)
+
+def remember_research_turn(memory, question, answer, context_tokens=0):
+    """Add an exchange to the session memory; compaction waits for compact_research_memory.
+    
+    Also accumulates how many context tokens were sent versus what a full
+    message history would have cost, for the savings report.
+    """
+    memory["context_tokens_sent"] += context_tokens
+    memory["full_history_tokens_equivalent"] += memory["full_history_tokens"]
+    memory["full_history_tokens"] += estimate_prompt_tokens(question) + estimate_prompt_tokens(answer)
+    
+    memory["recent"].append({"question": question, "answer": answer})
+
+def compact_research_memory(memory):
+    """Fold everything beyond the recent window into the summary, just before a follow-up.
+    
+    Only the newest RESEARCH_MEMORY_MAX_FOLD_TURNS of the overflow go through the
+    model; older ones (a long run of standalone questions) are folded extractively.
+    """
+    overflow = memory["recent"][:-RESEARCH_MEMORY_RECENT_TURNS]
+    if not overflow:
+        return 0
+    stale, fresh = overflow[:-RESEARCH_MEMORY_MAX_FOLD_TURNS], overflow[-RESEARCH_MEMORY_MAX_FOLD_TURNS:]
+    summary = extractive_research_summary(memory["summary"], stale) if stale else memory["summary"]
+    memory["summary"] = summarize_research_turns(summary, fresh)
+    memory["summarized_turns"] += len(overflow)
+    memory["recent"] = memory["recent"][-RESEARCH_MEMORY_RECENT_TURNS:]
+    return len(overflow)
+
+# Near-duplicate research cache: visa, form and statute codes are pulled out of
+# the question and must match exactly (they are part of every LSH bucket key);
+# the remaining text is normalized, shingled and MinHashed, and an answer is
+# reused when the estimated Jaccard similarity clears the threshold
+RESEARCH_CACHE_PATH = os.getenv(
+    "LAWTRAX_RESEARCH_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "research_cache.json")
+)
+RESEARCH_CACHE_VERSION = 2
+RESEARCH_CACHE_THRESHOLD = 0.7
+RESEARCH_CACHE_TTL_HOURS = 7 * 24
+RESEARCH_CACHE_MAX_ENTRIES = 1000
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+MINHASH_SHINGLE_CHARS = 5
+MINHASH_PRIME = (1 << 61) - 1
+
+# Spellings attorneys use interchangeably for the same thing
+RESEARCH_QUESTION_PHRASES = {
+    "national interest waiver": "niw",
+    "request for evidence": "rfe",
+    "labor condition application": "lca",
+    "specialty occupation": "specialty occupation",
+    "speciality occupation": "specialty occupation"
+}
+RESEARCH_QUESTION_SYNONYMS = {
+    "h1": "h1b", "rfes": "rfe", "occupations": "occupation", "requirements": "requirement",
+    "petitions": "petition", "beneficiaries": "beneficiary", "positions": "position", "degrees": "degree"
+}
+
+# H-1B, EB-2, L-1A / I-129, DS-160, ETA-9089 / INA 203(b)(2), 8 CFR 214.2(h)(4)
+RESEARCH_VISA_CODE_PATTERN = re.compile(r'\b(eb|[hlopefjmkrqtu])[\s-]?(\d[a-z]?)\b')
+RESEARCH_FORM_CODE_PATTERN = re.compile(r'\b(i|n|g|ds|eta|ar)[\s-]?(\d{1,4}[a-z]?)\b')
+RESEARCH_STATUTE_PATTERN = re.compile(
+    r'\b(?:ina\s*(?:section|sec\.?)?|section|sec\.?)\s*§*\s*(\d{3}(?:\([a-z0-9]+\))*)'
+    r'|§+\s*(\d{3}(?:\([a-z0-9]+\))*)'
+    r'|\b(\d{1,2})\s*c\.?f\.?r\.?\s*(?:§+|part|section)?\s*(\d+(?:\.\d+)?(?:\([a-z0-9]+\))*)'
+)
+
+_minhash_random = random.Random(RESEARCH_CACHE_VERSION)
+MINHASH_COEFFICIENTS = [
+    (_minhash_random.randrange(1, MINHASH_PRIME), _minhash_random.randrange(0, MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+def split_research_question(question):
+    """Sorted visa/form/statute codes of a question and its text with the codes removed.
+    
+    Codes are canonical (h1b, i129, ina203(b)(2), 8cfr214.2(h)) whatever the
+    spelling (H-1B, H1B, h 1b), so they can be compared exactly.
+    """
+    text = question.lower()
+    codes = set()
+    
+    def take_statute(match):
+        if match.group(3):
+            codes.add(f"{match.group(3)}cfr{match.group(4)}")
+        else:
+            codes.add("ina" + (match.group(1) or match.group(2)))
+        return " "
+    
+    def take_code(match):
+        codes.add(match.group(1) + match.group(2))
+        return " "
+    
+    text = RESEARCH_STATUTE_PATTERN.sub(take_statute, text)
+    text = RESEARCH_FORM_CODE_PATTERN.sub(take_code, text)
+    text = RESEARCH_VISA_CODE_PATTERN.sub(take_code, text)
+    return tuple(sorted(codes)), text
+
+def research_question_codes(question):
+    return split_research_question(question)[0]
+
+def normalize_research_question(question):
+    """Question text without its codes, stop words or spelling variants (the MinHash input)"""
+    text = split_research_question(question)[1]
+    for phrase, replacement in RESEARCH_QUESTION_PHRASES.items():
+        text = text.replace(phrase, replacement)
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', text):
+        if token in CITATION_STOP_WORDS:
+            continue
+        tokens.append(RESEARCH_QUESTION_SYNONYMS.get(token, token))
+    return " ".join(tokens)
+
+def research_question_shingles(normalized, shingle_chars=MINHASH_SHINGLE_CHARS):
+    """Character shingles of the normalized question, as stable 64-bit hashes"""
+    if len(normalized) <= shingle_chars:
+        pieces = {normalized} if normalized else set()
+    else:
+        pieces = {normalized[i:i + shingle_chars] for i in range(len(normalized) - shingle_chars + 1)}
+    return {int.from_bytes(hashlib.blake2b(piece.encode("utf-8"), digest_size=8).digest(), "little")
+            for piece in pieces}
+
+def minhash_signature(shingles):
+    """MINHASH_PERMUTATIONS-long MinHash signature of a shingle set"""
+    if not shingles:
+        return [MINHASH_PRIME] * MINHASH_PERMUTATIONS
+    return [min((a * shingle + b) % MINHASH_PRIME for shingle in shingles) for a, b in MINHASH_COEFFICIENTS]
+
+def minhash_band_keys(signature, bands=MINHASH_BANDS):
+    rows = len(signature) // bands
+    return [f"{band}:" + ",".join(map(str, signature[band * rows:(band + 1) * rows])) for band in range(bands)]
+
+class ResearchAnswerCache:
+    """Process-wide store of research answers, persisted to a JSON file.
+    
+    Entries are keyed by a mode string (plain vs. grounded answers are never
+    mixed) plus the question's visa/form/statute codes, so an H-1B answer is
+    never served for an H-2B question; they expire after ``ttl_hours``.
+    """
+    
+    def __init__(self, path=RESEARCH_CACHE_PATH, ttl_hours=RESEARCH_CACHE_TTL_HOURS,
+                 max_entries=RESEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.bands = {}
+        self.next_id = 0
+        self._load()
+    
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != RESEARCH_CACHE_VERSION:
+            return
+        for entry in data.get("entries", []):
+            self._add(entry)
+        self._prune(time.time())
+    
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump({"version": RESEARCH_CACHE_VERSION, "entries": list(self.entries.values())}, handle)
+        os.replace(temp_path, self.path)
+    
+    @staticmethod
+    def _bucket_prefix(mode, codes):
+        return mode + "|" + ",".join(codes) + "|"
+    
+    def _add(self, entry):
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = entry
+        prefix = self._bucket_prefix(entry["mode"], entry["codes"])
+        for key in minhash_band_keys(entry["signature"]):
+            self.bands.setdefault(prefix + key, set()).add(entry_id)
+    
+    def _remove(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        prefix = self._bucket_prefix(entry["mode"], entry["codes"])
+        for key in minhash_band_keys(entry["signature"]):
+            bucket = self.bands.get(prefix + key)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self.bands[prefix + key]
+    
+    def _prune(self, now):
+        expired = [entry_id for entry_id, entry in self.entries.items() if now - entry["created"] > self.ttl_seconds]
+        for entry_id in expired:
+            self._remove(entry_id)
+        # Entries are inserted in creation order, so the oldest come first
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+        return len(expired)
+    
+    def lookup(self, question, mode="plain", threshold=RESEARCH_CACHE_THRESHOLD):
+        """Best cached answer for a near-duplicate question with the same codes, or None"""
+        codes = list(research_question_codes(question))
+        signature = minhash_signature(research_question_shingles(normalize_research_question(question)))
+        prefix = self._bucket_prefix(mode, codes)
+        now = time.time()
+        with self.lock:
+            candidates = set()
+            for key in minhash_band_keys(signature):
+                candidates |= self.bands.get(prefix + key, set())
+            
+            best = None
+            best_id = None
+            for entry_id in candidates:
+                entry = self.entries[entry_id]
+                if now - entry["created"] > self.ttl_seconds or entry["codes"] != codes:
+                    continue
+                similarity = sum(1 for x, y in zip(signature, entry["signature"]) if x == y) / len(signature)
+                if similarity >= threshold and (best is None or similarity > best["similarity"]):
+                    best = {
+                        "question": entry["question"],
+                        "answer": entry["answer"],
+                        "similarity": similarity,
+                        "age_seconds": now - entry["created"]
+                    }
+                    best_id = entry_id
+            if best:
+                self.entries[best_id]["hits"] += 1
+            return best
+    
+    def store(self, question, answer, mode="plain"):
+        codes = list(research_question_codes(question))
+        normalized = normalize_research_question(question)
+        if not (normalized or codes) or not answer:
+            return
+        with self.lock:
+            self._prune(time.time())
+            self._add({
+                "question": question,
+                "answer": answer,
+                "mode": mode,
+                "codes": codes,
+                "signature": minhash_signature(research_question_shingles(normalized)),
+                "created": time.time(),
+                "hits": 0
+            })
+            try:
+                self._save()
+            except OSError:
+                pass
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bands.clear()
+            try:
+                self._save()
+            except OSError:
+                pass
+    
+    def stats(self):
+        with self.lock:
+            self._prune(time.time())
+            return {
+                "entries": len(self.entries),
+                "hits": sum(entry["hits"] for entry in self.entries.values())
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_research_cache():
+    """One shared answer cache per process, so every attorney benefits"""
+    return ResearchAnswerCache()
+
+def format_cache_age(seconds):
+    """Compact age such as '45s', '12m' or '3h 20m'"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    if seconds < 86400:
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+    return f"{seconds // 86400}d {seconds % 86400 // 3600}h"
+
+def generate_expert_opinion_letter(letter_type, case_details, stream=False, metrics=None,
+                                   sectioned=False, templated=False, on_section=None):
+    """Generate expert opinion letter for immigration cases.
+    
+    With ``sectioned`` the letter is drafted outline-first with its sections
+    generated in parallel (see generate_expert_letter_in_sections). With
+    ``templated`` the fixed legal boilerplate comes from the letter template
+    library and the model only writes the analysis slots
+    (see generate_expert_letter_from_template).
+    """
     
     if letter_type == "Position Expert Opinion":
         prompt = f"""
@@ -557,27 +2102,623 @@ def generate_expert_opinion_letter(letter_type, case_details):
         6. Provide detailed professional opinion on qualification sufficiency
         7. Include credential analysis and industry comparison
 
-        Format as a formal expert evaluation with expert credentials, detailed analysis, and professional conclusions suitable for legal submission.
-        """
+        Format as a formal expert evaluation with expert credentials, detailed analysis, and professional conclusions suitable for legal submission.
+        """
+
+    if templated and letter_type in load_letter_template_library():
+        letter = generate_expert_letter_from_template(letter_type, case_details, metrics=metrics, on_slot=on_section)
+        return iter([letter] if letter else []) if stream else letter
+    
+    if sectioned:
+        letter = generate_expert_letter_in_sections(letter_type, case_details, metrics=metrics, on_section=on_section)
+        return iter([letter] if letter else []) if stream else letter
+    
+    if stream:
+        return stream_openai_api(prompt, max_tokens=2500, temperature=0.2, metrics=metrics, call_label="expert_letter")
+    return call_openai_api(prompt, max_tokens=2500, temperature=0.2, metrics=metrics, call_label="expert_letter")
+
+# Sectioned letters: one short outline call, then every section drafted
+# concurrently from that outline and stitched back together in order
+EXPERT_LETTER_OUTLINE_MAX_TOKENS = 600
+EXPERT_LETTER_SECTION_MAX_TOKENS = 900
+
+EXPERT_LETTER_SECTIONS = [
+    {
+        "key": "credentials",
+        "title": "Expert Credentials",
+        "guidance": "Open with the letterhead, date, the USCIS addressee and salutation, then establish the expert's "
+                    "education, positions held and years of industry experience, and why they are qualified to opine."
+    },
+    {
+        "key": "position_analysis",
+        "title": "Position Analysis",
+        "guidance": "Analyze the duties in detail: their complexity, the specialized knowledge they require, and how "
+                    "a bachelor's degree or higher in a specific field is needed to perform them."
+    },
+    {
+        "key": "industry_comparison",
+        "title": "Industry Comparison",
+        "guidance": "Compare the requirements to industry standards, comparable positions at similar employers, "
+                    "professional association norms and available industry data."
+    },
+    {
+        "key": "conclusion",
+        "title": "Conclusion",
+        "guidance": "Apply INA 214(i)(1) and 8 CFR 214.2(h)(4)(iii)(A), state the expert's professional opinion "
+                    "clearly, and close with the signature block and declaration language."
+    }
+]
+
+EXPERT_LETTER_DETAIL_FIELDS = [
+    ("Expert Name", "expert_name"),
+    ("Expert Title", "expert_title"),
+    ("Expert Organization", "expert_company"),
+    ("Expert Credentials", "expert_credentials"),
+    ("Beneficiary", "beneficiary_name"),
+    ("Education", "education"),
+    ("Experience", "experience"),
+    ("Position Title", "position"),
+    ("Company", "company"),
+    ("Industry", "industry"),
+    ("Job Duties", "job_duties"),
+    ("Education Requirement", "education_req"),
+    ("Issues to Address", "opinion_focus")
+]
+
+def format_expert_case_details(case_details):
+    """Bullet list of the case details that were actually provided"""
+    return "\n".join(
+        f"- {label}: {case_details[key]}"
+        for label, key in EXPERT_LETTER_DETAIL_FIELDS
+        if case_details.get(key)
+    ) or "- Not specified"
+
+def generate_expert_letter_outline(letter_type, case_details):
+    """Short outline call: the key points every section should make"""
+    section_keys = ", ".join(f'"{section["key"]}"' for section in EXPERT_LETTER_SECTIONS)
+    prompt = f"""
+    You are planning a {letter_type} letter for a USCIS submission. Do not write the letter.
+    Return JSON only: an object with the keys {section_keys}, each holding 3-5 short key points
+    that section must make, so separately drafted sections stay consistent.
+
+    CASE DETAILS:
+    {format_expert_case_details(case_details)}
+    """
+    
+    call_metrics = {}
+    notices = []
+    content = call_openai_api(prompt, max_tokens=EXPERT_LETTER_OUTLINE_MAX_TOKENS, temperature=0.2,
+                              metrics=call_metrics, call_label="expert_outline", notices=notices)
+    outline = parse_json_object(content) or {}
+    
+    return {
+        "outline": {section["key"]: [str(point) for point in outline.get(section["key"], []) if point]
+                    for section in EXPERT_LETTER_SECTIONS},
+        "latency": call_metrics.get("total_latency"),
+        "tokens": (call_metrics.get("prompt_tokens") or 0) + (call_metrics.get("completion_tokens") or 0),
+        "output_tokens": call_metrics.get("completion_tokens") or 0,
+        "error": call_metrics.get("error") or (None if content else "Empty response"),
+        "notices": notices
+    }
+
+def generate_expert_letter_section(index, letter_type, case_details, outline):
+    """Draft one section of the letter against the shared outline.
+    
+    Runs on a worker thread, so API errors are returned in "notices" rather than shown.
+    """
+    section = EXPERT_LETTER_SECTIONS[index]
+    outline_text = "\n".join(
+        f"{other['title']}:\n" + "\n".join(f"  - {point}" for point in outline.get(other["key"], []))
+        for other in EXPERT_LETTER_SECTIONS
+    )
+    prompt = f"""
+    You are drafting one section of a {letter_type} letter, written in the first person by the expert,
+    suitable for USCIS submission. Other sections are drafted separately from the same outline, so write
+    ONLY the "{section['title']}" section (section {index + 1} of {len(EXPERT_LETTER_SECTIONS)}), without
+    repeating points that belong to other sections and without a section heading.
+
+    SECTION INSTRUCTIONS: {section['guidance']}
+
+    CASE DETAILS:
+    {format_expert_case_details(case_details)}
+
+    LETTER OUTLINE:
+    {outline_text}
+    """
+    
+    call_metrics = {}
+    notices = []
+    content = call_openai_api(prompt, max_tokens=EXPERT_LETTER_SECTION_MAX_TOKENS, temperature=0.2,
+                              metrics=call_metrics, call_label=f"expert_section_{section['key']}", notices=notices)
+    
+    return {
+        "index": index,
+        "title": section["title"],
+        "text": (content or "").strip(),
+        "latency": call_metrics.get("total_latency"),
+        "tokens": (call_metrics.get("prompt_tokens") or 0) + (call_metrics.get("completion_tokens") or 0),
+        "output_tokens": call_metrics.get("completion_tokens") or 0,
+        "error": call_metrics.get("error") or (None if content else "Empty response"),
+        "notices": notices
+    }
+
+def generate_expert_letter_in_sections(letter_type, case_details, metrics=None, on_section=None):
+    """Outline first, then draft all sections concurrently and stitch them in order.
+    
+    ``on_section(result, completed, total)`` is called on the calling thread as
+    each section finishes, so the UI can report progress.
+    """
+    if metrics is None:
+        metrics = {}
+    start_time = time.perf_counter()
+    
+    outline = generate_expert_letter_outline(letter_type, case_details)
+    
+    section_results = []
+    sections_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(EXPERT_LETTER_SECTIONS)) as executor:
+        futures = [
+            executor.submit(generate_expert_letter_section, index, letter_type, case_details, outline["outline"])
+            for index in range(len(EXPERT_LETTER_SECTIONS))
+        ]
+        for future in as_completed(futures):
+            section_results.append(future.result())
+            if on_section:
+                on_section(section_results[-1], len(section_results), len(futures))
+    section_results.sort(key=lambda result: result["index"])
+    
+    # Workers cannot write to the page; show their errors here, once each
+    for notice in dict.fromkeys(outline["notices"] + [notice for r in section_results for notice in r["notices"]]):
+        report_error(notice)
+    
+    metrics.update({
+        "label": "expert_letter",
+        "streamed": False,
+        "sectioned": True,
+        "outline_latency": outline["latency"],
+        "outline_error": outline["error"],
+        "section_wall_time": time.perf_counter() - sections_start,
+        "slowest_section": max((r["latency"] or 0.0 for r in section_results), default=0.0),
+        "failed_sections": [r["title"] for r in section_results if r["error"]],
+        "total_latency": time.perf_counter() - start_time,
+        "completion_tokens": outline["output_tokens"] + sum(r["output_tokens"] for r in section_results),
+        "tokens": outline["tokens"] + sum(r["tokens"] for r in section_results)
+    })
+    
+    if all(r["error"] for r in section_results):
+        return None
+    
+    return "\n\n".join(
+        r["text"] if not r["error"] else f"[{r['title'].upper()} SECTION COULD NOT BE GENERATED - please regenerate or draft manually]"
+        for r in section_results
+    )
+
+# Template letters: the declaration structure and regulatory text are fixed
+# per letter type, so the model only writes the case-specific analysis slots
+LETTER_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "letter_templates")
+LETTER_TEMPLATE_PATTERN = re.compile(r'\{\{(\w+)\}\}|\[\[(\w+)\]\]')
+
+@st.cache_resource(show_spinner=False)
+def load_letter_template_library(template_dir=LETTER_TEMPLATE_DIR):
+    """Compile every letter template once per process.
+    
+    Each template becomes a list of ("text", literal), ("field", case_detail_key)
+    and ("slot", slot_name) segments, so rendering a letter is a single join.
+    """
+    with open(os.path.join(template_dir, "manifest.json"), "r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    
+    library = {}
+    for letter_type, spec in manifest["letters"].items():
+        with open(os.path.join(template_dir, spec["template"]), "r", encoding="utf-8") as handle:
+            template = handle.read()
+        
+        segments = []
+        position = 0
+        for match in LETTER_TEMPLATE_PATTERN.finditer(template):
+            if match.start() > position:
+                segments.append(("text", template[position:match.start()]))
+            segments.append(("field", match.group(1)) if match.group(1) else ("slot", match.group(2)))
+            position = match.end()
+        if position < len(template):
+            segments.append(("text", template[position:]))
+        
+        slot_names = [value for kind, value in segments if kind == "slot"]
+        missing = set(slot_names) ^ set(spec["slots"])
+        if missing:
+            raise ValueError(f"{spec['template']}: slots do not match manifest: {', '.join(sorted(missing))}")
+        
+        library[letter_type] = {
+            "segments": segments,
+            "slots": [dict(spec["slots"][name], name=name) for name in slot_names]
+        }
+    return library
+
+def render_letter_template(segments, case_details, slot_text):
+    """Join compiled segments, filling fields from case details and slots from slot_text"""
+    field_values = dict(case_details, date=datetime.now().strftime("%B %d, %Y"))
+    parts = []
+    for kind, value in segments:
+        if kind == "text":
+            parts.append(value)
+        elif kind == "field":
+            parts.append(str(field_values.get(value) or f"[{value.replace('_', ' ').title()}]"))
+        else:
+            parts.append(slot_text.get(value, ""))
+    return "".join(parts)
+
+def fill_letter_template_slot(letter_type, slot, case_details, context):
+    """Write one analysis slot; the surrounding boilerplate is passed only as context.
+    
+    Runs on a worker thread, so API errors are returned in "notices" rather than shown.
+    """
+    prompt = f"""
+    You are writing one paragraph group inside a {letter_type} letter, in the first person as the expert,
+    for USCIS submission. The rest of the letter (letterhead, legal standard, conclusion, declaration and
+    signature) is already written. Write ONLY the text for the "{slot['title']}" part: plain paragraphs,
+    no heading, no greeting, no signature, no restating of the regulations. Stay under {int(slot['max_tokens'] * 0.7)} words.
+
+    WHAT TO WRITE: {slot['instructions']}
+
+    CASE DETAILS:
+    {format_expert_case_details(case_details)}
+
+    TEXT IMMEDIATELY BEFORE THIS PART OF THE LETTER:
+    {context}
+    """
+    
+    call_metrics = {}
+    notices = []
+    content = call_openai_api(prompt, max_tokens=slot["max_tokens"], temperature=0.2,
+                              metrics=call_metrics, call_label=f"expert_slot_{slot['name']}", notices=notices)
+    
+    return {
+        "name": slot["name"],
+        "title": slot["title"],
+        "text": (content or "").strip(),
+        "latency": call_metrics.get("total_latency"),
+        "tokens": (call_metrics.get("prompt_tokens") or 0) + (call_metrics.get("completion_tokens") or 0),
+        "output_tokens": call_metrics.get("completion_tokens") or 0,
+        "error": call_metrics.get("error") or (None if content else "Empty response"),
+        "notices": notices
+    }
+
+def generate_expert_letter_from_template(letter_type, case_details, metrics=None, on_slot=None):
+    """Fill a precompiled letter template's analysis slots in parallel.
+    
+    ``on_slot(result, completed, total)`` is called on the calling thread as
+    each slot finishes. Output tokens are only spent on the slots; the
+    boilerplate is copied from the template.
+    """
+    if metrics is None:
+        metrics = {}
+    template = load_letter_template_library()[letter_type]
+    start_time = time.perf_counter()
+    
+    # The literal text just before each slot tells the model where it is in the letter
+    contexts = {}
+    preceding = ""
+    for kind, value in template["segments"]:
+        if kind == "slot":
+            contexts[value] = preceding[-600:].strip()
+            preceding = ""
+        else:
+            preceding += value if kind == "text" else str(case_details.get(value) or "")
+    
+    slot_results = []
+    with ThreadPoolExecutor(max_workers=len(template["slots"])) as executor:
+        futures = [
+            executor.submit(fill_letter_template_slot, letter_type, slot, case_details, contexts[slot["name"]])
+            for slot in template["slots"]
+        ]
+        for future in as_completed(futures):
+            slot_results.append(future.result())
+            if on_slot:
+                on_slot(slot_results[-1], len(slot_results), len(futures))
+    
+    # Workers cannot write to the page; show their errors here, once each
+    for notice in dict.fromkeys(notice for r in slot_results for notice in r["notices"]):
+        report_error(notice)
+    
+    metrics.update({
+        "label": "expert_letter",
+        "streamed": False,
+        "templated": True,
+        "slot_count": len(slot_results),
+        "slowest_slot": max((r["latency"] or 0.0 for r in slot_results), default=0.0),
+        "failed_slots": [r["title"] for r in slot_results if r["error"]],
+        "total_latency": time.perf_counter() - start_time,
+        "completion_tokens": sum(r["output_tokens"] for r in slot_results),
+        "tokens": sum(r["tokens"] for r in slot_results)
+    })
+    
+    if all(r["error"] for r in slot_results):
+        return None
+    
+    return render_letter_template(template["segments"], case_details, {
+        r["name"]: r["text"] if not r["error"] else f"[{r['title'].upper()} COULD NOT BE GENERATED - please regenerate or draft manually]"
+        for r in slot_results
+    })
+
+SOC_TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "soc_taxonomy.csv")
+SOC_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "soc_index.json.gz")
+SOC_INDEX_VERSION = 1
+
+SOC_CODE_QUERY_PATTERN = re.compile(r'^\d{1,2}(-\d{0,4}(\.\d{0,2})?)?$')
+SOC_QUERY_STOP_WORDS = {"and", "of", "the", "except", "all", "other", "for", "in"}
+
+def tokenize_soc_text(text):
+    """Lowercase alphanumeric tokens used by the SOC title index"""
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+def soc_token_trigrams(token):
+    """Boundary-padded character trigrams for typo-tolerant token matching"""
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def import_onet_soc_taxonomy(onet_dir, output_path=SOC_TAXONOMY_PATH):
+    """Convert the O*NET database text files into the bundled SOC taxonomy CSV.
+    
+    Expects the tab-delimited ``Occupation Data.txt``, ``Job Zones.txt`` and
+    ``Alternate Titles.txt`` files from an O*NET database download.
+    """
+    def read_onet_file(file_name):
+        with open(os.path.join(onet_dir, file_name), "r", encoding="utf-8") as handle:
+            return list(csv.DictReader(handle, delimiter="\t"))
+    
+    job_zones = {row["O*NET-SOC Code"]: row["Job Zone"] for row in read_onet_file("Job Zones.txt")}
+    alternate_titles = {}
+    for row in read_onet_file("Alternate Titles.txt"):
+        alternate_titles.setdefault(row["O*NET-SOC Code"], []).append(row["Alternate Title"])
+    
+    with open(output_path, "w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["soc_code", "title", "job_zone", "alternate_titles"])
+        for row in read_onet_file("Occupation Data.txt"):
+            code = row["O*NET-SOC Code"]
+            writer.writerow([code, row["Title"], job_zones.get(code, ""), ";".join(alternate_titles.get(code, []))])
+
+def build_soc_index(taxonomy_path=SOC_TAXONOMY_PATH):
+    """Precompute the SOC lookup structures from the taxonomy CSV.
+    
+    Postings are packed as ``record_id << 1 | is_title`` so the index stays
+    compact on disk; tokens are kept sorted for prefix search and every token
+    is listed under its trigrams for fuzzy matching.
+    """
+    with open(taxonomy_path, "rb") as handle:
+        source_bytes = handle.read()
+    
+    records = []
+    postings = {}
+    for row in csv.DictReader(source_bytes.decode("utf-8").splitlines()):
+        record_id = len(records)
+        alternates = [t.strip() for t in (row.get("alternate_titles") or "").split(";") if t.strip()]
+        job_zone = int(row["job_zone"]) if (row.get("job_zone") or "").strip().isdigit() else None
+        records.append([row["soc_code"].strip(), row["title"].strip(), job_zone, alternates])
+        
+        for token in tokenize_soc_text(" ".join(alternates)):
+            postings.setdefault(token, set()).add(record_id << 1)
+        for token in tokenize_soc_text(row["title"]):
+            postings.setdefault(token, set()).add(record_id << 1 | 1)
+    
+    tokens = sorted(postings)
+    trigrams = {}
+    for token_id, token in enumerate(tokens):
+        for trigram in soc_token_trigrams(token):
+            trigrams.setdefault(trigram, []).append(token_id)
+    
+    return {
+        "version": SOC_INDEX_VERSION,
+        "source_sha1": hashlib.sha1(source_bytes).hexdigest(),
+        "records": records,
+        "codes": sorted(range(len(records)), key=lambda i: records[i][0]),
+        "tokens": tokens,
+        "postings": [sorted(postings[token]) for token in tokens],
+        "trigrams": trigrams
+    }
+
+class SOCCodeIndex:
+    """Prefix and typo-tolerant title search over the bundled SOC taxonomy"""
+    
+    def __init__(self, index_data):
+        self.records = index_data["records"]
+        self.code_order = index_data["codes"]
+        self.sorted_codes = [self.records[i][0] for i in self.code_order]
+        self.tokens = index_data["tokens"]
+        self.postings = index_data["postings"]
+        self.trigrams = index_data["trigrams"]
+    
+    def _record(self, record_id, score=None):
+        code, title, job_zone, alternates = self.records[record_id]
+        result = {"code": code, "title": title, "job_zone": job_zone, "alternate_titles": alternates}
+        if score is not None:
+            result["score"] = round(score, 3)
+        return result
+    
+    def lookup(self, soc_code):
+        """Exact code lookup; a bare 15-1252 also matches its 15-1252.00 detail code"""
+        soc_code = soc_code.strip()
+        matches = self.prefix_search(soc_code, limit=2)
+        for match in matches:
+            if match["code"] == soc_code or match["code"] == f"{soc_code}.00":
+                return match
+        return None
+    
+    def prefix_search(self, prefix, limit=10):
+        """Codes starting with the given prefix, in code order"""
+        start = bisect.bisect_left(self.sorted_codes, prefix)
+        results = []
+        for position in range(start, len(self.sorted_codes)):
+            if not self.sorted_codes[position].startswith(prefix) or len(results) >= limit:
+                break
+            results.append(self._record(self.code_order[position]))
+        return results
+    
+    def _matching_tokens(self, query_token):
+        """Index tokens matching one query token, with a match quality in (0, 1]"""
+        matches = {}
+        start = bisect.bisect_left(self.tokens, query_token)
+        for token_id in range(start, min(start + 50, len(self.tokens))):
+            token = self.tokens[token_id]
+            if not token.startswith(query_token):
+                break
+            matches[token_id] = 1.0 if token == query_token else 0.85
+        
+        if not matches and len(query_token) >= 3:
+            query_trigrams = soc_token_trigrams(query_token)
+            shared = {}
+            for trigram in query_trigrams:
+                for token_id in self.trigrams.get(trigram, ()):
+                    shared[token_id] = shared.get(token_id, 0) + 1
+            for token_id, count in shared.items():
+                dice = 2 * count / (len(query_trigrams) + len(self.tokens[token_id]) + 2)
+                if dice >= 0.45:
+                    matches[token_id] = 0.7 * dice
+        return matches
+    
+    def title_search(self, query, limit=10):
+        """Rank occupations by how well their titles and alternate titles match the query"""
+        query_tokens = tokenize_soc_text(query)
+        query_tokens = [t for t in query_tokens if t not in SOC_QUERY_STOP_WORDS] or query_tokens
+        if not query_tokens:
+            return []
+        
+        scores = {}
+        for query_token in query_tokens:
+            best = {}
+            for token_id, quality in self._matching_tokens(query_token).items():
+                for posting in self.postings[token_id]:
+                    record_id = posting >> 1
+                    weighted = quality if posting & 1 else quality * 0.8
+                    if weighted > best.get(record_id, 0.0):
+                        best[record_id] = weighted
+            for record_id, weighted in best.items():
+                scores[record_id] = scores.get(record_id, 0.0) + weighted
+        
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], len(self.records[item[0]][1])))
+        return [self._record(record_id, score / len(query_tokens)) for record_id, score in ranked[:limit]]
+    
+    def search(self, query, limit=10):
+        """Code-prefix search for numeric queries, title search otherwise"""
+        query = query.strip()
+        if not query:
+            return []
+        if SOC_CODE_QUERY_PATTERN.match(query):
+            return self.prefix_search(query, limit)
+        return self.title_search(query, limit)
+
+def load_soc_index_data(taxonomy_path=SOC_TAXONOMY_PATH, index_path=SOC_INDEX_PATH):
+    """Read the precomputed index, rebuilding it when the taxonomy CSV has changed"""
+    with open(taxonomy_path, "rb") as handle:
+        source_sha1 = hashlib.sha1(handle.read()).hexdigest()
+    
+    if os.path.exists(index_path):
+        try:
+            with gzip.open(index_path, "rt", encoding="utf-8") as handle:
+                index_data = json.load(handle)
+            if index_data.get("version") == SOC_INDEX_VERSION and index_data.get("source_sha1") == source_sha1:
+                return index_data
+        except (OSError, ValueError):
+            pass
+    
+    index_data = build_soc_index(taxonomy_path)
+    try:
+        with gzip.open(index_path, "wt", encoding="utf-8") as handle:
+            json.dump(index_data, handle, separators=(",", ":"))
+    except OSError:
+        # Read-only deployments still get the in-memory index
+        pass
+    return index_data
 
-    return call_openai_api(prompt, max_tokens=2500, temperature=0.2)
+@st.cache_resource(show_spinner=False)
+def get_soc_index():
+    """Load the SOC index lazily, once per process"""
+    if not os.path.exists(SOC_TAXONOMY_PATH):
+        return None
+    return SOCCodeIndex(load_soc_index_data())
 
 def check_soc_code(soc_code):
-    """Check if SOC code is in Job Zone 3"""
+    """Check an SOC code's job zone against the bundled O*NET taxonomy"""
+    soc_code = soc_code.strip()
     if soc_code in JOB_ZONE_3_CODES:
         return {
             "status": "WARNING",
             "message": f"[WARNING] This SOC code ({soc_code}) is Job Zone 3 and should be avoided for H-1B specialty occupation.",
             "title": JOB_ZONE_3_CODES[soc_code],
+            "job_zone": 3,
+            "recommendation": "Consider finding a more specific SOC code that falls in Job Zone 4 or 5."
+        }
+    
+    soc_index = get_soc_index()
+    occupation = soc_index.lookup(soc_code) if soc_index else None
+    
+    if occupation and occupation["job_zone"] is not None and occupation["job_zone"] <= 3:
+        return {
+            "status": "WARNING",
+            "message": f"[WARNING] This SOC code ({occupation['code']}) is Job Zone {occupation['job_zone']} and should be avoided for H-1B specialty occupation.",
+            "title": occupation["title"],
+            "job_zone": occupation["job_zone"],
             "recommendation": "Consider finding a more specific SOC code that falls in Job Zone 4 or 5."
         }
+    elif occupation and occupation["job_zone"] is None:
+        return {
+            "status": "OK",
+            "message": f"[OK] SOC code {occupation['code']} is listed, but its Job Zone is not in the bundled data.",
+            "title": occupation["title"],
+            "job_zone": None,
+            "recommendation": "Check the Job Zone on O*NET OnLine before relying on this SOC code for H-1B."
+        }
+    elif occupation:
+        return {
+            "status": "OK",
+            "message": f"[OK] SOC code {occupation['code']} is Job Zone {occupation['job_zone']}.",
+            "title": occupation["title"],
+            "job_zone": occupation["job_zone"],
+            "recommendation": "Verify this SOC code aligns with the actual job duties and requirements."
+        }
     else:
         return {
             "status": "OK", 
-            "message": f"[OK] SOC code {soc_code} appears to be acceptable (not in Job Zone 3).",
-            "recommendation": "Verify this SOC code aligns with the actual job duties and requirements."
+            "message": f"[OK] SOC code {soc_code} is not in the bundled partial SOC list, so its Job Zone was not checked.",
+            "title": None,
+            "job_zone": None,
+            "recommendation": "Check the Job Zone on O*NET OnLine and verify this SOC code aligns with the actual job duties and requirements."
         }
 
+# Static reference content for the Templates and Resources tabs lives in
+# data/reference as HTML fragments listed in manifest.json
+REFERENCE_LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reference")
+
+@st.cache_resource(show_spinner=False)
+def load_reference_manifest(library_dir=REFERENCE_LIBRARY_DIR):
+    """Category tree for the reference tabs, read once per process"""
+    with open(os.path.join(library_dir, "manifest.json"), "r", encoding="utf-8") as handle:
+        return json.load(handle)["sections"]
+
+@st.cache_resource(show_spinner=False)
+def load_reference_fragment(fragment_path, library_dir=REFERENCE_LIBRARY_DIR):
+    """Read and dedent one HTML fragment the first time it is shown"""
+    with open(os.path.join(library_dir, fragment_path), "r", encoding="utf-8") as handle:
+        return textwrap.dedent(handle.read()).strip()
+
+def render_reference_section(section_key):
+    """Walk the manifest's selectboxes and render only the chosen entry's cards"""
+    entry = load_reference_manifest()[section_key]
+    while "options" in entry:
+        names = [option["name"] for option in entry["options"]]
+        choice = st.selectbox(entry["label"], names)
+        entry = entry["options"][names.index(choice)]
+    
+    columns = entry.get("columns", [])
+    if len(columns) > 1:
+        for column, fragments in zip(st.columns(len(columns)), columns):
+            with column:
+                for fragment_path in fragments:
+                    st.markdown(load_reference_fragment(fragment_path), unsafe_allow_html=True)
+    elif columns:
+        for fragment_path in columns[0]:
+            st.markdown(load_reference_fragment(fragment_path), unsafe_allow_html=True)
+
 def load_logo():
     """Load Lawtrax logo with fallback handling"""
     if not PIL_AVAILABLE:
@@ -706,40 +2847,187 @@ def main():
             help="Ask detailed questions about immigration law, policy updates, case strategies, or legal precedents."
         )
         
+        citation_index = get_citation_index()
+        ground_col, top_k_col = st.columns([2, 1])
+        with ground_col:
+            ground_in_library = st.checkbox(
+                "Ground answer in local citation library",
+                value=citation_index is not None,
+                disabled=citation_index is None,
+                help="Retrieve the best-matching CFR, INA and policy manual passages and answer from them with exact section references."
+            )
+        with top_k_col:
+            citation_top_k = st.slider("Passages", 1, 10, CITATION_TOP_K, disabled=citation_index is None)
+        
+        with st.expander("[LIBRARY] Citation Library"):
+            if citation_index is not None:
+                meta = citation_index.meta
+                st.caption(
+                    f"{meta['passages']:,} passages from {meta['sources']:,} documents, "
+                    f"{meta['terms']:,} terms, built {meta['built']}"
+                )
+            else:
+                st.caption("No citation index built yet.")
+            if CITATION_CORPUS_ROOT:
+                corpus_dir = st.text_input(
+                    f"Corpus directory under {CITATION_CORPUS_ROOT}",
+                    placeholder="regulations (CFR, INA, USCIS Policy Manual as .txt or .md)",
+                    help="Path relative to the corpus root; subdirectories are included"
+                )
+                if st.button("[BUILD] Build Citation Index"):
+                    try:
+                        corpus_path = resolve_citation_corpus_directory(corpus_dir)
+                    except ValueError as e:
+                        st.warning(str(e))
+                    else:
+                        with st.spinner("Indexing corpus..."):
+                            meta = build_citation_index(corpus_path)
+                        get_citation_index.clear()
+                        st.success(
+                            f"Indexed {meta['passages']:,} passages from {meta['sources']:,} documents "
+                            f"in {meta['build_seconds']:.1f}s"
+                        )
+            else:
+                st.caption("Set CITATION_CORPUS_ROOT on the server to build the index from a corpus directory.")
+        
+        if 'research_memory' not in st.session_state:
+            st.session_state.research_memory = new_research_memory()
+        research_memory = st.session_state.research_memory
+        
+        memory_col1, memory_col2 = st.columns([3, 1])
+        with memory_col1:
+            memory_mode = st.radio(
+                "Send session memory with",
+                RESEARCH_MEMORY_MODES,
+                horizontal=True,
+                help=f"Sends a running summary of earlier questions plus the last {RESEARCH_MEMORY_RECENT_TURNS} exchanges, "
+                     "so the prompt stays the same size however long the session runs. 'Follow-up questions only' "
+                     "sends it when the question refers back (\"what about...\", \"that option\", \"they\"), so "
+                     "standalone questions can still be answered from the cache."
+            )
+        with memory_col2:
+            if st.button("[NEW] New Research Session", use_container_width=True):
+                st.session_state.research_memory = research_memory = new_research_memory()
+        
+        research_cache = get_research_cache()
+        with st.expander("[CACHE] Similar-Question Answer Cache"):
+            cache_col1, cache_col2 = st.columns(2)
+            with cache_col1:
+                use_research_cache = st.checkbox(
+                    "Reuse answers to similar questions", value=True,
+                    help="Serve a stored answer when a near-identical question was asked recently instead of calling the API again."
+                )
+                force_fresh_answer = st.checkbox("Force a fresh answer for this question", value=False)
+            with cache_col2:
+                cache_threshold = st.slider(
+                    "Similarity threshold", 0.5, 1.0, RESEARCH_CACHE_THRESHOLD, 0.05,
+                    help="Estimated overlap between normalized questions required for a cache hit."
+                )
+            cache_stats = research_cache.stats()
+            st.caption(
+                f"{cache_stats['entries']} cached answers (kept {RESEARCH_CACHE_TTL_HOURS // 24} days), "
+                f"{cache_stats['hits']} hits served"
+            )
+            if st.button("[CLEAR] Clear Answer Cache"):
+                research_cache.clear()
+                st.success("Answer cache cleared.")
+        
         col1, col2, col3 = st.columns([1, 1, 2])
         with col1:
             if st.button("[SEARCH] Research Question", type="primary", use_container_width=True):
                 if question:
-                    with st.spinner("Conducting comprehensive legal research..."):
-                        response = generate_legal_research_response(question)
-                        if response:
-                            st.session_state.chat_history.append({
-                                "question": question,
-                                "answer": response,
-                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            })
-                            
-                            st.markdown("### [RESULTS] Research Results")
-                            st.markdown(f"""
-                            <div class="professional-card">
-                                <strong>Question:</strong> {question}<br><br>
-                                {response}
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            filename = f"Legal_Research_{timestamp}.txt"
-                            download_content = f"LAWTRAX IMMIGRATION RESEARCH\n{'='*50}\n\nQuestion: {question}\n\nResearch Results:\n{response}\n\nGenerated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                            st.download_button(
-                                "[DOWNLOAD] Download Research",
-                                data=download_content,
-                                file_name=filename,
-                                mime="text/plain",
-                                use_container_width=True
-                            )
+                    st.markdown("### [RESULTS] Research Results")
+                    research_metrics = {}
+                    passages = None
+                    if ground_in_library and citation_index is not None:
+                        passages = citation_index.search(question, citation_top_k)
+                    cache_mode = f"grounded:{citation_top_k}" if passages else "plain"
+                    
+                    continue_session = bool(research_memory["recent"]) and (
+                        memory_mode == "Always"
+                        or (memory_mode == "Follow-up questions only" and is_research_follow_up(question))
+                    )
+                    conversation_context = ""
+                    if continue_session:
+                        with st.spinner("Updating session memory..."):
+                            compact_research_memory(research_memory)
+                        conversation_context = build_research_memory_context(research_memory)
+                    if conversation_context:
+                        research_metrics["context_tokens"] = estimate_prompt_tokens(conversation_context)
+                        research_metrics["full_history_tokens"] = research_memory["full_history_tokens"]
+                    
+                    # A follow-up depends on its session, so only standalone questions use the cache
+                    cache_hit = None
+                    if use_research_cache and not force_fresh_answer and not conversation_context:
+                        cache_hit = research_cache.lookup(question, mode=cache_mode, threshold=cache_threshold)
+                    
+                    if cache_hit:
+                        st.info(
+                            f"[CACHE HIT] Reused the answer to a similar question asked {format_cache_age(cache_hit['age_seconds'])} ago "
+                            f"(similarity {cache_hit['similarity']:.0%}): \"{cache_hit['question']}\". "
+                            f"Tick 'Force a fresh answer' under the answer cache to ask again."
+                        )
+                        answer_chunks = iter([cache_hit["answer"]])
+                    else:
+                        answer_chunks = generate_legal_research_response(
+                            question, stream=True, metrics=research_metrics, passages=passages,
+                            conversation_context=conversation_context
+                        )
+                    response = render_streamed_response(
+                        answer_chunks,
+                        header_html=f"<strong>Question:</strong> {question}<br><br>"
+                    )
+                    if response and not cache_hit and use_research_cache and not conversation_context:
+                        research_cache.store(question, response, mode=cache_mode)
+                    if response:
+                        remember_research_turn(research_memory, question, response,
+                                               context_tokens=estimate_prompt_tokens(conversation_context))
+                    if passages:
+                        with st.expander(f"[SOURCES] {len(passages)} library passages used"):
+                            for number, passage in enumerate(passages, 1):
+                                st.markdown(
+                                    f"**[{number}] {passage['reference'] or 'Unreferenced passage'}** "
+                                    f"- {passage['source']} (score {passage['score']})"
+                                )
+                                st.text(passage["text"])
+                    if response:
+                        st.session_state.chat_history.append({
+                            "question": question,
+                            "answer": response,
+                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        })
+                        st.caption(format_latency_caption(research_metrics))
+                        
+                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                        filename = f"Legal_Research_{timestamp}.txt"
+                        download_content = f"LAWTRAX IMMIGRATION RESEARCH\n{'='*50}\n\nQuestion: {question}\n\nResearch Results:\n{response}\n\nGenerated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                        st.download_button(
+                            "[DOWNLOAD] Download Research",
+                            data=download_content,
+                            file_name=filename,
+                            mime="text/plain",
+                            use_container_width=True
+                        )
                 else:
                     st.warning("Please enter a research question.")
         
+        if research_memory["recent"]:
+            with st.expander(f"[MEMORY] Session Memory ({research_memory['summarized_turns'] + len(research_memory['recent'])} questions)"):
+                saved = research_memory["full_history_tokens_equivalent"] - research_memory["context_tokens_sent"]
+                kept = research_memory["recent"][-RESEARCH_MEMORY_RECENT_TURNS:]
+                pending = len(research_memory["recent"]) - len(kept)
+                kept_tokens = estimate_prompt_tokens(build_research_memory_context(dict(research_memory, recent=kept)))
+                st.caption(
+                    f"Next follow-up sends ~{kept_tokens:,} context tokens"
+                    + (f" plus a summary of {pending} more questions" if pending else "")
+                    + f" instead of ~{research_memory['full_history_tokens']:,} for the full history. "
+                    f"Saved so far this session: ~{max(saved, 0):,} prompt tokens."
+                )
+                if research_memory["summary"]:
+                    st.markdown(f"**Summary of {research_memory['summarized_turns']} earlier questions:**")
+                    st.markdown(research_memory["summary"])
+                st.markdown("**Kept verbatim:** " + " | ".join(turn["question"][:60] for turn in kept))
+        
         if st.session_state.chat_history:
             st.markdown("### [HISTORY] Recent Research History")
             for i, chat in enumerate(reversed(st.session_state.chat_history[-3:])):
@@ -811,8 +3099,13 @@ def main():
                     with col1:
                         st.markdown("**[ISSUES] Issues Identified:**")
                         if rfe_analysis and rfe_analysis['issues_identified']:
-                            for issue in rfe_analysis['issues_identified']:
-                                st.markdown(f"• {issue}")
+                            for issue in rfe_analysis['issue_details']:
+                                st.markdown(f"• {issue['label']} ({issue['match_count']} mentions)")
+                            with st.expander("[EVIDENCE] Issue Evidence Snippets"):
+                                for issue in rfe_analysis['issue_details']:
+                                    st.markdown(f"**{issue['label']}**")
+                                    for match in issue['matches']:
+                                        st.caption(f"[{match['start']}-{match['end']}] \"{match['keyword']}\": ...{match['snippet']}...")
                         else:
                             st.markdown("• General RFE requirements")
                     
@@ -824,6 +3117,14 @@ def main():
                             if rfe_analysis.get('deadline_mentioned'):
                                 st.markdown(f"• Deadline: {rfe_analysis['deadline_mentioned']}")
                             st.markdown(f"• Document Length: {len(extracted_text)} characters")
+                            # Record each uploaded document once, not on every rerun of this block
+                            docket_key = "rfe_docketed_" + hashlib.sha1(
+                                f"{uploaded_file.name}\0{extracted_text}".encode("utf-8")).hexdigest()[:16]
+                            if docket_key not in st.session_state:
+                                st.session_state[docket_key] = bool(
+                                    record_rfe_in_docket(rfe_analysis, source_document=uploaded_file.name))
+                            if st.session_state[docket_key]:
+                                st.markdown("• [DOCKET] Added to case docket")
 
         st.markdown("### [FORM] Case Information")
         
@@ -890,57 +3191,76 @@ def main():
                         "additional_details": additional_details
                     }
                     
-                    with st.spinner("Generating comprehensive RFE response..."):
-                        if st.session_state.uploaded_rfe_content:
-                            response = generate_rfe_response_from_document(
-                                st.session_state.uploaded_rfe_content, 
-                                visa_category.split(" - ")[0] if " - " in visa_category else visa_category,
-                                case_details
-                            )
-                        else:
-                            visa_code = visa_category.split(" - ")[0] if " - " in visa_category else visa_category
-                            
-                            prompt = f"""
-                            As an expert immigration attorney, draft a comprehensive RFE response for a {visa_code} petition.
-
-                            Case Details:
-                            - Visa Category: {visa_code}
-                            - Position: {case_details.get('position', 'Not specified')}
-                            - Petitioner: {case_details.get('petitioner', 'Not specified')}
-                            - Beneficiary: {case_details.get('beneficiary', 'Not specified')}
-                            - RFE Issues: {case_details.get('rfe_issues', 'Not specified')}
-                            - Additional Details: {case_details.get('additional_details', 'Not specified')}
-
-                            Provide a comprehensive legal response addressing:
-                            1. Specific requirements for {visa_code} classification
-                            2. Regulatory framework and legal standards with citations
-                            3. Evidence and documentation requirements
-                            4. Case law and precedents supporting the petition
-                            5. Industry standards and best practices
-                            6. Expert opinion recommendations
-                            7. Risk mitigation strategies
-
-                            Format as a professional legal brief suitable for USCIS submission with proper citations and legal reasoning.
-                            """
-                            
-                            response = call_openai_api(prompt, max_tokens=4000, temperature=0.2)
+                    visa_code = visa_category.split(" - ")[0] if " - " in visa_category else visa_category
+                    rfe_metrics = {}
+                    
+                    docket_analysis = {}
+                    if st.session_state.uploaded_rfe_content:
+                        docket_analysis = analyze_rfe_document(st.session_state.uploaded_rfe_content) or {}
+                    record_rfe_in_docket(
+                        {
+                            "receipt_number": receipt_number.strip() or docket_analysis.get("receipt_number"),
+                            # The date picker defaults to today, which is not a real deadline
+                            "deadline_mentioned": docket_analysis.get("deadline_mentioned")
+                                                  or (response_deadline if response_deadline > datetime.now().date() else None),
+                            "issues_identified": docket_analysis.get("issues_identified")
+                        },
+                        visa_category=visa_code,
+                        petitioner=petitioner,
+                        beneficiary=beneficiary,
+                        position=position
+                    )
+                    
+                    if st.session_state.uploaded_rfe_content:
+                        response_stream = generate_rfe_response_from_document(
+                            st.session_state.uploaded_rfe_content, 
+                            visa_code,
+                            case_details,
+                            stream=True,
+                            metrics=rfe_metrics,
+                            # Reuse the docket analysis rather than paying for it twice
+                            rfe_analysis=docket_analysis or None
+                        )
+                    else:
+                        prompt = f"""
+                        As an expert immigration attorney, draft a comprehensive RFE response for a {visa_code} petition.
+
+                        Case Details:
+                        - Visa Category: {visa_code}
+                        - Position: {case_details.get('position', 'Not specified')}
+                        - Petitioner: {case_details.get('petitioner', 'Not specified')}
+                        - Beneficiary: {case_details.get('beneficiary', 'Not specified')}
+                        - RFE Issues: {case_details.get('rfe_issues', 'Not specified')}
+                        - Additional Details: {case_details.get('additional_details', 'Not specified')}
+
+                        Provide a comprehensive legal response addressing:
+                        1. Specific requirements for {visa_code} classification
+                        2. Regulatory framework and legal standards with citations
+                        3. Evidence and documentation requirements
+                        4. Case law and precedents supporting the petition
+                        5. Industry standards and best practices
+                        6. Expert opinion recommendations
+                        7. Risk mitigation strategies
+
+                        Format as a professional legal brief suitable for USCIS submission with proper citations and legal reasoning.
+                        """
                         
-                        if response:
-                            st.subheader(f"[RESPONSE] Comprehensive RFE Response - {visa_category}")
-                            st.markdown(f"""
-                            <div class="professional-card">
-                                {response}
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.session_state['latest_rfe_response'] = {
-                                'content': response,
-                                'visa_category': visa_category,
-                                'petitioner': petitioner,
-                                'beneficiary': beneficiary
-                            }
-                            
-                            st.session_state.uploaded_rfe_content = None
+                        response_stream = stream_openai_api(prompt, max_tokens=4000, temperature=0.2, metrics=rfe_metrics, call_label="rfe_response")
+                    
+                    st.subheader(f"[RESPONSE] Comprehensive RFE Response - {visa_category}")
+                    response = render_streamed_response(response_stream)
+                    
+                    if response:
+                        st.caption(format_latency_caption(rfe_metrics))
+                        
+                        st.session_state['latest_rfe_response'] = {
+                            'content': response,
+                            'visa_category': visa_category,
+                            'petitioner': petitioner,
+                            'beneficiary': beneficiary
+                        }
+                        
+                        st.session_state.uploaded_rfe_content = None
                 else:
                     st.warning("Please upload an RFE document or manually describe the RFE issues.")
         
@@ -966,6 +3286,145 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
                 key="download_rfe_response"
             )
         
+        st.markdown("---")
+        with st.expander("[BATCH] Batch RFE Processing (ZIP or Directory)"):
+            st.markdown("""
+            <div class="upload-box">
+                <strong>[BATCH] Batch Mode:</strong> Upload a ZIP of RFE notices (PDF, DOCX or TXT) or point to a directory under the configured batch root. 
+                Each notice is extracted, analyzed and drafted in parallel, and the results are bundled with a summary CSV.
+            </div>
+            """, unsafe_allow_html=True)
+            
+            batch_zip = st.file_uploader("Upload ZIP of RFE Documents", type=["zip"], key="rfe_batch_zip")
+            batch_directory = ""
+            if RFE_BATCH_ROOT:
+                batch_directory = st.text_input(f"Or Directory under {RFE_BATCH_ROOT}", key="rfe_batch_directory",
+                                                help="Path relative to the batch root; subdirectories are included")
+            st.caption(f"Up to {RFE_BATCH_MAX_FILES} documents, {RFE_BATCH_MAX_FILE_BYTES // (1024 * 1024)} MB each")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                batch_visa_categories = []
+                for main_cat, subcats in US_VISA_CATEGORIES.items():
+                    for subcat, visas in subcats.items():
+                        for visa_code, visa_name in visas.items():
+                            batch_visa_categories.append(f"{visa_code} - {visa_name}")
+                
+                batch_visa_category = st.selectbox(
+                    "Visa Category for Batch:",
+                    ["H-1B - Specialty Occupation Workers"] + sorted(batch_visa_categories),
+                    key="rfe_batch_visa_category"
+                )
+                batch_petitioner = st.text_input("Petitioner/Employer Name (optional)", key="rfe_batch_petitioner")
+            with col2:
+                batch_workers = st.slider("Parallel Documents", 1, 8, RFE_BATCH_MAX_WORKERS, key="rfe_batch_workers",
+                                          help="Maximum number of RFEs processed at the same time; at most "
+                                               f"{OPENAI_MAX_CONCURRENT_CALLS} API calls run at once across all of them")
+            
+            if st.button("[BATCH] Process Batch", type="primary", key="rfe_batch_run"):
+                batch_files = None
+                try:
+                    batch_files = collect_rfe_batch_files(batch_zip, batch_directory)
+                except zipfile.BadZipFile:
+                    st.error("The uploaded file is not a valid ZIP archive.")
+                except ValueError as e:
+                    st.error(str(e))
+                
+                if batch_files is not None:
+                    if not batch_files:
+                        st.warning("No PDF, DOCX or TXT RFE documents found in the batch.")
+                    else:
+                        batch_visa_code = batch_visa_category.split(" - ")[0] if " - " in batch_visa_category else batch_visa_category
+                        batch_case_details = {"petitioner": batch_petitioner}
+                        
+                        batch_progress = st.progress(0.0, text=f"Processing {len(batch_files)} RFE documents...")
+                        batch_status = st.empty()
+                        completed_rows = []
+                        
+                        def report_batch_progress(result, completed, total):
+                            state = "[X] " + result["error"] if result["error"] else "[OK] Drafted"
+                            completed_rows.append({
+                                "Document": result["document"],
+                                "Status": state,
+                                "Latency (s)": round(result["latency"] or 0.0, 1)
+                            })
+                            batch_progress.progress(completed / total, text=f"Completed {completed} of {total}: {result['document']}")
+                            batch_status.dataframe(pd.DataFrame(completed_rows), use_container_width=True, hide_index=True)
+                        
+                        batch_start = time.perf_counter()
+                        batch_results = run_rfe_batch(batch_files, batch_visa_code, batch_case_details,
+                                                      max_workers=batch_workers, on_result=report_batch_progress)
+                        
+                        try:
+                            docketed = import_rfe_batch_into_docket(batch_results, visa_category=batch_visa_code,
+                                                                    petitioner=batch_petitioner)
+                        except sqlite3.Error as e:
+                            st.warning(f"Could not update the case docket: {e}")
+                            docketed = 0
+                        
+                        st.session_state['rfe_batch'] = {
+                            'results': batch_results,
+                            'visa_category': batch_visa_category,
+                            'wall_time': time.perf_counter() - batch_start,
+                            'docketed': docketed
+                        }
+            
+            if 'rfe_batch' in st.session_state:
+                batch = st.session_state['rfe_batch']
+                drafted = sum(1 for r in batch['results'] if r['response'])
+                st.markdown(f"**[RESULTS] {drafted} of {len(batch['results'])} responses drafted in {batch['wall_time']:.1f}s**")
+                st.caption(f"[DOCKET] {batch.get('docketed', 0)} cases with receipt numbers added to the case docket")
+                st.dataframe(build_rfe_batch_summary(batch['results']), use_container_width=True, hide_index=True)
+                st.download_button(
+                    "[DOWNLOAD] Download Batch Bundle (ZIP)",
+                    data=build_rfe_batch_bundle(batch['results'], batch['visa_category']),
+                    file_name=f"RFE_Batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                    mime="application/zip",
+                    key="download_rfe_batch"
+                )
+        
+        with st.expander("[DOCKET] Case Docket - Upcoming Deadlines"):
+            try:
+                docket_stats = get_docket_stats()
+                stat_col1, stat_col2, stat_col3, stat_col4 = st.columns(4)
+                stat_col1.metric("Open Cases", f"{docket_stats['open']:,}")
+                stat_col2.metric("Overdue", f"{docket_stats['overdue']:,}")
+                stat_col3.metric("Due in 7 Days", f"{docket_stats['due_7_days']:,}")
+                stat_col4.metric("No Deadline", f"{docket_stats['no_deadline']:,}")
+                
+                docket_limit = st.slider("Cases to Show", 5, 200, 25, key="docket_limit")
+                upcoming = get_upcoming_deadlines(limit=docket_limit)
+                if upcoming:
+                    st.dataframe(pd.DataFrame([
+                        {
+                            "Priority": "[OVERDUE]" if case["days_remaining"] < 0 else "[URGENT]" if case["days_remaining"] <= 7 else "[UPCOMING]",
+                            "Deadline": case["deadline"],
+                            "Days Left": case["days_remaining"],
+                            "Receipt Number": case["receipt_number"],
+                            "Visa": case["visa_category"] or "",
+                            "Petitioner": case["petitioner"] or "",
+                            "Beneficiary": case["beneficiary"] or "",
+                            "Issues": case["issues"] or ""
+                        }
+                        for case in upcoming
+                    ]), use_container_width=True, hide_index=True)
+                else:
+                    st.info("No open cases with deadlines. Analyzed RFEs with a receipt number are docketed automatically.")
+                
+                with st.form("docket_status_form"):
+                    col1, col2 = st.columns([2, 1])
+                    with col1:
+                        docket_receipt = st.text_input("Receipt Number", placeholder="EAC2190012345")
+                    with col2:
+                        docket_status = st.selectbox("Set Status", DOCKET_STATUSES, index=1)
+                    if st.form_submit_button("[UPDATE] Update Case Status") and docket_receipt:
+                        if update_docket_status(docket_receipt, docket_status):
+                            st.success(f"{docket_receipt.strip().upper()} marked as {docket_status}.")
+                        else:
+                            st.warning(f"{docket_receipt.strip().upper()} is not in the docket.")
+            except sqlite3.Error as e:
+                st.error(f"Case docket unavailable: {e}")
+        
         st.markdown("</div>", unsafe_allow_html=True)
 
     with tab3:
@@ -1042,6 +3501,16 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
                     help="What specific aspects should the expert opinion focus on?"
                 )
                 
+                drafting_mode = st.radio(
+                    "Drafting Mode",
+                    ["Template + analysis slots", "Parallel sections", "Single call"],
+                    horizontal=True,
+                    help="Template: the legal standard, declaration and signature blocks come from the firm template and "
+                         "only the position analysis is written, in parallel - fastest and uses the fewest tokens. "
+                         "Parallel sections: outline first, then every section written at the same time. "
+                         "Single call: the whole letter written in one streamed response."
+                )
+                
                 submit_position_expert = st.form_submit_button("[GENERATE] Generate Position Expert Opinion", type="primary")
                 
                 if submit_position_expert and all([expert_name, position_title, opinion_focus]):
@@ -1057,684 +3526,141 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
                         "opinion_focus": opinion_focus
                     }
                     
-                    with st.spinner("Generating expert opinion letter..."):
-                        letter = generate_expert_opinion_letter("Position Expert Opinion", expert_case_details)
-                        if letter:
-                            st.subheader("[LETTER] Position Expert Opinion Letter")
-                            st.markdown(f"""
-                            <div class="professional-card">
-                                {letter}
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.session_state['latest_expert_opinion'] = {
-                                'content': letter,
-                                'type': 'Position_Expert_Opinion',
-                                'expert': expert_name
-                            }
-            
-            if 'latest_expert_opinion' in st.session_state:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{st.session_state['latest_expert_opinion']['type']}_{timestamp}.txt"
-                download_content = f"LAWTRAX IMMIGRATION SERVICES\n{st.session_state['latest_expert_opinion']['type'].replace('_', ' ').upper()}\n{'='*60}\n\n{st.session_state['latest_expert_opinion']['content']}\n\nGenerated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                st.download_button(
-                    "[DOWNLOAD] Download Expert Opinion",
-                    data=download_content,
-                    file_name=filename,
-                    mime="text/plain",
-                    key="download_expert_opinion"
-                )
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    with tab4:
-        st.markdown("<div class='tab-content'>", unsafe_allow_html=True)
-        st.subheader("[TEMPLATES] Comprehensive Immigration Templates & Legal Frameworks")
-        
-        template_category = st.selectbox(
-            "Select Template Category:",
-            [
-                "Non-Immigrant Visa Checklists", 
-                "Immigrant Visa Checklists",
-                "RFE Response Frameworks", 
-                "Legal Argument Templates",
-                "Motion & Appeal Templates",
-                "Evidence Collection Guides",
-                "Interview Preparation Guides",
-                "Compliance & Documentation"
-            ]
-        )
-        
-        if template_category == "Non-Immigrant Visa Checklists":
-            visa_type = st.selectbox(
-                "Select Non-Immigrant Visa Type:",
-                ["H-1B Specialty Occupation", "L-1 Intracompany Transferee", "O-1 Extraordinary Ability", 
-                 "E-1/E-2 Treaty Investor/Trader", "TN NAFTA Professional", "F-1 Student", 
-                 "B-1/B-2 Visitor", "R-1 Religious Worker", "P-1 Athlete/Entertainer"]
-            )
-            
-            if visa_type == "H-1B Specialty Occupation":
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[OK] H-1B Specialty Occupation Filing Checklist</h4>
-                    
-                    <strong>[FORMS] USCIS Forms & Fees:</strong>
-                    <ul>
-                        <li>Form I-129 (signed by authorized company representative)</li>
-                        <li>H Classification Supplement to Form I-129</li>
-                        <li>USCIS filing fee ($460) + Fraud Prevention fee ($500)</li>
-                        <li>American Competitiveness fee ($750/$1,500 based on company size)</li>
-                        <li>Premium Processing fee ($2,805) if requested</li>
-                    </ul>
-                    
-                    <strong>[EMPLOYER] Employer Documentation:</strong>
-                    <ul>
-                        <li>Certified Labor Condition Application (LCA) from DOL</li>
-                        <li>Detailed support letter explaining position and requirements</li>
-                        <li>Company organizational chart showing position placement</li>
-                        <li>Evidence of employer's business operations and legitimacy</li>
-                        <li>Job description with specific duties and education requirements</li>
-                        <li>Corporate documents (incorporation, business license)</li>
-                    </ul>
+                    letter_metrics = {}
+                    st.subheader("[LETTER] Position Expert Opinion Letter")
+                    section_progress = st.empty()
                     
-                    <strong>[BENEFICIARY] Beneficiary Documentation:</strong>
-                    <ul>
-                        <li>Copy of passport biographical page</li>
-                        <li>Current immigration status documentation</li>
-                        <li>Educational credentials and evaluation</li>
-                        <li>Resume/CV with detailed work history</li>
-                        <li>Experience letters from previous employers</li>
-                        <li>Professional licenses/certifications if applicable</li>
-                    </ul>
+                    def show_section_progress(result, completed, total):
+                        status = "failed" if result["error"] else f"{result['latency']:.1f}s"
+                        section_progress.caption(f"[DRAFTING] {completed}/{total} parts done - {result['title']} ({status})")
                     
-                    <strong>[SPECIALTY] Specialty Occupation Evidence:</strong>
-                    <ul>
-                        <li>Industry standards documentation</li>
-                        <li>Comparable job postings requiring degree</li>
-                        <li>Expert opinion letter (recommended)</li>
-                        <li>Professional association requirements</li>
-                        <li>Industry salary surveys</li>
-                        <li>Academic research on position requirements</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            elif visa_type == "O-1 Extraordinary Ability":
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[OK] O-1 Extraordinary Ability Filing Checklist</h4>
-                    
-                    <strong>[FORMS] USCIS Forms & Documentation:</strong>
-                    <ul>
-                        <li>Form I-129 with O Classification Supplement</li>
-                        <li>Consultation from appropriate peer group or labor organization</li>
-                        <li>Copy of contract or summary of oral agreement</li>
-                        <li>Detailed itinerary of events/activities</li>
-                    </ul>
-                    
-                    <strong>[CRITERIA] Evidence of Extraordinary Ability (O-1A - Sciences/Education/Business/Athletics):</strong>
-                    <ul>
-                        <li>Major awards or prizes for excellence</li>
-                        <li>Membership in exclusive associations requiring outstanding achievements</li>
-                        <li>Published material about beneficiary in professional publications</li>
-                        <li>Evidence of original contributions of major significance</li>
-                        <li>Authorship of scholarly articles in professional journals</li>
-                        <li>High salary or remuneration compared to others in field</li>
-                        <li>Critical employment in distinguished organizations</li>
-                        <li>Commercial successes in performing arts</li>
-                    </ul>
-                    
-                    <strong>[ARTS] Evidence for O-1B (Arts/Motion Pictures/TV):</strong>
-                    <ul>
-                        <li>Leading/starring roles in distinguished productions</li>
-                        <li>Critical reviews and recognition in major newspapers</li>
-                        <li>Commercial or critically acclaimed successes</li>
-                        <li>Recognition from industry organizations</li>
-                        <li>High salary compared to others in field</li>
-                    </ul>
-                    
-                    <strong>[SUPPORT] Supporting Documentation:</strong>
-                    <ul>
-                        <li>Detailed consultation letter from peer group</li>
-                        <li>Expert opinion letters from industry professionals</li>
-                        <li>Media coverage and press articles</li>
-                        <li>Awards, certificates, and recognition letters</li>
-                        <li>Employment verification and salary documentation</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+                    if drafting_mode == "Parallel sections":
+                        section_progress.caption("[DRAFTING] Outlining letter...")
+                    elif drafting_mode == "Template + analysis slots":
+                        section_progress.caption("[DRAFTING] Writing analysis slots...")
+                    letter = render_streamed_response(
+                        generate_expert_opinion_letter(
+                            "Position Expert Opinion", expert_case_details, stream=True, metrics=letter_metrics,
+                            sectioned=drafting_mode == "Parallel sections",
+                            templated=drafting_mode == "Template + analysis slots",
+                            on_section=show_section_progress
+                        )
+                    )
+                    section_progress.empty()
+                    if letter:
+                        st.caption(format_latency_caption(letter_metrics))
+                        
+                        st.session_state['latest_expert_opinion'] = {
+                            'content': letter,
+                            'type': 'Position_Expert_Opinion',
+                            'expert': expert_name
+                        }
         
-        elif template_category == "Immigrant Visa Checklists":
-            immigrant_type = st.selectbox(
-                "Select Green Card/Immigrant Visa Category:",
-                ["EB-1 Priority Workers", "EB-2 Advanced Degree/NIW", "EB-3 Skilled Workers", 
-                 "EB-5 Investor Green Card", "Family-Based (Immediate Relatives)", "Family-Based (Preference Categories)", 
-                 "Adjustment of Status (I-485)", "Consular Processing", "Green Card Renewal (I-90)",
-                 "Removal of Conditions (I-751)", "Asylum-Based Adjustment", "Diversity Visa"]
-            )
-            
-            if immigrant_type == "EB-1 Priority Workers":
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[OK] EB-1 Priority Worker Green Card Checklist</h4>
-                    
-                    <strong>[FORMS] Form I-140 Package:</strong>
-                    <ul>
-                        <li>Form I-140 (signed by petitioner)</li>
-                        <li>USCIS filing fee ($2,805)</li>
-                        <li>Premium Processing fee ($2,805) if requested</li>
-                        <li>Supporting evidence based on subcategory</li>
-                    </ul>
-                    
-                    <strong>[EB-1A] EB-1A Extraordinary Ability Requirements:</strong>
-                    <ul>
-                        <li>Evidence of sustained national/international acclaim</li>
-                        <li>One-time major international award OR</li>
-                        <li>At least 3 of the 10 regulatory criteria:</li>
-                        <li>  - Major awards/prizes for excellence</li>
-                        <li>  - Membership in exclusive associations</li>
-                        <li>  - Published material about beneficiary</li>
-                        <li>  - Judging work of others in field</li>
-                        <li>  - Original contributions of major significance</li>
-                        <li>  - Scholarly articles by beneficiary</li>
-                        <li>  - Critical employment in distinguished organizations</li>
-                        <li>  - High salary/remuneration</li>
-                        <li>  - Commercial successes in performing arts</li>
-                        <li>  - Display of work at artistic exhibitions</li>
-                    </ul>
-                    
-                    <strong>[EB-1B] EB-1B Outstanding Professor/Researcher:</strong>
-                    <ul>
-                        <li>Evidence of international recognition</li>
-                        <li>At least 3 years experience in teaching/research</li>
-                        <li>Job offer for tenure track or permanent research position</li>
-                        <li>At least 2 of 6 regulatory criteria</li>
-                        <li>Major awards for outstanding achievements</li>
-                        <li>Membership in associations requiring outstanding achievements</li>
-                        <li>Published material written by others about beneficiary's work</li>
-                        <li>Participation as judge of others' work</li>
-                        <li>Original scientific or scholarly research contributions</li>
-                        <li>Authorship of scholarly books or articles</li>
-                    </ul>
-                    
-                    <strong>[EB-1C] EB-1C Multinational Manager/Executive:</strong>
-                    <ul>
-                        <li>Evidence of qualifying employment abroad (1 year in past 3)</li>
-                        <li>Proof of qualifying relationship between entities</li>
-                        <li>Evidence of managerial/executive capacity abroad and in US</li>
-                        <li>Job offer for managerial/executive position in US</li>
-                        <li>Corporate documents showing relationship</li>
-                        <li>Organizational charts and business operations evidence</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+        elif letter_type in ["Beneficiary Qualifications Expert Opinion", "Academic Credential Evaluation"]:
+            st.markdown("""
+            <div class="info-box">
+                <strong>[BENEFICIARY] Beneficiary Qualifications Expert Opinion:</strong> Evaluate whether the beneficiary's 
+                education and experience equal a U.S. degree in the specialty the position requires.
+            </div>
+            """, unsafe_allow_html=True)
             
-            elif immigrant_type == "Adjustment of Status (I-485)":
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[OK] Adjustment of Status (I-485) Checklist</h4>
-                    
-                    <strong>[FORMS] Required Forms and Fees:</strong>
-                    <ul>
-                        <li>Form I-485 (Application to Adjust Status)</li>
-                        <li>Filing fee: $1,440 (includes biometrics)</li>
-                        <li>Medical examination (Form I-693)</li>
-                        <li>Form I-864 Affidavit of Support (if required)</li>
-                    </ul>
-                    
-                    <strong>[DOCS] Supporting Documentation:</strong>
-                    <ul>
-                        <li>Copy of birth certificate</li>
-                        <li>Copy of passport biographical pages</li>
-                        <li>Copy of current immigration status documents</li>
-                        <li>Two passport-style photographs</li>
-                        <li>Form I-94 arrival/departure record</li>
-                        <li>Copy of approved immigrant petition (I-130, I-140, etc.)</li>
-                    </ul>
+            with st.form("beneficiary_expert_form"):
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    expert_name = st.text_input("Expert Name")
+                    expert_title = st.text_input("Expert Title/Position")
+                    expert_company = st.text_input("Expert Company/Organization")
+                    expert_credentials = st.text_area("Expert Credentials & Experience", height=80)
                     
-                    <strong>[MEDICAL] Medical Examination Requirements:</strong>
-                    <ul>
-                        <li>Completed by USCIS-designated civil surgeon</li>
-                        <li>Vaccination records and requirements</li>
-                        <li>Physical examination and medical history</li>
-                        <li>Tuberculosis screening and blood tests</li>
-                        <li>Mental health evaluation if indicated</li>
-                    </ul>
+                with col2:
+                    beneficiary_name = st.text_input("Beneficiary Name")
+                    position_title = st.text_input("Position")
+                    job_duties = st.text_area("Position Duties & Requirements", height=80)
+                
+                education = st.text_area("Beneficiary Education (degrees, institutions, fields, years)", height=80)
+                experience = st.text_area("Beneficiary Experience (employers, roles, years)", height=80)
+                
+                # Parallel sections follow the position-letter outline, so only these two apply here
+                drafting_mode = st.radio(
+                    "Drafting Mode",
+                    ["Template + analysis slots", "Single call"],
+                    horizontal=True,
+                    help="Template: the legal standard, declaration and signature blocks come from the firm template and "
+                         "only the credential and experience analysis is written, in parallel. "
+                         "Single call: the whole letter written in one streamed response."
+                )
+                
+                submit_beneficiary_expert = st.form_submit_button("[GENERATE] Generate Beneficiary Qualifications Opinion",
+                                                                  type="primary")
+                
+                if submit_beneficiary_expert and all([expert_name, beneficiary_name, position_title, education]):
+                    expert_case_details = {
+                        "expert_name": expert_name,
+                        "expert_title": expert_title,
+                        "expert_company": expert_company,
+                        "expert_credentials": expert_credentials,
+                        "beneficiary_name": beneficiary_name,
+                        "position": position_title,
+                        "job_duties": job_duties,
+                        "education": education,
+                        "experience": experience
+                    }
                     
-                    <strong>[SUPPORT] Affidavit of Support (I-864) Requirements:</strong>
-                    <ul>
-                        <li>Required for family-based and some employment cases</li>
-                        <li>Sponsor must meet income requirements (125% of poverty guidelines)</li>
-                        <li>Tax returns for most recent 3 years</li>
-                        <li>Employment verification letter</li>
-                        <li>Bank statements and asset documentation</li>
-                    </ul>
+                    letter_metrics = {}
+                    st.subheader("[LETTER] Beneficiary Qualifications Expert Opinion Letter")
+                    section_progress = st.empty()
                     
-                    <strong>[ISSUES] Inadmissibility Issues:</strong>
-                    <ul>
-                        <li>Criminal history disclosure and documentation</li>
-                        <li>Immigration violations and unlawful presence</li>
-                        <li>Public charge considerations</li>
-                        <li>Waiver applications if needed (I-601, I-601A)</li>
-                    </ul>
+                    def show_slot_progress(result, completed, total):
+                        status = "failed" if result["error"] else f"{result['latency']:.1f}s"
+                        section_progress.caption(f"[DRAFTING] {completed}/{total} parts done - {result['title']} ({status})")
                     
-                    <strong>[WORK] Work Authorization:</strong>
-                    <ul>
-                        <li>Form I-765 can be filed concurrently</li>
-                        <li>No additional fee when filed with I-485</li>
-                        <li>Employment authorization typically granted while I-485 pending</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+                    if drafting_mode == "Template + analysis slots":
+                        section_progress.caption("[DRAFTING] Writing analysis slots...")
+                    letter = render_streamed_response(
+                        generate_expert_opinion_letter(
+                            "Beneficiary Qualifications Expert Opinion", expert_case_details, stream=True,
+                            metrics=letter_metrics, templated=drafting_mode == "Template + analysis slots",
+                            on_section=show_slot_progress
+                        )
+                    )
+                    section_progress.empty()
+                    if letter:
+                        st.caption(format_latency_caption(letter_metrics))
+                        
+                        st.session_state['latest_expert_opinion'] = {
+                            'content': letter,
+                            'type': 'Beneficiary_Qualifications_Expert_Opinion',
+                            'expert': expert_name
+                        }
         
-        elif template_category == "RFE Response Frameworks":
-            rfe_framework = st.selectbox(
-                "Select RFE Response Framework:",
-                ["Specialty Occupation Framework", "Extraordinary Ability Framework", 
-                 "Beneficiary Qualifications Framework", "Employer-Employee Relationship", 
-                 "Ability to Pay Framework", "Bona Fide Marriage Framework"]
+        if 'latest_expert_opinion' in st.session_state:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{st.session_state['latest_expert_opinion']['type']}_{timestamp}.txt"
+            download_content = f"LAWTRAX IMMIGRATION SERVICES\n{st.session_state['latest_expert_opinion']['type'].replace('_', ' ').upper()}\n{'='*60}\n\n{st.session_state['latest_expert_opinion']['content']}\n\nGenerated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            st.download_button(
+                "[DOWNLOAD] Download Expert Opinion",
+                data=download_content,
+                file_name=filename,
+                mime="text/plain",
+                key="download_expert_opinion"
             )
-            
-            if rfe_framework == "Specialty Occupation Framework":
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[TARGET] Specialty Occupation RFE Response Framework</h4>
-                    
-                    <strong>I. Legal Framework Analysis</strong>
-                    <ul>
-                        <li>8 CFR 214.2(h)(4)(iii)(A) - Specialty occupation definition</li>
-                        <li>INA Section 214(i)(1) - H-1B requirements</li>
-                        <li>USCIS Policy Manual guidance</li>
-                        <li>Relevant case law and precedents</li>
-                    </ul>
-                    
-                    <strong>II. Four-Prong Analysis Structure</strong>
-                    
-                    <strong>Prong 1: Degree Normally Required by Industry</strong>
-                    <ul>
-                        <li>Industry surveys and employment data</li>
-                        <li>Professional association standards</li>
-                        <li>Academic research on industry requirements</li>
-                        <li>Government labor statistics and reports</li>
-                    </ul>
-                    
-                    <strong>Prong 2: Degree Requirement Common Among Similar Employers</strong>
-                    <ul>
-                        <li>Comparative job postings from similar companies</li>
-                        <li>Industry hiring practices documentation</li>
-                        <li>Professional networking site analysis</li>
-                        <li>Competitor analysis and benchmarking</li>
-                    </ul>
-                    
-                    <strong>Prong 3: Employer Normally Requires Degree</strong>
-                    <ul>
-                        <li>Company hiring policies and procedures</li>
-                        <li>Historical hiring data for similar positions</li>
-                        <li>Job descriptions and qualification requirements</li>
-                        <li>Organizational structure and reporting relationships</li>
-                    </ul>
-                    
-                    <strong>Prong 4: Position Nature is Specialized and Complex</strong>
-                    <ul>
-                        <li>Detailed analysis of job duties and responsibilities</li>
-                        <li>Technical complexity and specialization requirements</li>
-                        <li>Independent judgment and decision-making authority</li>
-                        <li>Advanced knowledge and skills application</li>
-                    </ul>
-                    
-                    <strong>III. Supporting Evidence Strategy</strong>
-                    <ul>
-                        <li>Expert opinion letters from industry professionals</li>
-                        <li>Academic and professional literature citations</li>
-                        <li>Industry standards and best practices documentation</li>
-                        <li>Professional certification and licensing requirements</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
         
         st.markdown("</div>", unsafe_allow_html=True)
 
-    with tab5:
+    with tab4:
         st.markdown("<div class='tab-content'>", unsafe_allow_html=True)
-        st.subheader("[RESOURCES] Comprehensive US Immigration Law Resources")
-        
-        resource_category = st.selectbox(
-            "Select Resource Category:",
-            ["Statutes & Regulations", "Case Law & Precedents", "USCIS Policy & Guidance", 
-             "BIA Decisions", "Federal Court Decisions", "Country Conditions Resources", 
-             "Professional Development", "Research Tools & Databases"]
-        )
-        
-        if resource_category == "Statutes & Regulations":
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[LAW] Immigration and Nationality Act (INA)</h4>
-                    <ul>
-                        <li><strong>INA § 101</strong> - Definitions</li>
-                        <li><strong>INA § 201</strong> - Numerical Limitations on Individual Foreign States</li>
-                        <li><strong>INA § 203</strong> - Allocation of Immigrant Visas</li>
-                        <li><strong>INA § 212</strong> - Excludable Aliens (Inadmissibility)</li>
-                        <li><strong>INA § 214</strong> - Admission of Nonimmigrants</li>
-                        <li><strong>INA § 216</strong> - Conditional Permanent Resident Status</li>
-                        <li><strong>INA § 237</strong> - Deportable Aliens (Removal)</li>
-                        <li><strong>INA § 240</strong> - Removal Proceedings</li>
-                        <li><strong>INA § 240A</strong> - Cancellation of Removal</li>
-                        <li><strong>INA § 245</strong> - Adjustment of Status</li>
-                        <li><strong>INA § 316</strong> - Requirements for Naturalization</li>
-                    </ul>
-                    
-                    <h4>[CONSTITUTION] Key Constitutional Provisions</h4>
-                    <ul>
-                        <li><strong>5th Amendment</strong> - Due Process (applies to all persons)</li>
-                        <li><strong>14th Amendment</strong> - Equal Protection and Due Process</li>
-                        <li><strong>Article I, § 8</strong> - Congressional Power over Immigration</li>
-                        <li><strong>Supremacy Clause</strong> - Federal vs. State Authority</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            with col2:
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[REGS] Code of Federal Regulations (CFR)</h4>
-                    
-                    <strong>8 CFR - Key Immigration Regulations:</strong>
-                    <ul>
-                        <li><strong>8 CFR 103</strong> - Immigration Benefit Procedures</li>
-                        <li><strong>8 CFR 214.1</strong> - General Nonimmigrant Classifications</li>
-                        <li><strong>8 CFR 214.2(b)</strong> - B-1/B-2 Visitors</li>
-                        <li><strong>8 CFR 214.2(f)</strong> - F-1/F-2 Students</li>
-                        <li><strong>8 CFR 214.2(h)</strong> - H Classifications</li>
-                        <li><strong>8 CFR 214.2(l)</strong> - L Classifications</li>
-                        <li><strong>8 CFR 214.2(o)</strong> - O Classifications</li>
-                        <li><strong>8 CFR 204</strong> - Immigrant Petitions</li>
-                        <li><strong>8 CFR 245</strong> - Adjustment of Status</li>
-                        <li><strong>8 CFR 1003</strong> - Immigration Court Procedures</li>
-                        <li><strong>8 CFR 1208</strong> - Asylum Procedures</li>
-                        <li><strong>8 CFR 1240</strong> - Removal Proceedings</li>
-                    </ul>
-                    
-                    <strong>Other Relevant CFR Sections:</strong>
-                    <ul>
-                        <li><strong>20 CFR 655</strong> - Labor Certification (DOL)</li>
-                        <li><strong>22 CFR 40-42</strong> - Consular Processing (State Dept)</li>
-                        <li><strong>28 CFR</strong> - DOJ Immigration Procedures</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+        st.subheader("[TEMPLATES] Comprehensive Immigration Templates & Legal Frameworks")
         
-        elif resource_category == "USCIS Policy & Guidance":
-            st.markdown("""
-            <div class="professional-card">
-                <h4>[POLICY] USCIS Policy Manual & Comprehensive Guidance</h4>
-                
-                <strong>[VOLUMES] USCIS Policy Manual Volumes (Complete Coverage):</strong>
-                <ul>
-                    <li><strong>Volume 1</strong> - General Policies and Procedures</li>
-                    <li><strong>Volume 2</strong> - Nonimmigrants (H, L, O, P, E, TN, F, B, etc.)</li>
-                    <li><strong>Volume 3</strong> - Humanitarian Programs (Asylum, Refugee, TPS, VAWA)</li>
-                    <li><strong>Volume 4</strong> - Travel and Identity Documents</li>
-                    <li><strong>Volume 5</strong> - Adoptions</li>
-                    <li><strong>Volume 6</strong> - Immigrants (EB-1, EB-2, EB-3, EB-4, EB-5)</li>
-                    <li><strong>Volume 7</strong> - Adjustment of Status (I-485)</li>
-                    <li><strong>Volume 8</strong> - Admissibility (Grounds of Inadmissibility)</li>
-                    <li><strong>Volume 9</strong> - Waivers and Other Forms of Relief</li>
-                    <li><strong>Volume 10</strong> - Employment Authorization</li>
-                    <li><strong>Volume 11</strong> - Travel Documents</li>
-                    <li><strong>Volume 12</strong> - Citizenship and Naturalization</li>
-                    <li><strong>Volume 13</strong> - Executive Orders and Delegation</li>
-                    <li><strong>Volume 14</strong> - USCIS Officer Safety</li>
-                </ul>
-                
-                <strong>[MEMOS] Critical USCIS Policy Memoranda:</strong>
-                <ul>
-                    <li><strong>Brand Memo (1999)</strong> - H-1B Specialty Occupation Standards</li>
-                    <li><strong>Cronin Memo (2000)</strong> - H-1B Itinerary Requirements</li>
-                    <li><strong>Yates Memo (2005)</strong> - H-1B Beneficiary's Education</li>
-                    <li><strong>Neufeld Memo (2010)</strong> - H-1B Employer-Employee Relationship</li>
-                    <li><strong>Kazarian Decision (2010)</strong> - EB-1A Two-Step Analysis</li>
-                    <li><strong>Dhanasar Decision (2016)</strong> - EB-2 National Interest Waiver</li>
-                    <li><strong>Matter of W-Y-U (2018)</strong> - L-1B Specialized Knowledge</li>
-                    <li><strong>Public Charge Rule (2019-2021)</strong> - Inadmissibility Determinations</li>
-                    <li><strong>COVID-19 Flexibility (2020-2023)</strong> - Pandemic Accommodations</li>
-                </ul>
-                
-                <strong>[PROCESSING] Current USCIS Processing Information:</strong>
-                <ul>
-                    <li><strong>Processing Times</strong> - Updated monthly for all offices and forms</li>
-                    <li><strong>Premium Processing</strong> - Available forms and current fees</li>
-                    <li><strong>Fee Schedule</strong> - Current USCIS filing fees (updated periodically)</li>
-                    <li><strong>Forms and Instructions</strong> - Latest versions with completion guides</li>
-                    <li><strong>Field Office Directories</strong> - Locations and contact information</li>
-                    <li><strong>Service Center Operations</strong> - Jurisdiction and specializations</li>
-                </ul>
-                
-                <strong>[STATS] USCIS Data and Statistics:</strong>
-                <ul>
-                    <li><strong>Annual Reports</strong> - Comprehensive immigration statistics</li>
-                    <li><strong>Quarterly Reports</strong> - Current processing data</li>
-                    <li><strong>H-1B Cap Data</strong> - Annual registration and selection statistics</li>
-                    <li><strong>Green Card Statistics</strong> - Issuance data by category</li>
-                    <li><strong>Naturalization Data</strong> - Citizenship processing statistics</li>
-                    <li><strong>Refugee and Asylum Statistics</strong> - Protection case data</li>
-                </ul>
-                
-                <strong>[OFFICES] USCIS Office Structure and Operations:</strong>
-                <ul>
-                    <li><strong>National Benefits Center (NBC)</strong> - Centralized processing</li>
-                    <li><strong>Service Centers:</strong></li>
-                    <li>  - California Service Center (CSC)</li>
-                    <li>  - Nebraska Service Center (NSC)</li>
-                    <li>  - Texas Service Center (TSC)</li>
-                    <li>  - Vermont Service Center (VSC)</li>
-                    <li>  - Potomac Service Center (PSC)</li>
-                    <li><strong>Field Offices</strong> - Interview and application support offices nationwide</li>
-                    <li><strong>Application Support Centers (ASCs)</strong> - Biometrics collection</li>
-                </ul>
-                
-                <strong>[FORMS] USCIS Forms Library (Key Forms):</strong>
-                <ul>
-                    <li><strong>I-129</strong> - Nonimmigrant Worker Petition</li>
-                    <li><strong>I-130</strong> - Family-Based Immigrant Petition</li>
-                    <li><strong>I-140</strong> - Employment-Based Immigrant Petition</li>
-                    <li><strong>I-485</strong> - Adjustment of Status Application</li>
-                    <li><strong>I-539</strong> - Change/Extension of Nonimmigrant Status</li>
-                    <li><strong>I-765</strong> - Employment Authorization Application</li>
-                    <li><strong>I-131</strong> - Travel Document Application</li>
-                    <li><strong>I-751</strong> - Removal of Conditions on Residence</li>
-                    <li><strong>I-90</strong> - Green Card Renewal/Replacement</li>
-                    <li><strong>N-400</strong> - Naturalization Application</li>
-                    <li><strong>I-589</strong> - Asylum Application</li>
-                    <li><strong>I-601</strong> - Inadmissibility Waiver</li>
-                    <li><strong>I-601A</strong> - Provisional Unlawful Presence Waiver</li>
-                    <li><strong>I-864</strong> - Affidavit of Support</li>
-                    <li><strong>I-693</strong> - Medical Examination Report</li>
-                </ul>
-                
-                <strong>[FEES] Current USCIS Fee Structure (2024):</strong>
-                <ul>
-                    <li><strong>I-129</strong> - $460 (base fee) + additional fees</li>
-                    <li><strong>I-140</strong> - $2,805</li>
-                    <li><strong>I-485</strong> - $1,440 (includes biometrics)</li>
-                    <li><strong>Premium Processing</strong> - $2,805 (15 calendar days)</li>
-                    <li><strong>Biometrics</strong> - $85 (when separate)</li>
-                    <li><strong>N-400</strong> - $760</li>
-                    <li><strong>Fee Waivers</strong> - Available for qualified applicants</li>
-                </ul>
-                
-                <strong>[SYSTEMS] USCIS Electronic Systems:</strong>
-                <ul>
-                    <li><strong>myUSCIS Account</strong> - Online case management</li>
-                    <li><strong>H-1B Electronic Registration</strong> - Cap season registration</li>
-                    <li><strong>USCIS Contact Center</strong> - 1-800-375-5283</li>
-                    <li><strong>Case Status Online</strong> - Real-time case tracking</li>
-                    <li><strong>InfoPass Appointments</strong> - Field office scheduling</li>
-                    <li><strong>E-Filing System</strong> - Online form submission</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
+        render_reference_section("templates")
         
-        elif resource_category == "Case Law & Precedents":
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[SUPREME] Supreme Court Immigration Cases</h4>
-                    
-                    <strong>Foundational Cases:</strong>
-                    <ul>
-                        <li><em>Chae Chan Ping v. United States</em> (1889) - Plenary Power Doctrine</li>
-                        <li><em>Yick Wo v. Hopkins</em> (1886) - Equal Protection for Non-Citizens</li>
-                        <li><em>Mathews v. Diaz</em> (1976) - Federal Immigration Power</li>
-                        <li><em>Landon v. Plasencia</em> (1982) - Due Process Rights</li>
-                        <li><em>INS v. Chadha</em> (1983) - Legislative Veto Invalidation</li>
-                    </ul>
-                    
-                    <strong>Modern Supreme Court Decisions:</strong>
-                    <ul>
-                        <li><em>Zadvydas v. Davis</em> (2001) - Indefinite Detention</li>
-                        <li><em>INS v. St. Cyr</em> (2001) - Retroactivity and Habeas</li>
-                        <li><em>Demore v. Kim</em> (2003) - Mandatory Detention</li>
-                        <li><em>Clark v. Martinez</em> (2005) - Constitutional Avoidance</li>
-                        <li><em>Kucana v. Holder</em> (2010) - Judicial Review</li>
-                        <li><em>Arizona v. United States</em> (2012) - State Immigration Laws</li>
-                        <li><em>Kerry v. Din</em> (2015) - Consular Processing Due Process</li>
-                        <li><em>Sessions v. Morales-Santana</em> (2017) - Citizenship Gender Equality</li>
-                        <li><em>Pereira v. Sessions</em> (2018) - Notice to Appear Requirements</li>
-                        <li><em>Barton v. Barr</em> (2020) - Categorical Approach</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            with col2:
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[CIRCUIT] Key Circuit Court Decisions</h4>
-                    
-                    <strong>Employment-Based Immigration:</strong>
-                    <ul>
-                        <li><em>Defensor v. Meissner</em> (D.C. Cir. 1999) - Specialty Occupation</li>
-                        <li><em>Royal Siam Corp. v. Chertoff</em> (D.C. Cir. 2007) - H-1B Standards</li>
-                        <li><em>Innova Solutions v. Baran</em> (D.C. Cir. 2018) - SOC Code Analysis</li>
-                        <li><em>Kazarian v. USCIS</em> (9th Cir. 2010) - EB-1A Two-Step Analysis</li>
-                    </ul>
-                    
-                    <strong>Removal Defense & Protection:</strong>
-                    <ul>
-                        <li><em>Matter of Mogharrabi</em> (9th Cir. 1987) - Persecution Definition</li>
-                        <li><em>INS v. Elias-Zacarias</em> (1992) - Political Opinion</li>
-                        <li><em>Cece v. Holder</em> (7th Cir. 2013) - Social Group</li>
-                        <li><em>Restrepo v. McAleenan</em> (9th Cir. 2019) - Domestic Violence</li>
-                    </ul>
-                    
-                    <strong>Family-Based Immigration:</strong>
-                    <ul>
-                        <li><em>Matter of Brantigan</em> (BIA 1977) - Bona Fide Marriage</li>
-                        <li><em>Bark v. INS</em> (9th Cir. 1975) - Marriage Fraud</li>
-                        <li><em>Adams v. Howerton</em> (9th Cir. 1980) - Same-Sex Marriage</li>
-                    </ul>
-                    
-                    <strong>Naturalization & Citizenship:</strong>
-                    <ul>
-                        <li><em>Fedorenko v. United States</em> (1981) - Good Moral Character</li>
-                        <li><em>Kungys v. United States</em> (1988) - Materiality Standard</li>
-                        <li><em>Maslenjak v. United States</em> (2017) - Denaturalization</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with tab5:
+        st.markdown("<div class='tab-content'>", unsafe_allow_html=True)
+        st.subheader("[RESOURCES] Comprehensive US Immigration Law Resources")
         
-        elif resource_category == "Professional Development":
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[EDUCATION] Immigration Law Education & Training</h4>
-                    
-                    <strong>Professional Organizations:</strong>
-                    <ul>
-                        <li><strong>American Immigration Lawyers Association (AILA)</strong></li>
-                        <li>  - National conferences and workshops</li>
-                        <li>  - Practice advisories and liaison meetings</li>
-                        <li>  - Member forums and networking</li>
-                        <li>  - Ethics and professional responsibility</li>
-                        <li><strong>American Bar Association Immigration Section</strong></li>
-                        <li><strong>Federal Bar Association Immigration Law Section</strong></li>
-                        <li><strong>National Immigration Forum</strong></li>
-                        <li><strong>State and Local Bar Immigration Committees</strong></li>
-                    </ul>
-                    
-                    <strong>Continuing Legal Education Providers:</strong>
-                    <ul>
-                        <li><strong>AILA University</strong> - Comprehensive training programs</li>
-                        <li><strong>CLE International</strong> - Immigration law specialization</li>
-                        <li><strong>American University</strong> - Immigration CLE courses</li>
-                        <li><strong>Georgetown Law</strong> - Immigration law programs</li>
-                        <li><strong>Practicing Law Institute (PLI)</strong> - Immigration track</li>
-                        <li><strong>National Institute for Trial Advocacy</strong> - Immigration trial skills</li>
-                    </ul>
-                    
-                    <strong>Certification and Specialization:</strong>
-                    <ul>
-                        <li><strong>Board Certification in Immigration Law</strong></li>
-                        <li>  - State bar certification programs</li>
-                        <li>  - Continuing education requirements</li>
-                        <li>  - Peer review and examination</li>
-                        <li><strong>AILA Basic Immigration Law Course</strong></li>
-                        <li><strong>Advanced Practice Specializations</strong></li>
-                        <li><strong>Asylum and Refugee Law Certification</strong></li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            with col2:
-                st.markdown("""
-                <div class="professional-card">
-                    <h4>[PUBLICATIONS] Essential Immigration Law Publications</h4>
-                    
-                    <strong>Primary Treatises and References:</strong>
-                    <ul>
-                        <li><strong>Kurzban's Immigration Law Sourcebook</strong> - Annual updates</li>
-                        <li><strong>Steel on Immigration Law</strong> - Comprehensive treatise</li>
-                        <li><strong>Fragomen Immigration Law Handbook</strong></li>
-                        <li><strong>Austin T. Fragomen Immigration Procedures Handbook</strong></li>
-                        <li><strong>AILA's Immigration Law Today</strong> - Current developments</li>
-                    </ul>
-                    
-                    <strong>Specialized Practice Guides:</strong>
-                    <ul>
-                        <li><strong>Business Immigration Law</strong> - Employment-based practice</li>
-                        <li><strong>Family-Based Immigration Practice</strong></li>
-                        <li><strong>Asylum and Refugee Law Practice Guide</strong></li>
-                        <li><strong>Removal Defense and Litigation</strong></li>
-                        <li><strong>Naturalization and Citizenship Law</strong></li>
-                        <li><strong>Immigration Consequences of Criminal Convictions</strong></li>
-                    </ul>
-                    
-                    <strong>Journals and Periodicals:</strong>
-                    <ul>
-                        <li><strong>Immigration Law Today</strong> - AILA publication</li>
-                        <li><strong>Interpreter Releases</strong> - Weekly updates</li>
-                        <li><strong>Immigration Daily</strong> - News and analysis</li>
-                        <li><strong>Bender's Immigration Bulletin</strong></li>
-                        <li><strong>Georgetown Immigration Law Journal</strong></li>
-                        <li><strong>Stanford Law Review Immigration Symposium</strong></li>
-                    </ul>
-                    
-                    <strong>Electronic Resources:</strong>
-                    <ul>
-                        <li><strong>AILA InfoNet</strong> - Member research database</li>
-                        <li><strong>ILW.com</strong> - Immigration news portal</li>
-                        <li><strong>Immigration Library</strong> - Case law database</li>
-                        <li><strong>Immlaw.com</strong> - Practice resources</li>
-                        <li><strong>CLINIC Network</strong> - Pro bono resources</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
+        render_reference_section("resources")
         
         # Enhanced SOC Code Checker Tool
         st.markdown("---")
@@ -1751,6 +3677,31 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
         )
         
         if tool_type == "SOC Code Checker":
+            soc_index = get_soc_index()
+            if soc_index:
+                st.caption(f"Bundled SOC list: {len(soc_index.records)} occupations - a partial list, not the full "
+                           "O*NET taxonomy. Codes that are not listed are not checked.")
+                soc_query = st.text_input(
+                    "Search SOC Codes by Title or Code Prefix",
+                    placeholder="Example: software dev, data scien, 15-12",
+                    help="Searches the bundled O*NET titles and alternate titles; tolerant of typos"
+                )
+                if soc_query:
+                    soc_matches = soc_index.search(soc_query, limit=10)
+                    if soc_matches:
+                        st.dataframe(pd.DataFrame([
+                            {
+                                "SOC Code": match["code"],
+                                "Title": match["title"],
+                                "Job Zone": match["job_zone"],
+                                "H-1B Note": ("Job Zone unknown" if match["job_zone"] is None
+                                              else "[WARNING] Job Zone 3 or below" if match["job_zone"] <= 3 else "[OK]")
+                            }
+                            for match in soc_matches
+                        ]), use_container_width=True, hide_index=True)
+                    else:
+                        st.info("No matching SOC codes found.")
+            
             with st.form("comprehensive_soc_checker"):
                 col1, col2 = st.columns([2, 1])
                 with col1:
@@ -1778,6 +3729,7 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
                         <div class="success-box">
                             <strong>[OK] SOC Code Analysis Result:</strong><br>
                             {result["message"]}<br>
+                            {f'<strong>Position Title:</strong> {result["title"]}<br>' if result.get("title") else ''}
                             <strong>Professional Recommendation:</strong> {result["recommendation"]}<br>
                             <strong>Next Steps:</strong> Verify job duties align with SOC code description and gather supporting industry evidence.
                         </div>
@@ -6,13 +6,24 @@ Fixed to properly read all 8 parts using enhanced agentic approach
 """
 
 import streamlit as st
+import pandas as pd
 import json
 import re
 import os
+import time
+import random
+import hashlib
+import csv
+import io
+import itertools
+import bisect
+import difflib
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass, field as dataclass_field, asdict
-import uuid
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Any
+from dataclasses import dataclass, field as dataclass_field, fields as dataclass_fields, asdict
 
 # Page config
 st.set_page_config(
@@ -36,6 +47,12 @@ except ImportError:
     ANTHROPIC_AVAILABLE = False
     st.error("Anthropic not installed. Please run: pip install anthropic")
 
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
 # Styles
 st.markdown("""
 <style>
@@ -113,7 +130,18 @@ st.markdown("""
 
 # ===== DATA STRUCTURES =====
 
-@dataclass
+# Sessions hold thousands of fields per form: fields are slotted, ids are
+# process-wide integers rather than UUID strings, repeated strings are interned
+# and fields without subfields/choices share one empty tuple instead of two lists.
+_field_ids = itertools.count(1)
+
+def next_field_id() -> int:
+    return next(_field_ids)
+
+INTERNED_FIELD_ATTRIBUTES = ("number", "label", "field_type", "parent_number", "subfield_letter",
+                             "field_pattern", "extraction_method")
+
+@dataclass(slots=True)
 class FieldChoice:
     """Individual choice for a question field"""
     letter: str
@@ -121,7 +149,7 @@ class FieldChoice:
     value: str = ""
     selected: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class USCISField:
     """Universal field structure for any USCIS form"""
     number: str
@@ -136,9 +164,9 @@ class USCISField:
     parent_number: str = ""
     subfield_letter: str = ""
     
-    # Subfields and choices
-    subfields: List['USCISField'] = dataclass_field(default_factory=list)
-    choices: List[FieldChoice] = dataclass_field(default_factory=list)
+    # Subfields and choices (add with add_subfield/add_choice)
+    subfields: Sequence['USCISField'] = ()
+    choices: Sequence[FieldChoice] = ()
     
     # AI Analysis
     ai_reasoning: str = ""
@@ -156,13 +184,48 @@ class USCISField:
     # Questionnaire
     in_questionnaire: bool = False
     
+    # AcroForm widget the field was built from
+    pdf_field_name: str = ""
+    page_number: int = 0
+    bbox: Tuple[float, ...] = ()
+    
     # System
-    unique_id: str = dataclass_field(default_factory=lambda: str(uuid.uuid4())[:8])
+    unique_id: int = dataclass_field(default_factory=next_field_id)
     extraction_method: str = "ai_agent"
+    
+    def __post_init__(self):
+        for name in INTERNED_FIELD_ATTRIBUTES:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+        self.subfields = self.subfields or ()
+        self.choices = self.choices or ()
+        self.bbox = tuple(self.bbox)
+    
+    def add_subfield(self, subfield: 'USCISField'):
+        if self.subfields:
+            self.subfields.append(subfield)
+        else:
+            self.subfields = [subfield]
+    
+    def add_choice(self, choice: FieldChoice):
+        if self.choices:
+            self.choices.append(choice)
+        else:
+            self.choices = [choice]
 
 @dataclass
 class FormPart:
-    """Universal form part structure"""
+    """Universal form part structure.
+    
+    The fields are indexed on construction: number -> field, parent number ->
+    children, structural views (parents, subfields, choices, questions) and the
+    mapped/questionnaire views. Add fields with add_field and change mapping or
+    questionnaire flags through set_mapping/clear_mapping/set_in_questionnaire
+    so the index stays current. The Field Mapping display order and the sorted
+    mapped/questionnaire views are built on first use and kept until the
+    fields or flags they cover change.
+    """
     number: int
     title: str
     fields: List[USCISField] = dataclass_field(default_factory=list)
@@ -171,6 +234,136 @@ class FormPart:
     processed: bool = False
     extraction_confidence: float = 1.0
     text_length: int = 0
+    analysis_time: float = 0.0
+    analysis_windows: int = 1
+    reused_from_edition: str = ""
+    
+    def __post_init__(self):
+        self.reindex()
+    
+    def reindex(self):
+        """Rebuild the index from scratch (after editing fields directly)"""
+        fields, self.fields = self.fields, []
+        self._by_number = {}
+        self._children = {}
+        self._positions = {}
+        self._views = {"parents": [], "subfields": [], "choices": [], "questions": [], "top_level": [], "regular": []}
+        self._methods = {}
+        self._types = {}
+        self._display_order = None
+        self._mapped = {}
+        self._questionnaire = {}
+        self._sorted = {}
+        for field in fields:
+            self.add_field(field)
+    
+    def add_field(self, field: USCISField):
+        self._positions[field.unique_id] = len(self.fields)
+        self.fields.append(field)
+        self._by_number.setdefault(field.number, field)
+        if field.parent_number:
+            self._children.setdefault(field.parent_number, []).append(field)
+        
+        if field.is_parent:
+            self._views["parents"].append(field)
+        if field.is_subfield:
+            self._views["subfields"].append(field)
+        if field.is_choice:
+            self._views["choices"].append(field)
+        if field.field_type == "question":
+            self._views["questions"].append(field)
+        if not field.is_subfield and not field.is_choice:
+            self._views["top_level"].append(field)
+            if not field.is_parent:
+                self._views["regular"].append(field)
+        self._methods[field.extraction_method] = self._methods.get(field.extraction_method, 0) + 1
+        self._types[field.field_type] = self._types.get(field.field_type, 0) + 1
+        self._display_order = None
+        
+        if field.is_mapped:
+            self._mapped[field.unique_id] = field
+            self._sorted.pop("mapped", None)
+        if field.in_questionnaire:
+            self._questionnaire[field.unique_id] = field
+            self._sorted.pop("questionnaire", None)
+    
+    def get_field(self, number: str) -> Optional[USCISField]:
+        return self._by_number.get(number)
+    
+    def children(self, parent_number: str) -> List[USCISField]:
+        """Subfields and choices of a field, in field order"""
+        return self._children.get(parent_number, [])
+    
+    def view(self, name: str) -> List[USCISField]:
+        """parents, subfields, choices, questions, top_level (no subfields/choices) or regular"""
+        return self._views[name]
+    
+    def counts(self) -> Dict[str, int]:
+        counts = {name: len(fields) for name, fields in self._views.items()}
+        counts["total"] = len(self.fields)
+        counts["mapped"] = len(self._mapped)
+        counts["questionnaire"] = len(self._questionnaire)
+        return counts
+    
+    def method_counts(self) -> Dict[str, int]:
+        return dict(self._methods)
+    
+    def type_counts(self) -> Dict[str, int]:
+        return dict(self._types)
+    
+    def display_order(self, sort_key: Callable[[str], Tuple]) -> List[USCISField]:
+        """Top-level fields by sort_key, each followed by its subfields and choices"""
+        if self._display_order is None:
+            order = []
+            displayed = set()
+            for field in sorted(self.fields, key=lambda f: sort_key(f.number)):
+                if field.number in displayed or not (field.is_parent or not field.is_subfield):
+                    continue
+                order.append(field)
+                displayed.add(field.number)
+                for child in self.children(field.number):
+                    if child.number not in displayed:
+                        order.append(child)
+                        displayed.add(child.number)
+            self._display_order = order
+        return self._display_order
+    
+    def _in_field_order(self, name: str, fields) -> List[USCISField]:
+        if name not in self._sorted:
+            self._sorted[name] = sorted((f for f in fields if not f.is_parent),
+                                        key=lambda f: self._positions[f.unique_id])
+        return self._sorted[name]
+    
+    def mapped_fields(self) -> List[USCISField]:
+        """Mapped non-parent fields in field order"""
+        return self._in_field_order("mapped", self._mapped.values())
+    
+    def questionnaire_fields(self) -> List[USCISField]:
+        """Non-parent fields added to the questionnaire, in field order"""
+        return self._in_field_order("questionnaire", self._questionnaire.values())
+    
+    def set_mapping(self, field: USCISField, db_object: str, db_field: str):
+        field.is_mapped = True
+        field.db_object = db_object
+        field.db_field = db_field
+        if field.unique_id not in self._mapped:
+            self._mapped[field.unique_id] = field
+            self._sorted.pop("mapped", None)
+    
+    def clear_mapping(self, field: USCISField):
+        field.is_mapped = False
+        field.db_object = ""
+        field.db_field = ""
+        if self._mapped.pop(field.unique_id, None) is not None:
+            self._sorted.pop("mapped", None)
+    
+    def set_in_questionnaire(self, field: USCISField, included: bool):
+        field.in_questionnaire = included
+        if included and field.unique_id not in self._questionnaire:
+            self._questionnaire[field.unique_id] = field
+            self._sorted.pop("questionnaire", None)
+        elif not included and self._questionnaire.pop(field.unique_id, None) is not None:
+            self._sorted.pop("questionnaire", None)
 
 @dataclass
 class USCISForm:
@@ -184,6 +377,11 @@ class USCISForm:
     ai_summary: str = ""
     processing_time: float = 0.0
     extraction_summary: str = ""
+    text_hash: str = ""
+    from_cache: bool = False
+    extraction_engine: str = "ai_agent"
+    baseline_edition: str = ""
+    llm_calls_saved: int = 0
 
 # ===== DATABASE SCHEMAS =====
 
@@ -422,13 +620,847 @@ DATABASE_SCHEMA = {
     }
 }
 
+# ===== FORM STRUCTURE CACHE =====
+
+# Analyzed structures are persisted per (form number, edition date, text hash), so
+# re-uploading the same edition skips identify_form -> extract_parts -> analyze_part_fields.
+# Only structure is stored; user values, mappings and questionnaire flags never are.
+# Degraded runs (no API client, API errors, fallback extraction) are not stored, so
+# a transient failure is retried on the next upload instead of being served forever.
+FORM_CACHE_DIR = os.getenv(
+    "USCIS_FORM_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "form_structure_cache")
+)
+FORM_CACHE_VERSION = 3
+FORM_CACHE_HASH_CHARS = 20
+USER_FIELD_ATTRIBUTES = {"value", "is_mapped", "db_object", "db_field", "in_questionnaire"}
+# Fields only _fallback_extraction produces; a part holding any was not fully analyzed
+FALLBACK_EXTRACTION_METHODS = {"fallback_pattern", "inferred_parent", "basic_rule_name", "basic_rule_address"}
+
+def normalize_form_text(text: str) -> str:
+    """Page text without page markers, case or whitespace differences"""
+    text = re.sub(r'=== PAGE \d+ ===', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+def form_text_hash(text: str) -> str:
+    """SHA-256 of the normalized page text"""
+    return hashlib.sha256(normalize_form_text(text).encode("utf-8")).hexdigest()
+
+def cache_slug(value: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '-', value or "").strip('-') or "unknown"
+
+def form_cache_key(form_number: str, edition_date: str, text_hash: str) -> str:
+    """File-safe key such as I-129_01-17-25_3f9c..."""
+    return f"{cache_slug(form_number)}_{cache_slug(edition_date)}_{text_hash[:FORM_CACHE_HASH_CHARS]}"
+
+def serialize_form_structure(form: USCISForm) -> Dict[str, Any]:
+    """Structure-only snapshot of a form; subfields are stored by unique_id"""
+    parts = []
+    for part in form.parts.values():
+        fields = []
+        for field in part.fields:
+            field_data = {
+                f.name: getattr(field, f.name) for f in dataclass_fields(USCISField)
+                if f.name not in USER_FIELD_ATTRIBUTES and f.name not in ("subfields", "choices")
+            }
+            field_data["subfield_ids"] = [subfield.unique_id for subfield in field.subfields]
+            field_data["choices"] = [{"letter": choice.letter, "label": choice.label, "value": choice.value}
+                                     for choice in field.choices]
+            fields.append(field_data)
+        
+        part_data = {f.name: getattr(part, f.name) for f in dataclass_fields(FormPart) if f.name != "fields"}
+        part_data["fields"] = fields
+        parts.append(part_data)
+    
+    return {
+        "form": {f.name: getattr(form, f.name) for f in dataclass_fields(USCISForm) if f.name != "parts"},
+        "parts": parts
+    }
+
+def structure_has_fallback_fields(data: Dict[str, Any]) -> bool:
+    return any(field.get("extraction_method") in FALLBACK_EXTRACTION_METHODS
+               for part in data["parts"] for field in part["fields"])
+
+def build_form_from_structure(data: Dict[str, Any]) -> USCISForm:
+    """Fresh USCISForm tree from a structure snapshot"""
+    form = USCISForm(**data["form"])
+    
+    for part_data in data["parts"]:
+        part_data = dict(part_data)
+        fields = []
+        subfield_links = []
+        by_id = {}
+        for field_data in part_data.pop("fields"):
+            field_data = dict(field_data)
+            stored_id = field_data.pop("unique_id")
+            subfield_ids = field_data.pop("subfield_ids", [])
+            choices = [FieldChoice(**choice) for choice in field_data.pop("choices", [])]
+            # Fresh ids: stored ones come from another process's counter
+            field = USCISField(**field_data, choices=choices)
+            fields.append(field)
+            by_id[stored_id] = field
+            if subfield_ids:
+                subfield_links.append((field, subfield_ids))
+        
+        for field, subfield_ids in subfield_links:
+            field.subfields = [by_id[unique_id] for unique_id in subfield_ids if unique_id in by_id]
+        
+        part = FormPart(**part_data, fields=fields)
+        form.parts[part.number] = part
+    
+    return form
+
+class FormStructureCache:
+    """Process-wide store of analyzed form structures, one JSON file per form.
+    
+    Lookups go by text hash because the form number and edition are only known
+    after the identify_form call the cache exists to skip; both are part of the
+    stored key and file name.
+    """
+    
+    def __init__(self, directory: str = FORM_CACHE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.files = {}
+        self.entries = {}
+        self.hits = 0
+        self._load_index()
+    
+    def _load_index(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".json"):
+                short_hash = file_name[:-len(".json")].rsplit("_", 1)[-1]
+                self.files[short_hash] = os.path.join(self.directory, file_name)
+    
+    def _load_entry(self, short_hash: str) -> Optional[Dict[str, Any]]:
+        if short_hash in self.entries:
+            entry = self.entries[short_hash]
+        elif short_hash in self.files:
+            try:
+                with open(self.files[short_hash], "r", encoding="utf-8") as handle:
+                    entry = json.load(handle)
+            except (OSError, ValueError):
+                return None
+            self.entries[short_hash] = entry
+        else:
+            return None
+        
+        return entry if entry.get("version") == FORM_CACHE_VERSION else None
+    
+    def _read_entry(self, text_hash: str) -> Optional[Dict[str, Any]]:
+        entry = self._load_entry(text_hash[:FORM_CACHE_HASH_CHARS])
+        if not entry or entry.get("text_hash") != text_hash:
+            return None
+        return entry
+    
+    def lookup(self, text_hash: str, engine: str = "ai_agent") -> Optional[USCISForm]:
+        """Newly built form for a previously analyzed text and extraction engine, or None"""
+        with self.lock:
+            entry = self._read_entry(text_hash)
+            if not entry or entry["structure"]["form"].get("extraction_engine", "ai_agent") != engine:
+                return None
+            try:
+                form = build_form_from_structure(entry["structure"])
+            except (KeyError, TypeError):
+                return None
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.hits += 1
+        
+        form.text_hash = text_hash
+        form.from_cache = True
+        return form
+    
+    def previous_edition(self, form_number: str, text_hash: str,
+                         engine: str = "ai_agent") -> Optional[Tuple[USCISForm, Dict[int, List[str]]]]:
+        """Newest cached entry for the same form number but different text, with its part lines.
+        
+        Only entries stored with part_lines can serve as a baseline for edition diffs,
+        and never one holding fallback-extracted fields: its parts would be copied
+        into every later edition without being analyzed again.
+        """
+        prefix = cache_slug(form_number) + "_"
+        with self.lock:
+            candidates = []
+            for short_hash, path in self.files.items():
+                if short_hash == text_hash[:FORM_CACHE_HASH_CHARS] or not os.path.basename(path).startswith(prefix):
+                    continue
+                entry = self._load_entry(short_hash)
+                if (entry and entry.get("part_lines")
+                        and entry["structure"]["form"].get("extraction_engine", "ai_agent") == engine
+                        and not structure_has_fallback_fields(entry["structure"])):
+                    candidates.append(entry)
+            if not candidates:
+                return None
+            entry = max(candidates, key=lambda e: e.get("created", 0))
+            try:
+                form = build_form_from_structure(entry["structure"])
+            except (KeyError, TypeError):
+                return None
+        
+        part_lines = {int(number): lines for number, lines in entry["part_lines"].items()}
+        return form, part_lines
+    
+    def store(self, form: USCISForm, text_hash: str, part_lines: Optional[Dict[int, List[str]]] = None):
+        """Persist a form structure; part_lines (normalized part texts) make it an edition-diff baseline"""
+        key = form_cache_key(form.form_number, form.edition_date, text_hash)
+        entry = {
+            "version": FORM_CACHE_VERSION,
+            "key": key,
+            "text_hash": text_hash,
+            "created": time.time(),
+            "hits": 0,
+            "structure": serialize_form_structure(form)
+        }
+        if part_lines:
+            entry["part_lines"] = {str(number): lines for number, lines in part_lines.items()}
+        entry["structure"]["form"].update(from_cache=False, baseline_edition="", llm_calls_saved=0)
+        for part_data in entry["structure"]["parts"]:
+            part_data["reused_from_edition"] = ""
+        
+        with self.lock:
+            short_hash = text_hash[:FORM_CACHE_HASH_CHARS]
+            self.entries[short_hash] = entry
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, key + ".json")
+                temp_path = path + ".tmp"
+                with open(temp_path, "w", encoding="utf-8") as handle:
+                    json.dump(entry, handle)
+                os.replace(temp_path, path)
+                # A re-identified form may have a new number/edition; drop the old file
+                old_path = self.files.get(short_hash)
+                if old_path and old_path != path and os.path.exists(old_path):
+                    os.remove(old_path)
+                self.files[short_hash] = path
+            except OSError:
+                pass
+    
+    def clear(self):
+        with self.lock:
+            for path in self.files.values():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.files.clear()
+            self.entries.clear()
+            self.hits = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "entries": len(self.files),
+                "hits": self.hits,
+                "keys": sorted(os.path.basename(path)[:-len(".json")] for path in self.files.values())
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_form_structure_cache() -> FormStructureCache:
+    """One structure cache per process, shared by every session"""
+    return FormStructureCache()
+
+# ===== EDITION DIFF =====
+
+# A new USCIS edition usually rewrites a few items and restamps every page footer.
+# Parts whose normalized lines are unchanged reuse the previous edition's analyzed
+# FormPart, so only changed parts go through analyze_part_fields again.
+EDITION_STAMP_PATTERN = re.compile(r'\bpage \d+ of \d+\b|\bedition(?: date)?:? ?\d{1,2}/\d{1,2}/\d{2,4}')
+EDITION_PART_HEADER_PATTERN = re.compile(r'^part \d+\.?')
+EDITION_ALIGN_MIN_RATIO = 0.6
+
+def normalize_part_lines(text: str) -> List[str]:
+    """Lowercased, whitespace-collapsed part lines without page markers, footers or edition stamps.
+    
+    "Part N." headers lose their number so a renumbered but unchanged part still matches.
+    """
+    lines = []
+    for line in text.splitlines():
+        line = EDITION_PART_HEADER_PATTERN.sub("part", re.sub(r'\s+', ' ', line).strip().lower())
+        if line and not line.startswith("=== page") and not EDITION_STAMP_PATTERN.search(line):
+            lines.append(line)
+    return lines
+
+def part_lines_hash(lines: List[str]) -> str:
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+def diff_part_lines(old_lines: List[str], new_lines: List[str]) -> Dict[str, Any]:
+    """Added/removed line counts and similarity ratio between two normalized part texts"""
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    added = removed = 0
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag != "equal":
+            removed += old_end - old_start
+            added += new_end - new_start
+    return {"added": added, "removed": removed, "ratio": matcher.ratio()}
+
+def align_edition_parts(new_parts: Dict[int, List[str]], old_parts: Dict[int, List[str]]) -> Dict[int, Dict[str, Any]]:
+    """Match each new-edition part to a previous-edition part.
+
+    Identical normalized text matches first by hash, whatever the part numbers
+    (parts may be renumbered). Remaining parts are diffed line by line against the
+    unclaimed previous parts and keep the most similar one above
+    EDITION_ALIGN_MIN_RATIO, the same part number winning ties. Returns
+    {new number: {"old": number or None, "unchanged": bool, "added", "removed"}}.
+    """
+    old_by_hash = {}
+    for number, lines in sorted(old_parts.items()):
+        old_by_hash.setdefault(part_lines_hash(lines), []).append(number)
+
+    alignment = {}
+    claimed = set()
+    for number, lines in sorted(new_parts.items()):
+        candidates = [old for old in old_by_hash.get(part_lines_hash(lines), []) if old not in claimed]
+        if candidates:
+            old = number if number in candidates else candidates[0]
+            claimed.add(old)
+            alignment[number] = {"old": old, "unchanged": True, "added": 0, "removed": 0}
+
+    for number, lines in sorted(new_parts.items()):
+        if number in alignment:
+            continue
+        best = None
+        for old, old_lines in sorted(old_parts.items(), key=lambda item: item[0] != number):
+            if old in claimed:
+                continue
+            diff = diff_part_lines(old_lines, lines)
+            if diff["ratio"] >= EDITION_ALIGN_MIN_RATIO and (best is None or diff["ratio"] > best[1]["ratio"]):
+                best = (old, diff)
+        if best:
+            claimed.add(best[0])
+            alignment[number] = {"old": best[0], "unchanged": False,
+                                 "added": best[1]["added"], "removed": best[1]["removed"]}
+        else:
+            alignment[number] = {"old": None, "unchanged": False, "added": len(lines), "removed": 0}
+
+    return alignment
+
+# ===== ACROFORM WIDGET EXTRACTION =====
+
+# USCIS PDFs are fillable AcroForms whose widget names encode the Part/Item
+# numbers (e.g. form1[0].#subform[0].Pt1Line3a_StreetNumberName[0]), so the
+# field tree can be built from the widgets alone without any model call.
+ACROFORM_MIN_WIDGETS = 5
+ACROFORM_LABEL_BATCH = 150
+ACROFORM_CHOICE_TYPES = {"checkbox", "radio"}
+
+WIDGET_TYPE_NAMES = {}
+if PYMUPDF_AVAILABLE:
+    WIDGET_TYPE_NAMES = {
+        fitz.PDF_WIDGET_TYPE_TEXT: "text",
+        fitz.PDF_WIDGET_TYPE_CHECKBOX: "checkbox",
+        fitz.PDF_WIDGET_TYPE_RADIOBUTTON: "radio",
+        fitz.PDF_WIDGET_TYPE_COMBOBOX: "combo",
+        fitz.PDF_WIDGET_TYPE_LISTBOX: "listbox",
+        fitz.PDF_WIDGET_TYPE_SIGNATURE: "signature",
+    }
+
+WIDGET_PART_PATTERN = re.compile(r'(?:^|_)(?:Part|Pt|P)_?(\d+)', re.IGNORECASE)
+WIDGET_ITEM_PATTERN = re.compile(r'(?i:Line|Item|Ln|Question)_?(\d+)([a-z])?(?![a-z])')
+TOOLTIP_PREFIX_PATTERN = re.compile(r'^\s*(?:Page\s+\d+,?\s*)?(?:Part\s+\d+\.?[^.]*\.\s*)?', re.IGNORECASE)
+TOOLTIP_ITEM_PATTERN = re.compile(r'^(?:Item\s+Number\s+)?(\d+)\.?\s*([a-z])?\.\s+', re.IGNORECASE)
+PART_HEADER_PATTERN = re.compile(r'^\s*Part\s+(\d+)\.?\s*(.*)', re.IGNORECASE | re.DOTALL)
+EXPORT_VALUE_LABELS = {"y": "Yes", "yes": "Yes", "n": "No", "no": "No"}
+
+def split_widget_name(name: str) -> str:
+    """Readable words from a widget name suffix such as StreetNumberName"""
+    words = re.sub(r'(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])', ' ', name)
+    return re.sub(r'[_\s]+', ' ', words).strip()
+
+def parse_widget_name(full_name: str) -> Dict[str, Any]:
+    """Part number, item number, subfield letter and descriptive suffix of a widget name"""
+    short_name = re.sub(r'\[\d+\]', '', full_name or "").split(".")[-1]
+    part_match = WIDGET_PART_PATTERN.search(short_name)
+    item_match = WIDGET_ITEM_PATTERN.search(short_name)
+    
+    suffix = short_name[item_match.end():] if item_match else short_name[part_match.end():] if part_match else short_name
+    return {
+        "short_name": short_name,
+        "part": int(part_match.group(1)) if part_match else None,
+        "item": item_match.group(1) if item_match else None,
+        "letter": item_match.group(2) if item_match else None,
+        "suffix": split_widget_name(suffix.strip("_"))
+    }
+
+def parse_widget_tooltip(tooltip: str) -> Dict[str, Any]:
+    """Clean label plus any item number/letter the tooltip starts with"""
+    text = re.sub(r'\s+', ' ', tooltip or "").strip()
+    text = TOOLTIP_PREFIX_PATTERN.sub('', text, count=1)
+    item_match = TOOLTIP_ITEM_PATTERN.match(text)
+    if item_match:
+        text = text[item_match.end():]
+    text = re.sub(r'\s*(?:Select|Check)\s+(?:Yes|No)\b.*$', '', text, flags=re.IGNORECASE)
+    label = re.sub(r'[.\s]+$', '', re.sub(r'^(?:Enter|Select|Provide)\s+', '', text)).strip()
+    return {
+        "label": label,
+        "item": item_match.group(1) if item_match else None,
+        "letter": item_match.group(2).lower() if item_match and item_match.group(2) else None
+    }
+
+def collect_page_widgets(page, page_index: int) -> List[Dict[str, Any]]:
+    """One record per fillable widget on the page, in reading order"""
+    records = []
+    for widget in page.widgets() or []:
+        widget_type = WIDGET_TYPE_NAMES.get(widget.field_type)
+        if not widget_type:
+            continue
+        rect = widget.rect
+        export_value = ""
+        if widget_type in ACROFORM_CHOICE_TYPES:
+            try:
+                export_value = str(widget.on_state() or "")
+            except Exception:
+                export_value = ""
+        records.append({
+            "name": widget.field_name or "",
+            "tooltip": widget.field_label or "",
+            "type": widget_type,
+            "page": page_index + 1,
+            "bbox": [round(rect.x0, 1), round(rect.y0, 1), round(rect.x1, 1), round(rect.y1, 1)],
+            "export_value": "" if export_value == "Off" else export_value,
+            "options": [option if isinstance(option, str) else str(option[-1]) for option in (widget.choice_values or [])]
+        })
+    records.sort(key=lambda r: (round(r["bbox"][1] / 4), r["bbox"][0]))
+    return records
+
+def collect_part_headers(page, page_index: int) -> List[Dict[str, Any]]:
+    """'Part N. Title' text blocks on the page with their vertical position"""
+    headers = []
+    for block in page.get_text("blocks"):
+        match = PART_HEADER_PATTERN.match(block[4])
+        if match:
+            title = re.sub(r'\s+', ' ', match.group(2)).strip(" .")[:100]
+            headers.append({"number": int(match.group(1)), "title": title, "page": page_index + 1, "y": block[1]})
+    return headers
+
+def identify_form_from_text(text: str) -> Optional[Dict[str, str]]:
+    """Form number and edition from the standard USCIS page footer, if present"""
+    match = re.search(r'Form\s+(I-\d+[A-Z]?)\s+Edition\s+(\d{2}/\d{2}/\d{2,4})', text)
+    if not match:
+        return None
+    return {"form_number": match.group(1), "title": f"USCIS Form {match.group(1)}",
+            "edition_date": match.group(2), "form_category": ""}
+
+class AcroFormFieldExtractor:
+    """Builds USCISField hierarchies from a PDF's form widgets"""
+    
+    def __init__(self, agent: "UniversalUSCISAgent"):
+        self.agent = agent
+    
+    def assign_locations(self, widgets: List[Dict], headers: List[Dict]):
+        """Fill in part/item/letter/label for every widget record"""
+        headers = sorted(headers, key=lambda h: (h["page"], h["y"]))
+        unnumbered = {}
+        
+        for widget in widgets:
+            name_info = parse_widget_name(widget["name"])
+            tooltip_info = parse_widget_tooltip(widget["tooltip"])
+            
+            part = name_info["part"]
+            if part is None:
+                # Nearest "Part N." header above the widget in reading order
+                part = 0
+                for header in headers:
+                    if (header["page"], header["y"]) <= (widget["page"], widget["bbox"][1]):
+                        part = header["number"]
+                    else:
+                        break
+            
+            item = name_info["item"] or tooltip_info["item"]
+            if item is None:
+                unnumbered[part] = unnumbered.get(part, 0) + 1
+                item = f"X{unnumbered[part]}"
+            
+            label = tooltip_info["label"]
+            widget["label_from_name"] = len(label) < 3
+            if widget["label_from_name"]:
+                label = name_info["suffix"] or name_info["short_name"]
+            
+            widget.update({
+                "part": part,
+                "item": item,
+                "letter": name_info["letter"] or tooltip_info["letter"],
+                "label": label,
+                "suffix": name_info["suffix"]
+            })
+    
+    def _widget_field_type(self, widget: Dict) -> str:
+        if widget["type"] in ("combo", "listbox"):
+            return "select"
+        if widget["type"] == "signature":
+            return "signature"
+        if widget["type"] in ACROFORM_CHOICE_TYPES:
+            return "checkbox"
+        detected = self.agent._detect_field_type(widget["label"])
+        return "text" if detected in ("checkbox", "question") else detected
+    
+    def _choice_label(self, widget: Dict, group: List[Dict]) -> str:
+        """Export value when it tells the group's widgets apart (radio buttons), else the name suffix"""
+        export_value = widget["export_value"]
+        if export_value and len({w["export_value"] for w in group}) == len(group):
+            return EXPORT_VALUE_LABELS.get(export_value.lower(), export_value)
+        if widget["suffix"] and len({w["suffix"] for w in group}) == len(group):
+            return EXPORT_VALUE_LABELS.get(widget["suffix"].lower(), widget["suffix"])
+        return widget["label"] if not widget["label_from_name"] else export_value or widget["label"]
+    
+    def _new_field(self, widget: Dict, number: str, label: str, field_type: str, part_number: int, **extra) -> USCISField:
+        return USCISField(
+            number=number,
+            label=label,
+            field_type=field_type,
+            part_number=part_number,
+            confidence=0.8 if widget["label_from_name"] else 1.0,
+            field_pattern=f"acroform_{widget['type']}",
+            extraction_method="acroform_widget",
+            pdf_field_name=widget["name"],
+            page_number=widget["page"],
+            bbox=tuple(widget["bbox"]),
+            **extra
+        )
+    
+    def _item_field(self, item: str, widgets: List[Dict], page_lines: Dict[int, List[str]],
+                    field_type: str, part_number: int, **extra) -> USCISField:
+        """Parent/question field labeled from the numbered line in the page text, else the first widget"""
+        label = None
+        pattern = re.compile(rf'^\s*{re.escape(item)}\.\s+(?![a-z]\.)([A-Z][^\n]{{2,120}})')
+        for line in page_lines.get(widgets[0]["page"], []):
+            match = pattern.match(line)
+            if match:
+                label = match.group(1).strip().rstrip(".")
+                break
+        if label is None and not widgets[0]["label_from_name"] and widgets[0]["type"] in ACROFORM_CHOICE_TYPES:
+            label = widgets[0]["label"]
+        
+        field = self._new_field(widgets[0], item, label or f"Item {item}", field_type, part_number, **extra)
+        field.confidence = 1.0 if label else 0.8
+        return field
+    
+    def _choice_fields(self, widgets: List[Dict], number: str, part_number: int, letters: List[str]):
+        """FieldChoice list plus is_choice fields for a checkbox/radio group"""
+        choices, choice_fields = [], []
+        for widget in widgets:
+            if not letters:
+                break
+            letter = letters.pop(0)
+            label = self._choice_label(widget, widgets)
+            choices.append(FieldChoice(letter=letter, label=label, value=widget["export_value"]))
+            choice_field = self._new_field(
+                widget, f"{number}.{letter}", label, "choice", part_number,
+                is_choice=True, parent_number=number, subfield_letter=letter
+            )
+            choice_field.confidence = 1.0
+            choice_fields.append(choice_field)
+        return choices, choice_fields
+    
+    def build_item_fields(self, item: str, widgets: List[Dict], part_number: int,
+                          page_lines: Dict[int, List[str]]) -> List[USCISField]:
+        """Fields for one numbered item: a single field, a question with choices, or a parent with subfields"""
+        free_letters = [chr(code) for code in range(ord("a"), ord("z") + 1)]
+        
+        # The same widget can repeat (e.g. on a continuation page); radio buttons differ by export value
+        unique, seen = [], set()
+        for widget in widgets:
+            key = (widget["name"], widget["export_value"])
+            if key not in seen:
+                seen.add(key)
+                unique.append(widget)
+        widgets = unique
+        
+        has_letters = any(w["letter"] for w in widgets)
+        all_choices = all(w["type"] in ACROFORM_CHOICE_TYPES for w in widgets)
+        
+        if not has_letters and all_choices:
+            if len(widgets) == 1:
+                return [self._new_field(widgets[0], item, widgets[0]["label"], "checkbox", part_number)]
+            question = self._item_field(item, widgets, page_lines, "question", part_number)
+            question.choices, choice_fields = self._choice_fields(widgets, item, part_number, free_letters)
+            return choice_fields + [question]
+        
+        if not has_letters and len(widgets) == 1:
+            widget = widgets[0]
+            field = self._new_field(widget, item, widget["label"], self._widget_field_type(widget), part_number)
+            if widget["options"]:
+                field.choices = [FieldChoice(letter=chr(ord("a") + i), label=o, value=o) for i, o in enumerate(widget["options"][:26])]
+            return [field]
+        
+        parent = self._item_field(item, widgets, page_lines, "parent", part_number, is_parent=True)
+        by_letter = {}
+        for widget in widgets:
+            if widget["letter"]:
+                by_letter.setdefault(widget["letter"], []).append(widget)
+                if widget["letter"] in free_letters:
+                    free_letters.remove(widget["letter"])
+        for widget in widgets:
+            if not widget["letter"] and free_letters:
+                by_letter.setdefault(free_letters.pop(0), []).append(widget)
+        
+        fields = []
+        for letter in sorted(by_letter):
+            group = by_letter[letter]
+            widget = group[0]
+            number = f"{item}.{letter}"
+            if widget["type"] in ACROFORM_CHOICE_TYPES and len(group) > 1:
+                subfield = self._new_field(widget, number, widget["label"], "question", part_number,
+                                           is_subfield=True, parent_number=item, subfield_letter=letter)
+                subfield.choices = [FieldChoice(letter=chr(ord("a") + i), label=self._choice_label(w, group), value=w["export_value"])
+                                    for i, w in enumerate(group[:26])]
+            else:
+                subfield = self._new_field(widget, number, widget["label"], self._widget_field_type(widget), part_number,
+                                           is_subfield=True, parent_number=item, subfield_letter=letter)
+                if widget["options"]:
+                    subfield.choices = [FieldChoice(letter=chr(ord("a") + i), label=o, value=o) for i, o in enumerate(widget["options"][:26])]
+            parent.add_subfield(subfield)
+            fields.append(subfield)
+        
+        fields.append(parent)
+        return fields
+    
+    def build_parts(self, widgets: List[Dict], headers: List[Dict], page_texts: List[str]) -> Dict[int, FormPart]:
+        """FormParts in part order with their field hierarchies"""
+        self.assign_locations(widgets, headers)
+        page_lines = {index + 1: text.splitlines() for index, text in enumerate(page_texts)}
+        titles = {}
+        for header in sorted(headers, key=lambda h: (h["page"], h["y"])):
+            titles.setdefault(header["number"], header["title"])
+        
+        grouped = {}
+        for widget in widgets:
+            grouped.setdefault(widget["part"], {}).setdefault(widget["item"], []).append(widget)
+        
+        parts = {}
+        for part_number in sorted(grouped):
+            fields = []
+            for item, item_widgets in grouped[part_number].items():
+                fields.extend(self.build_item_fields(item, item_widgets, part_number, page_lines))
+            fields.sort(key=lambda f: self.agent._get_sort_key(f.number))
+            
+            patterns = {}
+            for field in fields:
+                patterns[field.field_pattern] = patterns.get(field.field_pattern, 0) + 1
+            
+            part_widgets = [w for item_widgets in grouped[part_number].values() for w in item_widgets]
+            part_pages = {w["page"] for w in part_widgets}
+            parts[part_number] = FormPart(
+                number=part_number,
+                title=titles.get(part_number) or ("Header and Unnumbered Fields" if part_number == 0 else f"Part {part_number}"),
+                fields=fields,
+                ai_analysis=f"Built from {len(part_widgets)} AcroForm widgets on pages {', '.join(map(str, sorted(part_pages)))}",
+                field_patterns=patterns,
+                processed=True,
+                text_length=sum(len(page_texts[page - 1]) for page in part_pages)
+            )
+        return parts
+
+# ===== PART SPAN INDEX =====
+
+class PartSpanIndex:
+    """Character span of every "Part N." section, found in one pass over the text.
+    
+    The first header for each part number starts its span (later "(continued)"
+    headers are ignored) and the next part's header ends it, so part text is a
+    plain slice. Built once per document and passed explicitly to extract_parts
+    and _extract_part_text_enhanced.
+    """
+    
+    HEADER_PATTERN = re.compile(r'(?:^|\n)[ \t]*(Part\s+(\d+)\.?[ \t]*([A-Z][^\n]{0,100}))', re.IGNORECASE)
+    
+    def __init__(self, text: str):
+        self.text_length = len(text)
+        self.starts = {}
+        self.titles = {}
+        for match in self.HEADER_PATTERN.finditer(text):
+            number = int(match.group(2))
+            if number not in self.starts:
+                self.starts[number] = match.start(1)
+                self.titles[number] = match.group(3).strip()
+        self._compute_spans()
+    
+    def _compute_spans(self):
+        ordered = sorted(self.starts.items(), key=lambda item: item[1])
+        self.spans = {}
+        for position, (number, start) in enumerate(ordered):
+            end = ordered[position + 1][1] if position + 1 < len(ordered) else self.text_length
+            self.spans[number] = (start, end)
+    
+    def add(self, number: int, title: str, start: int):
+        """Register a part found by other means (e.g. AI validation)"""
+        if number not in self.starts:
+            self.starts[number] = start
+            self.titles[number] = title
+            self._compute_spans()
+    
+    def span(self, number: int) -> Optional[Tuple[int, int]]:
+        return self.spans.get(number)
+    
+    def slice(self, text: str, number: int) -> Optional[str]:
+        span = self.spans.get(number)
+        return text[span[0]:span[1]] if span else None
+    
+    def parts(self) -> List[Dict]:
+        """Parts in part-number order with their spans"""
+        return [
+            {"number": number, "title": self.titles[number], "start_pos": start, "end_pos": end}
+            for number, (start, end) in sorted(self.spans.items())
+        ]
+    
+    def __len__(self):
+        return len(self.spans)
+
+# Parts longer than one analysis call's window (e.g. the I-485 background
+# questions) are split into overlapping windows that end on item-number lines.
+PART_WINDOW_CHARS = 12000
+PART_WINDOW_OVERLAP = 1500
+ITEM_BOUNDARY_PATTERN = re.compile(r'^[ \t]*(?:Item\s+Number\s+)?\d+\.(?![\d])', re.MULTILINE | re.IGNORECASE)
+
+def split_part_windows(text: str, size: int = PART_WINDOW_CHARS, overlap: int = PART_WINDOW_OVERLAP) -> List[str]:
+    """Overlapping windows of at most size chars; each starts and ends on an item line where possible"""
+    if len(text) <= size:
+        return [text]
+    
+    boundaries = [match.start() for match in ITEM_BOUNDARY_PATTERN.finditer(text)]
+    windows = []
+    start = 0
+    while True:
+        hard_end = start + size
+        if hard_end >= len(text):
+            windows.append(text[start:])
+            return windows
+        
+        # End before the last item that starts in the window, but keep windows at least half full
+        index = bisect.bisect_right(boundaries, hard_end) - 1
+        if index >= 0 and boundaries[index] > start + size // 2:
+            end = boundaries[index]
+        else:
+            newline = text.rfind("\n", start + size // 2, hard_end)
+            end = newline if newline > 0 else hard_end
+        windows.append(text[start:end])
+        
+        # Next window repeats the items in the last `overlap` chars
+        index = bisect.bisect_left(boundaries, end - overlap)
+        if index < len(boundaries) and start < boundaries[index] < end:
+            start = boundaries[index]
+        else:
+            start = max(start + 1, end - overlap)
+
+# ===== STREAMING FIELD PARSER =====
+
+class JSONArrayStreamParser:
+    """Incremental parser for a streamed JSON array of objects.
+    
+    feed() takes text chunks as they arrive and returns the top-level objects
+    that closed in them, so fields can be built while the response is still
+    streaming and a truncated or malformed tail only loses the object it cuts
+    through. Text before the first "[" is skipped, as the old slice from the
+    first "[" did.
+    """
+    
+    TOKEN_PATTERN = re.compile(r'[\[\]{}"]')
+    STRING_END_PATTERN = re.compile(r'["\\]')
+    
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0       # next unscanned char of the buffer
+        self.depth = 0          # 0 before the array, 1 inside it, 2+ inside an element
+        self.in_string = False
+        self.object_start = -1
+        self.closed = False
+        self.objects = 0
+        self.errors = 0
+    
+    def feed(self, chunk: str) -> List[Dict]:
+        if self.closed:
+            return []
+        
+        objects = []
+        buffer = self.buffer + chunk
+        pos = self.position
+        while pos < len(buffer):
+            if self.in_string:
+                match = self.STRING_END_PATTERN.search(buffer, pos)
+                if not match:
+                    pos = len(buffer)
+                elif match.group() == "\\":
+                    if match.end() == len(buffer):
+                        pos = match.start()    # escaped char not here yet
+                        break
+                    pos = match.end() + 1
+                else:
+                    self.in_string = False
+                    pos = match.end()
+                continue
+            
+            match = self.TOKEN_PATTERN.search(buffer, pos)
+            if not match:
+                pos = len(buffer)
+                break
+            token = match.group()
+            pos = match.end()
+            
+            if self.depth == 0:
+                if token == "[":
+                    self.depth = 1
+            elif token == '"':
+                self.in_string = True
+            elif token in "{[":
+                if self.depth == 1 and token == "{":
+                    self.object_start = match.start()
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 1 and self.object_start >= 0:
+                    try:
+                        value = json.loads(buffer[self.object_start:pos])
+                    except ValueError:
+                        value = None
+                    if isinstance(value, dict):
+                        objects.append(value)
+                        self.objects += 1
+                    else:
+                        self.errors += 1
+                    self.object_start = -1
+                elif self.depth <= 0:
+                    self.closed = True
+                    break
+        
+        # Keep only the unscanned text and any element still open
+        keep = self.object_start if self.object_start >= 0 else pos
+        self.buffer = buffer[keep:]
+        self.position = pos - keep
+        if self.object_start >= 0:
+            self.object_start = 0
+        return objects
+
 # ===== ENHANCED AI AGENT =====
 
+# One combined pattern for the fallback extractor; alternatives are tried at each
+# line start, so a single pass emits items, sub-items and lettered choices in order
+FALLBACK_TOKEN_PATTERN = re.compile(r"""
+    ^[ \t]*(?:
+        (?P<subfield>(?P<sub_num>\d+)(?P<sub_dot>\.)?(?P<sub_letter>[a-zA-Z])\.\s+(?P<sub_label>[^\n]{3,300}))
+      | (?P<main>(?P<item_num>\d+)\.\s+(?P<item_label>[^\n]{3,400}))
+      | (?P<ref>(?P<ref_kind>Item\s+Number|Question)\s+(?P<ref_num>\d+)[.\s]*(?P<ref_label>[^\n]{3,400}))
+      | (?P<lettered>(?P<letter>[a-zA-Z])\.\s+(?P<letter_label>[^\n]{2,300}))
+    )
+""", re.MULTILINE | re.VERBOSE | re.IGNORECASE)
+
+# Part analyses run concurrently through a bounded pool. A 429/529 from the API
+# pauses every worker until the shared cooldown passes, then the call is retried.
+PART_ANALYSIS_MAX_WORKERS = 8
+PART_ANALYSIS_POLL_SECONDS = 0.25
+API_MAX_RETRIES = 4
+API_BACKOFF_SECONDS = 2.0
+API_BACKOFF_MAX_SECONDS = 60.0
+
 class UniversalUSCISAgent:
     """Enhanced Claude Sonnet 4 agent for any USCIS form analysis"""
     
     def __init__(self):
         self.client = None
+        self._rate_limit_lock = threading.Lock()
+        self._rate_limited_until = 0.0
+        self.rate_limit_retries = 0
+        self.api_errors = 0
         self.setup_client()
     
     def setup_client(self):
@@ -439,12 +1471,72 @@ class UniversalUSCISAgent:
         try:
             api_key = st.secrets.get("ANTHROPIC_API_KEY") or os.getenv("ANTHROPIC_API_KEY")
             if api_key:
-                self.client = anthropic.Anthropic(api_key=api_key)
+                # Retries are handled by _create_message so concurrent workers share one backoff
+                self.client = anthropic.Anthropic(api_key=api_key, max_retries=0)
                 return True
         except Exception as e:
             st.error(f"Claude API setup failed: {e}")
         return False
     
+    def _wait_for_rate_limit(self):
+        """Block until any cooldown set by a rate-limited worker has passed"""
+        with self._rate_limit_lock:
+            delay = self._rate_limited_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _back_off(self, error: Exception, attempt: int) -> bool:
+        """Wait before retrying a failed call; False when the error is final"""
+        status = getattr(error, "status_code", None)
+        if attempt == API_MAX_RETRIES or (status is not None and status != 429 and status < 500):
+            return False
+        
+        delay = min(API_BACKOFF_MAX_SECONDS, API_BACKOFF_SECONDS * 2 ** attempt)
+        response = getattr(error, "response", None)
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        delay += random.uniform(0, delay / 4)
+        
+        if status not in (429, 529):
+            time.sleep(delay)
+            return True
+        
+        # Rate limited or overloaded: hold back every worker, not just this one
+        with self._rate_limit_lock:
+            self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + delay)
+            self.rate_limit_retries += 1
+        return True
+    
+    def _create_message(self, **kwargs):
+        """messages.create with retries and a cooldown shared across worker threads"""
+        for attempt in range(API_MAX_RETRIES + 1):
+            self._wait_for_rate_limit()
+            try:
+                return self.client.messages.create(**kwargs)
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                if not self._back_off(e, attempt):
+                    raise
+    
+    def _stream_text(self, **kwargs) -> Iterator[str]:
+        """Text deltas of messages.stream; retried like _create_message until the first delta arrives.
+        
+        Errors after that propagate so the caller can keep what it already parsed.
+        """
+        for attempt in range(API_MAX_RETRIES + 1):
+            self._wait_for_rate_limit()
+            received = False
+            try:
+                with self.client.messages.stream(**kwargs) as stream:
+                    for text in stream.text_stream:
+                        received = True
+                        yield text
+                return
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                if received or not self._back_off(e, attempt):
+                    raise
+    
     def identify_form(self, text: str) -> Dict[str, str]:
         """Identify any USCIS form type and metadata"""
         if not self.client:
@@ -469,7 +1561,7 @@ Text to analyze:
 {text[:2000]}"""
 
         try:
-            response = self.client.messages.create(
+            response = self._create_message(
                 model="claude-3-5-sonnet-20241022",
                 max_tokens=500,
                 messages=[{"role": "user", "content": prompt}]
@@ -482,55 +1574,27 @@ Text to analyze:
                 return json.loads(content[json_start:json_end])
                 
         except Exception as e:
+            self.api_errors += 1
             st.warning(f"Form identification error: {e}")
         
         return {"form_number": "Unknown", "title": "USCIS Form", "edition_date": "", "form_category": ""}
     
-    def extract_parts(self, text: str) -> List[Dict]:
-        """Root cause fix: Accurate part boundary detection for clean text extraction"""
+    def extract_parts(self, text: str, span_index: Optional[PartSpanIndex] = None) -> List[Dict]:
+        """Root cause fix: Accurate part boundary detection for clean text extraction.
+        
+        Part headers come from span_index (built here if not given); parts the
+        AI validation step finds are added to it, so the caller's index covers
+        every returned part.
+        """
+        if span_index is None:
+            span_index = PartSpanIndex(text)
         if not self.client:
-            return [{"number": 1, "title": "Main Section"}]
+            return span_index.parts() or [{"number": 1, "title": "Main Section"}]
         
         st.info("🔍 Starting precise part boundary detection...")
         
-        # STEP 1: Find ALL part positions with exact locations
-        part_positions = []
-        
-        # Enhanced regex patterns that capture exact positions
-        part_patterns = [
-            (r'(?:^|\n)\s*(Part\s+(\d+)\.?\s*([A-Z][^\n]{0,100}))', re.IGNORECASE | re.MULTILINE),
-            (r'(?:^|\n)\s*(PART\s+(\d+)\.?\s*([A-Z][^\n]{0,100}))', re.MULTILINE),
-        ]
-        
-        with st.spinner("Finding exact part positions..."):
-            for pattern, flags in part_patterns:
-                for match in re.finditer(pattern, text, flags):
-                    try:
-                        part_num = int(match.group(2))
-                        title = match.group(3).strip() if len(match.groups()) > 2 else f"Part {part_num}"
-                        start_pos = match.start()
-                        
-                        # Store exact position and context
-                        part_positions.append({
-                            "number": part_num,
-                            "title": title,
-                            "start_pos": start_pos,
-                            "full_match": match.group(1),
-                            "context": text[max(0, start_pos-50):start_pos+200]
-                        })
-                    except (ValueError, IndexError):
-                        continue
-        
-        # Remove duplicates and sort by position
-        seen_positions = set()
-        unique_parts = []
-        for part in part_positions:
-            pos_key = (part["number"], part["start_pos"] // 100)  # Group nearby positions
-            if pos_key not in seen_positions:
-                seen_positions.add(pos_key)
-                unique_parts.append(part)
-        
-        unique_parts.sort(key=lambda x: x["start_pos"])
+        # STEP 1: Part headers from the single-pass span index
+        unique_parts = span_index.parts()
         
         # STEP 2: AI validation of found parts
         if self.client and unique_parts:
@@ -559,7 +1623,7 @@ Return JSON with validation and any missing parts:
 }}"""
 
                 try:
-                    response = self.client.messages.create(
+                    response = self._create_message(
                         model="claude-3-5-sonnet-20241022",
                         max_tokens=800,
                         messages=[{"role": "user", "content": validation_prompt}]
@@ -579,61 +1643,83 @@ Return JSON with validation and any missing parts:
                                 flexible_pattern = rf"Part\s*{missing_num}[^\d]"
                                 match = re.search(flexible_pattern, text, re.IGNORECASE)
                                 if match:
-                                    unique_parts.append({
-                                        "number": missing_num,
-                                        "title": missing["title"],
-                                        "start_pos": match.start(),
-                                        "full_match": match.group(0),
-                                        "context": text[match.start():match.start()+200]
-                                    })
+                                    span_index.add(missing_num, missing["title"], match.start())
                 
                 except Exception as e:
+                    self.api_errors += 1
                     st.warning(f"AI validation error: {e}")
         
-        # STEP 3: Final cleanup and boundary calculation
-        unique_parts.sort(key=lambda x: (x["number"], x["start_pos"]))
-        
-        # Remove exact duplicates by part number (keep first occurrence)
-        final_parts = []
-        seen_numbers = set()
-        for part in unique_parts:
-            if part["number"] not in seen_numbers:
-                seen_numbers.add(part["number"])
-                final_parts.append({
-                    "number": part["number"],
-                    "title": part["title"],
-                    "start_pos": part["start_pos"],
-                    "end_pos": None  # Will be calculated in text extraction
-                })
-        
-        final_parts.sort(key=lambda x: x["number"])
-        
-        # Calculate end positions for clean boundaries
-        for i, part in enumerate(final_parts):
-            if i < len(final_parts) - 1:
-                # End position is start of next part
-                next_part_start = None
-                for next_part in final_parts[i+1:]:
-                    if next_part["start_pos"] > part["start_pos"]:
-                        next_part_start = next_part["start_pos"]
-                        break
-                part["end_pos"] = next_part_start
-            else:
-                # Last part goes to end of document
-                part["end_pos"] = len(text)
+        # STEP 3: Final parts with their spans
+        final_parts = span_index.parts()
         
         st.success(f"✅ Found {len(final_parts)} parts with precise boundaries: {[p['number'] for p in final_parts]}")
         
-        # Store positions for use in text extraction
-        self._part_positions = {p["number"]: (p["start_pos"], p["end_pos"]) for p in final_parts}
-        
         return final_parts if final_parts else [{"number": 1, "title": "Main Section"}]
 
-    def analyze_part_fields(self, part_text: str, part_number: int, part_title: str) -> List[USCISField]:
-        """Universal field analysis for any USCIS form part"""
+    def clean_widget_labels(self, fields: List[USCISField]) -> int:
+        """Rewrite labels that had to be derived from widget names; one call per batch"""
+        if not self.client or not fields:
+            return 0
+        
+        cleaned = 0
+        for start in range(0, len(fields), ACROFORM_LABEL_BATCH):
+            batch = fields[start:start + ACROFORM_LABEL_BATCH]
+            listing = "\n".join(f"{f.unique_id}\t{f.number}\t{f.pdf_field_name}\t{f.label}" for f in batch)
+            prompt = f"""These USCIS form fields have no tooltip, so their labels were derived from PDF widget names.
+Rewrite each label as the short wording the form itself would use, e.g. "Street Number and Name" or
+"Family Name (Last Name)". Keep the meaning; do not add details that are not implied by the name.
+
+Return JSON mapping each id to its label:
+{{"id": "label"}}
+
+id\tnumber\twidget name\tcurrent label
+{listing}"""
+            
+            try:
+                response = self._create_message(
+                    model="claude-3-5-sonnet-20241022",
+                    max_tokens=4000,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+                content = response.content[0].text.strip()
+                labels = json.loads(content[content.find("{"):content.rfind("}") + 1])
+            except Exception as e:
+                self.api_errors += 1
+                st.warning(f"Label cleanup error: {e}")
+                continue
+            
+            for field in batch:
+                label = labels.get(str(field.unique_id))
+                if isinstance(label, str) and len(label.strip()) >= 3:
+                    field.label = label.strip()
+                    field.confidence = 0.95
+                    field.ai_reasoning = "Label rewritten from the PDF widget name"
+                    cleaned += 1
+        
+        return cleaned
+    
+    def analyze_part_fields(self, part_text: str, part_number: int, part_title: str,
+                            notices: Optional[List[str]] = None, window: Tuple[int, int] = (1, 1),
+                            on_fields: Optional[Callable[[List[USCISField]], None]] = None) -> List[USCISField]:
+        """Universal field analysis for any USCIS form part.
+        
+        The text is sent whole: split oversized parts with split_part_windows,
+        pass window=(index, total) for each and merge with merge_window_fields.
+        The response is streamed and each field object becomes USCISFields as
+        soon as it closes (passed to on_fields); if the stream breaks off or
+        its tail is malformed, the parsed fields are kept and fallback
+        extraction only adds the items they lack.
+        Worker threads cannot write to the page, so when a notices list is
+        given, problems are appended to it instead of shown with st.warning.
+        """
         if not self.client:
             return self._fallback_extraction(part_text, part_number)
         
+        window_note = ""
+        if window[1] > 1:
+            window_note = (f" (window {window[0]} of {window[1]}; items at the edges may also appear in the"
+                           f" neighbouring windows - extract every item that is complete here)")
+        
         prompt = f"""Analyze this USCIS form part and extract ALL fields with intelligent structuring.
 
 UNIVERSAL FIELD ANALYSIS RULES - APPLY TO ALL USCIS FORMS:
@@ -727,30 +1813,78 @@ Return comprehensive JSON array:
     "reasoning": "Single date field, no subfields needed as it's one piece of information"
 }}]
 
-Part {part_number}: {part_title}
+Part {part_number}: {part_title}{window_note}
 Text to analyze:
-{part_text[:12000]}"""
+{part_text}"""
 
+        parser = JSONArrayStreamParser()
+        fields = []
+        error = None
         try:
-            response = self.client.messages.create(
+            for chunk in self._stream_text(
                 model="claude-3-5-sonnet-20241022",
                 max_tokens=8000,
                 messages=[{"role": "user", "content": prompt}]
-            )
-            
-            content = response.content[0].text.strip()
-            if "[" in content:
-                json_start = content.find("[")
-                json_end = content.rfind("]") + 1
-                fields_data = json.loads(content[json_start:json_end])
-                
-                return self._build_universal_fields(fields_data, part_number)
-                
+            ):
+                for field_data in parser.feed(chunk):
+                    try:
+                        new_fields = self._build_universal_fields([field_data], part_number)
+                    except (KeyError, TypeError, AttributeError):
+                        parser.errors += 1
+                        continue
+                    fields.extend(new_fields)
+                    if on_fields:
+                        on_fields(new_fields)
         except Exception as e:
-            st.warning(f"AI field analysis error for Part {part_number}: {e}")
-            st.info("Using fallback extraction method...")
+            error = e
         
-        return self._fallback_extraction(part_text, part_number)
+        if not fields:
+            problem = error or "no field objects in the response"
+            if notices is None:
+                st.warning(f"AI field analysis error for Part {part_number}: {problem}")
+                st.info("Using fallback extraction method...")
+            else:
+                notices.append(f"AI field analysis error for Part {part_number}: {problem} (used fallback extraction)")
+            return self._fallback_extraction(part_text, part_number)
+        
+        if error or parser.errors or not parser.closed:
+            # Keep the parsed fields; the fallback only fills in items the response never reached
+            covered = {field.parent_number or field.number for field in fields}
+            recovered = [field for field in self._fallback_extraction(part_text, part_number)
+                         if (field.parent_number or field.number) not in covered]
+            fields.extend(recovered)
+            problem = error or (f"{parser.errors} malformed field objects" if parser.errors else "response cut off")
+            message = (f"Part {part_number}: kept {parser.objects} streamed items after {problem}; "
+                       f"{len(recovered)} more from fallback extraction")
+            if notices is None:
+                st.warning(message)
+            else:
+                notices.append(message)
+        
+        fields.sort(key=lambda f: self._get_sort_key(f.number))
+        return fields
+    
+    def merge_window_fields(self, window_fields: List[List[USCISField]]) -> List[USCISField]:
+        """One field list from overlapping windows, de-duplicated by item number.
+        
+        An item in an overlap comes back from both windows; the copy with the
+        most subfields/choices wins, and its children come with it.
+        """
+        if len(window_fields) == 1:
+            return window_fields[0]
+        
+        chosen = {}
+        for fields in window_fields:
+            groups = {}
+            for field in fields:
+                groups.setdefault(field.parent_number or field.number, []).append(field)
+            for root, group in groups.items():
+                if len(group) > len(chosen.get(root, ())):
+                    chosen[root] = group
+        
+        merged = [field for group in chosen.values() for field in group]
+        merged.sort(key=lambda f: self._get_sort_key(f.number))
+        return merged
     
     def _build_universal_fields(self, fields_data: List[Dict], part_number: int) -> List[USCISField]:
         """Build universal field objects from AI analysis"""
@@ -784,7 +1918,7 @@ Text to analyze:
                         subfield_letter=sub_data["letter"],
                         field_pattern=field.field_pattern
                     )
-                    field.subfields.append(subfield)
+                    field.add_subfield(subfield)
                     fields.append(subfield)
             
             # Add choices for questions
@@ -802,7 +1936,7 @@ Text to analyze:
                         subfield_letter=choice_data["letter"],
                         field_pattern=field.field_pattern
                     )
-                    field.choices.append(FieldChoice(
+                    field.add_choice(FieldChoice(
                         letter=choice_data["letter"],
                         label=choice_data["label"]
                     ))
@@ -815,99 +1949,117 @@ Text to analyze:
         return fields
     
     def _fallback_extraction(self, text: str, part_number: int) -> List[USCISField]:
-        """Enhanced fallback pattern-based extraction for any USCIS form"""
+        """Pattern-based extraction for any USCIS form in one linear tokenizer pass.
+        
+        Numbered items, sub-items ("1.a." / "1a." / orphan "a.") and lettered
+        choices ("A.") come out in document order; orphan sub-items and choices
+        attach to the most recent numbered item.
+        """
         fields = []
         seen_numbers = set()
+        items = {}
+        current_number = ""
         
-        # Define patterns with proper regex strings
-        pattern_list = [
-            (r'(\d+)\.\s+([^\n]{3,400})', 'main'),
-            (r'(\d+)\.([a-z])\.\s+([^\n]{3,300})', 'subfield'),
-            (r'(\d+)([a-z])\.\s+([^\n]{3,300})', 'subfield_compact'),
-            (r'Item\s+Number\s+(\d+)[.\s]*([^\n]{3,400})', 'item'),
-            (r'Question\s+(\d+)[.\s]*([^\n]{3,400})', 'question'),
-            (r'^([A-Z])\.\s+([^\n]{3,300})', 'letter'),
-            (r'^\s*([a-z])\.\s+([^\n]{3,200})', 'orphan_sub'),
-        ]
-        
-        for pattern_str, pattern_type in pattern_list:
-            flags = re.IGNORECASE | re.MULTILINE
-            matches = re.finditer(pattern_str, text[:20000], flags)
+        for match in FALLBACK_TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            groups = match.groupdict()
+            letter = ""
             
-            for match in matches:
-                try:
-                    if pattern_type == 'subfield':
-                        parent_num = match.group(1)
-                        letter = match.group(2)
-                        label = match.group(3).strip()
-                        number = f"{parent_num}.{letter}"
-                        is_subfield = True
-                        parent_number = parent_num
-                    elif pattern_type == 'subfield_compact':
-                        parent_num = match.group(1)
-                        letter = match.group(2)
-                        label = match.group(3).strip()
-                        number = f"{parent_num}.{letter}"
-                        is_subfield = True
-                        parent_number = parent_num
-                    elif pattern_type == 'orphan_sub':
-                        letter = match.group(1)
-                        label = match.group(2).strip()
-                        text_before = text[:match.start()]
-                        parent_match = re.search(r'(\d+)\.\s+[^\n]+', text_before[::-1])
-                        if parent_match:
-                            parent_num = parent_match.group(1)[::-1]
-                            number = f"{parent_num}.{letter.lower()}"
-                            is_subfield = True
-                            parent_number = parent_num
-                        else:
-                            continue
-                    else:
-                        number = match.group(1)
-                        label = match.group(2).strip() if len(match.groups()) > 1 else f"Field {number}"
-                        is_subfield = False
-                        parent_number = ""
-                    
-                    if number in seen_numbers:
-                        continue
-                    seen_numbers.add(number)
-                    
-                    # Clean the label
-                    label = re.sub(r'\s+', ' ', label)
-                    label = label.strip()
-                    label = re.sub(r'^[.\-–\s]+', '', label)
-                    label = re.sub(r'[.\s]+$', '', label)
-                    
-                    if len(label) < 3:
-                        continue
-                    
-                    field_type = self._detect_field_type(label)
-                    should_be_parent = self._should_be_parent_field(label, text, match.start())
-                    
-                    field = USCISField(
-                        number=number,
-                        label=label,
-                        field_type="parent" if should_be_parent else field_type,
-                        part_number=part_number,
-                        is_subfield=is_subfield,
-                        is_parent=should_be_parent,
-                        parent_number=parent_number,
-                        subfield_letter=letter if is_subfield else "",
-                        extraction_method="fallback_pattern",
-                        field_pattern=pattern_type
-                    )
-                    fields.append(field)
-                    
-                except Exception as e:
-                    continue
+            if kind == "subfield":
+                letter = groups["sub_letter"].lower()
+                number = f"{groups['sub_num']}.{letter}"
+                label = groups["sub_label"]
+                pattern_type = "subfield" if groups["sub_dot"] else "subfield_compact"
+                parent_number = current_number = groups["sub_num"]
+            elif kind == "main":
+                number = groups["item_num"]
+                label = groups["item_label"]
+                pattern_type = "main"
+                parent_number = ""
+                current_number = number
+            elif kind == "ref":
+                number = groups["ref_num"]
+                label = groups["ref_label"]
+                pattern_type = "question" if groups["ref_kind"].lower().startswith("question") else "item"
+                parent_number = ""
+                current_number = number
+            else:
+                letter = groups["letter"]
+                label = groups["letter_label"]
+                if not current_number:
+                    # Lettered line before any numbered item: keep it as its own field
+                    number, pattern_type, parent_number, letter = letter, "letter", "", ""
+                else:
+                    parent_number = current_number
+                    pattern_type = "letter" if letter.isupper() and parent_number in items else "orphan_sub"
+                    letter = letter.lower()
+                    number = f"{parent_number}.{letter}"
+            
+            if number in seen_numbers:
+                continue
+            
+            # Clean the label
+            label = re.sub(r'\s+', ' ', label).strip()
+            label = re.sub(r'^[.\-–\s]+', '', label)
+            label = re.sub(r'[.\s]+$', '', label)
+            parent = items.get(parent_number)
+            is_choice = pattern_type == "letter" and parent is not None
+            if len(label) < (2 if is_choice else 3):
+                continue
+            seen_numbers.add(number)
+            
+            if is_choice:
+                # "A." lines under an item are the item's choices
+                field = USCISField(
+                    number=number,
+                    label=label,
+                    field_type="choice",
+                    part_number=part_number,
+                    is_choice=True,
+                    parent_number=parent_number,
+                    subfield_letter=letter,
+                    extraction_method="fallback_pattern",
+                    field_pattern=pattern_type
+                )
+                parent.add_choice(FieldChoice(letter=letter, label=label))
+                if not parent.is_parent:
+                    parent.field_type = "question"
+            else:
+                is_subfield = bool(parent_number)
+                field = USCISField(
+                    number=number,
+                    label=label,
+                    field_type=self._detect_field_type(label),
+                    part_number=part_number,
+                    is_subfield=is_subfield,
+                    parent_number=parent_number,
+                    subfield_letter=letter if is_subfield else "",
+                    extraction_method="fallback_pattern",
+                    field_pattern=pattern_type
+                )
+                if parent is not None:
+                    parent.add_subfield(field)
+                    if not parent.is_parent:
+                        parent.is_parent = True
+                        parent.field_type = "parent"
+                elif not is_subfield:
+                    if self._should_be_parent_field(label):
+                        field.is_parent = True
+                        field.field_type = "parent"
+                    items[number] = field
+            
+            fields.append(field)
         
         self._create_missing_parents(fields, part_number)
         self._apply_basic_subfield_rules(fields, part_number)
         
         return fields
     
-    def _should_be_parent_field(self, label: str, text: str, position: int) -> bool:
-        """Determine if field should be a parent based on content analysis"""
+    def _should_be_parent_field(self, label: str) -> bool:
+        """Whether a field's label implies subfields (name, address, contact).
+        
+        Items followed by their own sub-items become parents in the tokenizer pass.
+        """
         label_lower = label.lower()
         
         name_indicators = ["full name", "legal name", "your name", "beneficiary name", "petitioner name"]
@@ -922,11 +2074,6 @@ Text to analyze:
         if any(indicator in label_lower for indicator in contact_indicators):
             return True
         
-        text_ahead = text[position:position + 1000]
-        subfield_pattern = r'[a-z]\.\s+[A-Z]'
-        if re.search(subfield_pattern, text_ahead):
-            return True
-        
         return False
     
     def _create_missing_parents(self, fields: List[USCISField], part_number: int):
@@ -954,6 +2101,7 @@ Text to analyze:
     def _apply_basic_subfield_rules(self, fields: List[USCISField], part_number: int):
         """Apply basic subfield creation rules to parent fields"""
         new_fields = []
+        existing_numbers = {field.number for field in fields}
         
         for field in fields:
             if field.is_parent:
@@ -967,7 +2115,7 @@ Text to analyze:
                     ]
                     for letter, sub_label, sub_type in subfields_to_add:
                         sub_number = f"{field.number}.{letter}"
-                        if not any(f.number == sub_number for f in fields):
+                        if sub_number not in existing_numbers:
                             subfield = USCISField(
                                 number=sub_number,
                                 label=sub_label,
@@ -990,7 +2138,7 @@ Text to analyze:
                     ]
                     for letter, sub_label, sub_type in subfields_to_add:
                         sub_number = f"{field.number}.{letter}"
-                        if not any(f.number == sub_number for f in fields):
+                        if sub_number not in existing_numbers:
                             subfield = USCISField(
                                 number=sub_number,
                                 label=sub_label,
@@ -1052,9 +2200,22 @@ class UniversalFormProcessor:
     
     def __init__(self):
         self.agent = UniversalUSCISAgent()
+        self.structure_cache = get_form_structure_cache()
+        self.widget_extractor = AcroFormFieldExtractor(self.agent)
     
-    def process_pdf(self, pdf_file) -> Optional[USCISForm]:
-        """Process any USCIS PDF with enhanced analysis and progress tracking"""
+    def process_pdf(self, pdf_file, use_cache: bool = True, use_widgets: bool = True,
+                    clean_labels: bool = True, live_view=None, use_edition_diff: bool = True) -> Optional[USCISForm]:
+        """Process any USCIS PDF with enhanced analysis and progress tracking.
+        
+        With use_cache, a PDF whose normalized text was analyzed before is
+        rebuilt from the structure cache without any API calls. With
+        use_widgets, a fillable PDF is read from its AcroForm widgets and the
+        model is only asked to clean up labels (when clean_labels is set).
+        With use_edition_diff, parts unchanged since a cached edition of the
+        same form reuse that edition's fields and only changed parts are
+        analyzed. live_view (an st.empty placeholder) lists fields as they
+        stream in.
+        """
         if not PYMUPDF_AVAILABLE:
             st.error("PyMuPDF not available")
             return None
@@ -1070,21 +2231,77 @@ class UniversalFormProcessor:
             progress_bar.progress(0.1)
             
             pdf_file.seek(0)
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+            pdf_bytes = pdf_file.read()
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
             
             full_text = ""
+            page_texts = []
             for page_num in range(len(doc)):
                 page = doc[page_num]
                 text = page.get_text()
+                page_texts.append(text)
                 full_text += f"\n\n=== PAGE {page_num + 1} ===\n{text}"
             
             total_pages = len(doc)
+            widget_count = (doc.is_form_pdf or 0) if use_widgets else 0
             doc.close()
             
         except Exception as e:
             st.error(f"PDF extraction error: {e}")
             return None
         
+        text_hash = form_text_hash(full_text)
+        api_errors_before = self.agent.api_errors
+        # Both counters live as long as the session's processor; report this upload's share
+        retries_before = self.agent.rate_limit_retries
+        engine = "acroform" if widget_count >= ACROFORM_MIN_WIDGETS else "ai_agent"
+        if use_cache:
+            cached_form = self.structure_cache.lookup(text_hash, engine)
+            if cached_form:
+                cached_form.processing_time = (datetime.now() - start_time).total_seconds()
+                status_text.text(f"⚡ Loaded cached structure for {cached_form.form_number} ({cached_form.edition_date or 'no edition'})")
+                progress_bar.progress(1.0)
+                return cached_form
+        
+        if engine == "acroform":
+            status_text.text(f"🧩 Building fields from {widget_count} form widgets...")
+            progress_bar.progress(0.5)
+            
+            widgets = []
+            part_headers = []
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                for page_num in range(len(doc)):
+                    widgets.extend(collect_page_widgets(doc[page_num], page_num))
+                    part_headers.extend(collect_part_headers(doc[page_num], page_num))
+            
+            form_info = identify_form_from_text(full_text) or self.agent.identify_form(full_text[:3000])
+            form = USCISForm(
+                form_number=form_info["form_number"],
+                title=form_info["title"],
+                edition_date=form_info["edition_date"],
+                form_category=form_info.get("form_category", ""),
+                total_pages=total_pages,
+                text_hash=text_hash,
+                extraction_engine="acroform"
+            )
+            form.parts = self.widget_extractor.build_parts(widgets, part_headers, page_texts)
+            
+            name_labeled = [f for part in form.parts.values() for f in part.fields if f.confidence < 1.0]
+            if clean_labels and name_labeled:
+                status_text.text(f"🧹 Cleaning up {len(name_labeled)} labels derived from widget names...")
+                progress_bar.progress(0.7)
+                self.agent.clean_widget_labels(name_labeled)
+            
+            extraction_summary = [f"Part {part.number}: {part.counts()['top_level']} fields" for part in form.parts.values()]
+            extraction_summary.append(f"AcroForm: {len(widgets)} widgets, {len(name_labeled)} labels from widget names")
+            degraded = ""
+            if self.agent.api_errors > api_errors_before:
+                degraded = "API errors during identification or label cleanup"
+            elif clean_labels and name_labeled and not self.agent.client:
+                degraded = "labels not cleaned (no API client)"
+            return self._finalize_form(form, extraction_summary, text_hash, start_time, status_text, progress_bar,
+                                       degraded=degraded)
+        
         status_text.text("🔍 Identifying form type...")
         progress_bar.progress(0.2)
         
@@ -1095,91 +2312,277 @@ class UniversalFormProcessor:
             title=form_info["title"],
             edition_date=form_info["edition_date"],
             form_category=form_info.get("form_category", ""),
-            total_pages=total_pages
+            total_pages=total_pages,
+            text_hash=text_hash
         )
         
         status_text.text("📋 Extracting all form parts...")
         progress_bar.progress(0.3)
         
-        parts_data = self.agent.extract_parts(full_text)
+        span_index = PartSpanIndex(full_text)
+        parts_data = self.agent.extract_parts(full_text, span_index)
         
         if not parts_data:
             st.error("No parts could be extracted")
             return None
         
-        # Process each part
+        # Slice every part's text up front; the analyses then run concurrently
         total_parts = len(parts_data)
-        extraction_summary = []
+        status_text.text(f"✂️ Extracting text for {total_parts} parts...")
+        progress_bar.progress(0.35)
+        
+        part_texts = {}
+        for part_info in parts_data:
+            part_texts[part_info["number"]] = self._extract_part_text_enhanced(full_text, part_info["number"], span_index)
+        part_lines = {number: normalize_part_lines(text) for number, text in part_texts.items()}
+        
+        reused_parts = {}
+        edition_summary = []
+        if use_edition_diff:
+            reused_parts, edition_summary = self._reuse_unchanged_parts(form, parts_data, part_texts, part_lines)
+            if reused_parts:
+                status_text.text(f"♻️ Reusing {len(reused_parts)} unchanged parts from edition {form.baseline_edition}")
+        
+        part_jobs = []
+        for part_info in parts_data:
+            if part_info["number"] in reused_parts:
+                continue
+            part_text = part_texts[part_info["number"]]
+            windows = split_part_windows(part_text)
+            for index, window_text in enumerate(windows, start=1):
+                part_jobs.append({
+                    "number": part_info["number"],
+                    "title": part_info["title"],
+                    "text": window_text,
+                    "window": (index, len(windows)),
+                    "part_length": len(part_text),
+                    "confidence": part_info.get("confidence", 1.0)
+                })
         
-        for i, part_info in enumerate(parts_data):
-            part_num = part_info["number"]
-            part_title = part_info["title"]
-            
-            status_text.text(f"🔄 Processing Part {part_num}: {part_title}")
-            progress_bar.progress(0.4 + (0.5 * i / total_parts))
-            
-            part_text = self._extract_part_text_enhanced(full_text, part_num)
-            
-            with st.spinner(f"Analyzing fields in Part {part_num}..."):
-                fields = self.agent.analyze_part_fields(part_text, part_num, part_title)
+        analyzed_parts = total_parts - len(reused_parts)
+        window_note = f" in {len(part_jobs)} windows" if len(part_jobs) > analyzed_parts else ""
+        status_text.text(f"🔄 Analyzing {analyzed_parts} parts{window_note} concurrently...")
+        progress_bar.progress(0.4)
+        
+        def report_part(result, done, total):
+            index, windows = result["window"]
+            window_label = f" window {index}/{windows}" if windows > 1 else ""
+            status_text.text(f"✅ Part {result['number']}{window_label} analyzed ({done} of {total}) - "
+                             f"{len(result['fields'])} fields in {result['latency']:.1f}s")
+            progress_bar.progress(0.4 + (0.5 * done / total))
+        
+        # Workers append fields as they stream in; the main thread redraws the live view on each tick
+        live_fields = {job["number"]: [] for job in part_jobs}
+        for job in part_jobs:
+            job["on_fields"] = live_fields[job["number"]].extend
+        shown = [0]
+        
+        def show_live_fields():
+            parsed = sum(len(fields) for fields in live_fields.values())
+            if live_view is None or parsed == shown[0]:
+                return
+            shown[0] = parsed
+            lines = [f"#### ⏳ {parsed} fields streamed so far"]
+            for number, fields in sorted(live_fields.items()):
+                if fields:
+                    latest = ", ".join(f"{f.number}. {f.label}" for f in fields[-3:])
+                    lines.append(f"- **Part {number}** - {len(fields)} fields (latest: {latest})")
+            live_view.markdown("\n".join(lines))
+        
+        analysis_start = time.perf_counter()
+        results = self.analyze_parts_concurrently(part_jobs, on_part=report_part, on_tick=show_live_fields)
+        analysis_time = time.perf_counter() - analysis_start
+        if live_view is not None:
+            live_view.empty()
+        
+        # Group window results by part (jobs are in part then window order)
+        part_results = {}
+        for job, result in zip(part_jobs, results):
+            part_results.setdefault(job["number"], (job, []))[1].append(result)
+        
+        # Reassemble in part order regardless of completion order
+        assembled = dict(reused_parts)
+        for number, part in reused_parts.items():
+            part.text_length = len(part_texts[number])
+        
+        part_notices = 0
+        for number, (job, window_results) in part_results.items():
+            for result in window_results:
+                for notice in result["notices"]:
+                    st.warning(notice)
+                part_notices += len(result["notices"])
             
+            fields = self.agent.merge_window_fields([result["fields"] for result in window_results])
             patterns = {}
             for field in fields:
                 if field.field_pattern:
                     patterns[field.field_pattern] = patterns.get(field.field_pattern, 0) + 1
             
             part = FormPart(
-                number=part_num,
-                title=part_title,
+                number=job["number"],
+                title=job["title"],
                 fields=fields,
                 field_patterns=patterns,
                 processed=True,
-                text_length=len(part_text),
-                extraction_confidence=part_info.get("confidence", 1.0) if isinstance(part_info, dict) and "confidence" in part_info else 1.0
+                text_length=job["part_length"],
+                extraction_confidence=job["confidence"],
+                analysis_time=max(result["latency"] for result in window_results),
+                analysis_windows=len(window_results)
             )
             
-            form.parts[part.number] = part
+            assembled[part.number] = part
+        
+        extraction_summary = []
+        for number, part in sorted(assembled.items()):
+            form.parts[number] = part
             
             # Collect summary info
-            field_count = len([f for f in fields if not f.is_subfield and not f.is_choice])
-            extraction_summary.append(f"Part {part_num}: {field_count} fields")
+            if part.reused_from_edition:
+                note = " (reused)"
+            else:
+                note = f" ({part.analysis_windows} windows)" if part.analysis_windows > 1 else ""
+            extraction_summary.append(f"Part {number}: {part.counts()['top_level']} fields{note}")
+        
+        slowest_part = max((r["latency"] for r in results), default=0.0)
+        extraction_summary.append(f"Analysis: {analysis_time:.1f}s for {analyzed_parts} parts (slowest call {slowest_part:.1f}s)")
+        extraction_summary.extend(edition_summary)
+        rate_limit_retries = self.agent.rate_limit_retries - retries_before
+        if rate_limit_retries:
+            extraction_summary.append(f"Rate-limit retries: {rate_limit_retries}")
+        
+        degraded = ""
+        if not self.agent.client:
+            degraded = "no API client (fallback extraction)"
+        elif self.agent.api_errors > api_errors_before:
+            degraded = "API errors during identification or part detection"
+        elif part_notices:
+            degraded = f"{part_notices} part analysis problems (fallback extraction)"
+        
+        return self._finalize_form(form, extraction_summary, text_hash, start_time, status_text, progress_bar,
+                                   part_lines=part_lines, degraded=degraded)
+    
+    def _reuse_unchanged_parts(self, form: USCISForm, parts_data: List[Dict], part_texts: Dict[int, str],
+                               part_lines: Dict[int, List[str]]) -> Tuple[Dict[int, FormPart], List[str]]:
+        """Parts of the newest cached edition of this form whose normalized text is unchanged.
+        
+        Sets form.baseline_edition and form.llm_calls_saved (the analysis windows
+        the reused parts would have needed) and returns the reused parts by new
+        part number with summary lines describing the diff.
+        """
+        previous = self.structure_cache.previous_edition(form.form_number, form.text_hash)
+        if not previous:
+            return {}, []
+        previous_form, previous_lines = previous
+        baseline = previous_form.edition_date or "previous edition"
+        titles = {part_info["number"]: part_info["title"] for part_info in parts_data}
+        
+        reused = {}
+        changes = []
+        for number, match in sorted(align_edition_parts(part_lines, previous_lines).items()):
+            part = previous_form.parts.get(match["old"]) if match["unchanged"] else None
+            if part is None:
+                if match["old"] is None:
+                    changes.append(f"Part {number} new")
+                else:
+                    moved = f" (was Part {match['old']})" if match["old"] != number else ""
+                    changes.append(f"Part {number}{moved} +{match['added']}/-{match['removed']} lines")
+                continue
+            
+            part.number = number
+            part.title = titles[number]
+            part.reused_from_edition = baseline
+            for field in part.fields:
+                field.part_number = number
+            reused[number] = part
+        
+        if not reused:
+            return {}, [f"Edition diff vs {baseline}: no unchanged parts"]
+        
+        form.baseline_edition = baseline
+        form.llm_calls_saved = sum(len(split_part_windows(part_texts[number])) for number in reused)
+        summary = [f"Edition diff vs {baseline}: {len(reused)} of {len(part_lines)} parts unchanged, "
+                   f"{form.llm_calls_saved} LLM calls saved"]
+        if changes:
+            summary.append("Changed: " + ", ".join(changes))
+        return reused, summary
+    
+    def _finalize_form(self, form: USCISForm, extraction_summary: List[str], text_hash: str,
+                       start_time: datetime, status_text, progress_bar,
+                       part_lines: Optional[Dict[int, List[str]]] = None, degraded: str = "") -> USCISForm:
+        """Summaries, timing and structure-cache store shared by both extraction engines.
         
+        A degraded run (the reason is given in degraded) is returned but not cached.
+        """
         status_text.text("📊 Finalizing analysis...")
         progress_bar.progress(0.95)
         
         form.processing_time = (datetime.now() - start_time).total_seconds()
         form.ai_summary = self._generate_enhanced_summary(form)
+        if degraded:
+            extraction_summary.append(f"Not cached: {degraded}")
         form.extraction_summary = " | ".join(extraction_summary)
         
+        if form.parts and not degraded:
+            self.structure_cache.store(form, text_hash, part_lines)
+        
         status_text.text("✅ Processing complete!")
         progress_bar.progress(1.0)
         
         return form
     
-    def _extract_part_text_enhanced(self, full_text: str, part_number: int) -> str:
-        """Root cause fix: Use precise part boundaries instead of fuzzy pattern matching"""
+    def _analyze_part_job(self, job: Dict) -> Dict:
+        """Worker: analyze one part without touching the page"""
+        notices = []
+        start_time = time.perf_counter()
+        try:
+            fields = self.agent.analyze_part_fields(job["text"], job["number"], job["title"], notices=notices,
+                                                    window=job.get("window", (1, 1)), on_fields=job.get("on_fields"))
+        except Exception as e:
+            notices.append(f"Part {job['number']} analysis failed: {e}")
+            fields = []
+        return {
+            "number": job["number"],
+            "window": job.get("window", (1, 1)),
+            "fields": fields,
+            "notices": notices,
+            "latency": time.perf_counter() - start_time
+        }
+    
+    def analyze_parts_concurrently(self, part_jobs: List[Dict], max_workers: int = PART_ANALYSIS_MAX_WORKERS,
+                                   on_part=None, on_tick=None) -> List[Dict]:
+        """Run part analyses through a bounded pool; results come back in job order.
+        
+        on_part(result, done, total) is called on the calling thread as each part
+        finishes, and on_tick() every PART_ANALYSIS_POLL_SECONDS while any runs.
+        """
+        results = [None] * len(part_jobs)
+        done = 0
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(part_jobs)))) as executor:
+            futures = {executor.submit(self._analyze_part_job, job): index for index, job in enumerate(part_jobs)}
+            pending = set(futures)
+            while pending:
+                finished, pending = wait(pending, timeout=PART_ANALYSIS_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = futures[future]
+                    results[index] = future.result()
+                    done += 1
+                    if on_part:
+                        on_part(results[index], done, len(part_jobs))
+                if on_tick:
+                    on_tick()
+        
+        return results
+    
+    def _extract_part_text_enhanced(self, full_text: str, part_number: int,
+                                    span_index: Optional[PartSpanIndex] = None) -> str:
+        """Part text as an O(1) slice of the span index; pattern search only for parts it lacks"""
         
-        # STEP 1: Use precise boundaries if available from extract_parts
-        if hasattr(self, '_part_positions') and part_number in self._part_positions:
-            start_pos, end_pos = self._part_positions[part_number]
-            
-            if start_pos is not None and end_pos is not None:
-                part_text = full_text[start_pos:end_pos]
-                st.info(f"✅ Part {part_number}: Using precise boundaries ({start_pos}-{end_pos}, {len(part_text)} chars)")
-                
-                # Quick validation that we have the right content
-                part_title_patterns = [
-                    rf"Part\s+{part_number}\.?\s*[A-Z]",
-                    rf"PART\s+{part_number}\.?\s*[A-Z]"
-                ]
-                
-                has_part_header = any(re.search(pattern, part_text[:200], re.IGNORECASE) 
-                                    for pattern in part_title_patterns)
-                
-                if has_part_header:
-                    return part_text
-                else:
-                    st.warning(f"Part {part_number}: Precise boundaries don't contain part header, falling back to pattern search")
+        # STEP 1: Precise span from the document's part index
+        if span_index is not None:
+            part_text = span_index.slice(full_text, part_number)
+            if part_text is not None:
+                return part_text
         
         # STEP 2: Fallback to pattern-based extraction with enhanced logic
         st.info(f"Part {part_number}: Using fallback pattern-based extraction")
@@ -1266,18 +2669,22 @@ class UniversalFormProcessor:
         """Generate enhanced processing summary with detailed metrics"""
         insights = []
         
-        total_fields = sum(len(p.fields) for p in form.parts.values())
-        parent_fields = sum(len([f for f in p.fields if f.is_parent]) for p in form.parts.values())
-        subfields = sum(len([f for f in p.fields if f.is_subfield]) for p in form.parts.values())
-        questions = sum(len([f for f in p.fields if f.field_type == "question"]) for p in form.parts.values())
+        part_counts = [p.counts() for p in form.parts.values()]
+        total_fields = sum(c["total"] for c in part_counts)
+        parent_fields = sum(c["parents"] for c in part_counts)
+        subfields = sum(c["subfields"] for c in part_counts)
+        questions = sum(c["questions"] for c in part_counts)
         
         insights.append(f"Enhanced extraction: {form.form_number} with {len(form.parts)} parts")
         insights.append(f"Total fields: {total_fields} ({parent_fields} parent, {subfields} subfields, {questions} questions)")
         
         # Analysis by extraction method
-        ai_fields = sum(1 for p in form.parts.values() for f in p.fields if f.extraction_method == "ai_agent")
-        fallback_fields = total_fields - ai_fields
+        ai_fields = sum(p.method_counts().get("ai_agent", 0) for p in form.parts.values())
+        widget_fields = sum(p.method_counts().get("acroform_widget", 0) for p in form.parts.values())
+        fallback_fields = total_fields - ai_fields - widget_fields
         
+        if widget_fields > 0:
+            insights.append(f"AcroForm widgets: {widget_fields} fields")
         if ai_fields > 0:
             insights.append(f"AI analysis: {ai_fields} fields")
         if fallback_fields > 0:
@@ -1297,7 +2704,88 @@ class UniversalFormProcessor:
 
 # ===== UI FUNCTIONS =====
 
-def display_universal_field(field: USCISField, prefix: str):
+# The Field Mapping tab only builds widgets for one page of the filtered fields,
+# so a rerun costs the same for a 40-field part as for a 4,000-field one.
+FIELD_PAGE_SIZES = [25, 50, 100]
+FIELD_STATUS_FILTERS = ["All", "Unmapped", "Mapped", "In questionnaire"]
+BULK_MAPPING_MIN_RATIO = 0.6
+# Label phrases whose schema path shares no wording with them, as schema path words
+DB_FIELD_ALIASES = {
+    "a number": "alien number",
+    "alien registration number": "alien number",
+    "social security number": "ssn",
+    "email address": "email",
+    "e mail address": "email",
+    "e mail": "email",
+    "uscis online account number": "uscis number"
+}
+
+def filter_display_fields(fields: List[USCISField], query: str = "", field_types: Sequence[str] = (),
+                          status: str = "All") -> List[USCISField]:
+    """Fields whose number or label contains query, of the given types and mapping status"""
+    query = query.strip().lower()
+    field_types = set(field_types)
+    matches = []
+    for field in fields:
+        if query and query not in field.number.lower() and query not in field.label.lower():
+            continue
+        if field_types and field.field_type not in field_types:
+            continue
+        if status == "Mapped" and not field.is_mapped:
+            continue
+        if status == "Unmapped" and (field.is_mapped or field.is_parent):
+            continue
+        if status == "In questionnaire" and not field.in_questionnaire:
+            continue
+        matches.append(field)
+    return matches
+
+def field_filter_controls(part: FormPart, sort_key: Callable[[str], Tuple]) -> Tuple[List[USCISField], Tuple]:
+    """Search/type/status controls for a part; returns the matching fields and the filter values"""
+    col1, col2, col3 = st.columns([3, 2, 2])
+    with col1:
+        query = st.text_input("🔎 Search number or label", key=f"map_query_p{part.number}")
+    with col2:
+        field_types = st.multiselect("Type", sorted(part.type_counts()), key=f"map_types_p{part.number}")
+    with col3:
+        status = st.selectbox("Status", FIELD_STATUS_FILTERS, key=f"map_status_p{part.number}")
+    
+    return filter_display_fields(part.display_order(sort_key), query, field_types, status), (query, tuple(field_types), status)
+
+def show_field_page(part: FormPart, rows: List[USCISField], filters: Tuple):
+    """One page of display_universal_field rows from the filtered fields"""
+    col1, col2, col3 = st.columns([2, 2, 3])
+    with col1:
+        page_size = st.selectbox("Fields per page", FIELD_PAGE_SIZES, key=f"map_page_size_p{part.number}")
+    
+    # Back to the first page whenever the filters change
+    page_key = f"map_page_p{part.number}"
+    filter_key = f"map_filter_p{part.number}"
+    signature = filters + (page_size,)
+    page_count = max(1, -(-len(rows) // page_size))
+    if st.session_state.get(filter_key) != signature:
+        st.session_state[filter_key] = signature
+        st.session_state[page_key] = 1
+    elif st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    
+    with col2:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key=page_key)
+    
+    start = (page - 1) * page_size
+    visible = rows[start:start + page_size]
+    with col3:
+        counts = part.counts()
+        shown = f"{start + 1}-{start + len(visible)}" if visible else "0"
+        st.caption(f"Showing {shown} of {len(rows)} matching fields "
+                   f"({counts['total']} total, {counts['mapped']} mapped, {counts['questionnaire']} in questionnaire)")
+    
+    if not visible:
+        st.info("No fields match these filters")
+    for field in visible:
+        display_universal_field(field, f"map_p{part.number}", part)
+
+def display_universal_field(field: USCISField, prefix: str, part: FormPart):
     """Display field with universal styling and controls"""
     unique_key = f"{prefix}_{field.unique_id}"
     
@@ -1344,6 +2832,8 @@ def display_universal_field(field: USCISField, prefix: str):
                                unsafe_allow_html=True)
                 if field.extraction_method:
                     st.caption(f"Method: {field.extraction_method}")
+                if field.pdf_field_name:
+                    st.caption(f"Widget: {field.pdf_field_name} (page {field.page_number})")
     
     with col2:
         if not field.is_parent and field.field_type != "question":
@@ -1351,8 +2841,14 @@ def display_universal_field(field: USCISField, prefix: str):
                 field.value = st.date_input("Value", key=f"{unique_key}_val", 
                                           label_visibility="collapsed")
                 field.value = str(field.value) if field.value else ""
+            elif field.field_type == "select" and field.choices:
+                options = [""] + [choice.value or choice.label for choice in field.choices]
+                field.value = st.selectbox("Value", options,
+                                           index=options.index(field.value) if field.value in options else 0,
+                                           key=f"{unique_key}_val", label_visibility="collapsed")
             elif field.field_type in ["checkbox", "choice"] or field.is_choice:
-                field.value = st.checkbox("", key=f"{unique_key}_choice")
+                # value= keeps the state of fields whose page was not shown on the last run
+                field.value = st.checkbox("", value=bool(field.value), key=f"{unique_key}_choice")
             elif field.field_type == "email":
                 field.value = st.text_input("Value", value=field.value, 
                                           key=f"{unique_key}_val", 
@@ -1385,15 +2881,15 @@ def display_universal_field(field: USCISField, prefix: str):
             with c2:
                 quest_label = "Remove" if field.in_questionnaire else "Quest"
                 if st.button(quest_label, key=f"{unique_key}_quest_btn", use_container_width=True):
-                    field.in_questionnaire = not field.in_questionnaire
+                    part.set_in_questionnaire(field, not field.in_questionnaire)
                     st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
     
     if st.session_state.get(f"show_mapping_{field.unique_id}"):
-        show_universal_mapping_dialog(field, unique_key)
+        show_universal_mapping_dialog(field, unique_key, part)
 
-def show_universal_mapping_dialog(field: USCISField, unique_key: str):
+def show_universal_mapping_dialog(field: USCISField, unique_key: str, part: FormPart):
     """Show universal field mapping dialog"""
     st.markdown("---")
     st.markdown("### 🎯 Map Field to Database Schema")
@@ -1424,9 +2920,7 @@ def show_universal_mapping_dialog(field: USCISField, unique_key: str):
     col3, col4 = st.columns(2)
     with col3:
         if st.button("✅ Apply Mapping", key=f"{unique_key}_apply"):
-            field.is_mapped = True
-            field.db_object = schema
-            field.db_field = db_field
+            part.set_mapping(field, schema, db_field)
             del st.session_state[f"show_mapping_{field.unique_id}"]
             st.rerun()
     
@@ -1435,6 +2929,219 @@ def show_universal_mapping_dialog(field: USCISField, unique_key: str):
             del st.session_state[f"show_mapping_{field.unique_id}"]
             st.rerun()
 
+def suggest_db_field(label: str, schema: str) -> str:
+    """Closest path in a schema for a field label, e.g. "Family Name (Last Name)" -> beneficiaryLastName.
+    
+    The label outside and inside parentheses are compared separately, plus the
+    path words of any DB_FIELD_ALIASES phrase they contain ("A-Number" ->
+    "alien number"); custom schema fields get the label in camelCase. Empty
+    when nothing is close enough.
+    """
+    variants = [re.sub(r'\([^)]*\)', ' ', label)] + re.findall(r'\(([^)]*)\)', label)
+    variants = [" ".join(re.findall(r'[a-z0-9]+', variant.lower())) for variant in variants]
+    variants = [variant for variant in variants if variant]
+    variants += [alias for phrase, alias in DB_FIELD_ALIASES.items()
+                 if any(re.search(rf'\b{phrase}\b', variant) for variant in variants)]
+    if not variants:
+        return ""
+    if schema == "custom" or schema not in DATABASE_SCHEMA:
+        return re.sub(r' (\w)', lambda m: m.group(1).upper(), variants[0])
+    
+    best_path, best_ratio = "", BULK_MAPPING_MIN_RATIO
+    for path in DATABASE_SCHEMA[schema]["paths"]:
+        # beneficiaryLastName -> "last name", beneficiaryUSCISNumber -> "uscis number"
+        path_words = " ".join(re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+', path)[1:]).lower()
+        for variant in variants:
+            ratio = difflib.SequenceMatcher(None, variant, path_words).ratio()
+            if ratio > best_ratio:
+                best_path, best_ratio = path, ratio
+    return best_path
+
+def apply_batch_mappings(part: FormPart, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Commit edited mapping rows ({"id", "schema", "db_field"}) to the part in one pass.
+    
+    An empty schema clears the mapping; a non-custom field must be one of the
+    schema's paths. Returns mapped/cleared/unchanged counts and invalid field numbers.
+    """
+    fields = {field.unique_id: field for field in part.fields}
+    result = {"mapped": 0, "cleared": 0, "unchanged": 0, "invalid": []}
+    for row in rows:
+        field = fields.get(row["id"])
+        if field is None:
+            continue
+        # Cleared data_editor cells come back as None or NaN
+        schema = row.get("schema")
+        schema = schema.strip() if isinstance(schema, str) else ""
+        db_field = row.get("db_field")
+        db_field = db_field.strip() if isinstance(db_field, str) else ""
+        
+        if not schema:
+            if field.is_mapped:
+                part.clear_mapping(field)
+                result["cleared"] += 1
+            else:
+                result["unchanged"] += 1
+        elif not db_field or (schema != "custom" and db_field not in DATABASE_SCHEMA.get(schema, {}).get("paths", [])):
+            result["invalid"].append(field.number)
+        elif field.is_mapped and (field.db_object, field.db_field) == (schema, db_field):
+            result["unchanged"] += 1
+        else:
+            part.set_mapping(field, schema, db_field)
+            result["mapped"] += 1
+    return result
+
+def show_bulk_mapping_preview(part: FormPart, preview: Dict[str, Any], preview_key: str,
+                              version_key: str, version: int):
+    """Suggested subfield mappings to review and correct; nothing is mapped until confirmed"""
+    schema = preview["schema"]
+    if not preview["rows"]:
+        st.info(f"Every subfield of {preview['parent']} is already mapped")
+        if st.button("Close", key=f"{preview_key}_close"):
+            del st.session_state[preview_key]
+            st.rerun()
+        return
+    
+    table = pd.DataFrame(
+        {
+            "Number": [row["number"] for row in preview["rows"]],
+            "Label": [row["label"] for row in preview["rows"]],
+            "Current": [row["current"] for row in preview["rows"]],
+            "DB Field": [row["db_field"] for row in preview["rows"]]
+        },
+        index=pd.Index([row["id"] for row in preview["rows"]], name="id")
+    )
+    if schema in DATABASE_SCHEMA and schema != "custom":
+        db_field_column = st.column_config.SelectboxColumn(options=[""] + DATABASE_SCHEMA[schema]["paths"])
+    else:
+        db_field_column = st.column_config.TextColumn()
+    
+    st.caption(f"Suggested {schema} fields for the subfields of {preview['parent']} - correct any row, "
+               f"clear a field to leave it unmapped, then confirm.")
+    edited = st.data_editor(
+        table,
+        column_config={"DB Field": db_field_column},
+        disabled=["Number", "Label", "Current"],
+        hide_index=True,
+        use_container_width=True,
+        key=f"{preview_key}_{version}_editor"
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("✅ Confirm mappings", key=f"{preview_key}_confirm", type="primary"):
+            accepted = [{"id": unique_id, "schema": schema, "db_field": row["DB Field"]}
+                        for unique_id, row in edited.iterrows()
+                        if isinstance(row["DB Field"], str) and row["DB Field"].strip()]
+            result = apply_batch_mappings(part, accepted)
+            message = f"✅ Mapped {result['mapped']} subfields of {preview['parent']}"
+            skipped = len(preview["rows"]) - len(accepted)
+            if skipped:
+                message += f", {skipped} left unmapped"
+            if result["invalid"]:
+                message += f" - no such {schema} field for {', '.join(result['invalid'])}"
+            st.session_state[f"batch_result_p{part.number}"] = message
+            st.session_state[version_key] = version + 1
+            del st.session_state[preview_key]
+            st.rerun()
+    with col2:
+        if st.button("❌ Discard", key=f"{preview_key}_discard"):
+            del st.session_state[preview_key]
+            st.rerun()
+
+def show_batch_mapping_editor(part: FormPart, rows: List[USCISField], filters: Tuple):
+    """Editable mapping table for the filtered fields, committed with one submit"""
+    fields = [field for field in rows if not field.is_parent]
+    version_key = f"batch_version_p{part.number}"
+    version = st.session_state.get(version_key, 0)
+    
+    preview_key = f"bulk_preview_p{part.number}"
+    
+    if st.session_state.get(f"batch_result_p{part.number}"):
+        st.success(st.session_state.pop(f"batch_result_p{part.number}"))
+    
+    parents = [field for field in part.view("parents") if part.children(field.number)]
+    if parents:
+        with st.expander("🧩 Map all subfields of a parent", expanded=preview_key in st.session_state):
+            with st.form(f"bulk_map_p{part.number}_{version}"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    parent_number = st.selectbox("Parent field", [f.number for f in parents],
+                                                 format_func=lambda n: f"{n}. {part.get_field(n).label}")
+                with col2:
+                    schema = st.selectbox("Database Schema", list(DATABASE_SCHEMA.keys()),
+                                          format_func=lambda x: DATABASE_SCHEMA[x]["label"])
+                overwrite = st.checkbox("Replace existing mappings", value=False)
+                if st.form_submit_button("🧩 Suggest mappings"):
+                    st.session_state[preview_key] = {
+                        "parent": parent_number,
+                        "schema": schema,
+                        "rows": [
+                            {"id": child.unique_id, "number": child.number, "label": child.label,
+                             "current": f"{child.db_object}.{child.db_field}" if child.is_mapped else "",
+                             "db_field": suggest_db_field(child.label, schema)}
+                            for child in part.children(parent_number)
+                            if overwrite or not child.is_mapped
+                        ]
+                    }
+            
+            preview = st.session_state.get(preview_key)
+            if preview:
+                show_bulk_mapping_preview(part, preview, preview_key, version_key, version)
+    
+    if not fields:
+        st.info("No mappable fields match these filters")
+        return
+    
+    table = pd.DataFrame(
+        {
+            "Number": [f.number for f in fields],
+            "Label": [f.label for f in fields],
+            "Type": [f.field_type for f in fields],
+            "Schema": [f.db_object if f.is_mapped else "" for f in fields],
+            "DB Field": [f.db_field if f.is_mapped else "" for f in fields]
+        },
+        index=pd.Index([f.unique_id for f in fields], name="id")
+    )
+    all_paths = sorted({path for schema in DATABASE_SCHEMA.values() for path in schema["paths"]})
+    
+    # The key changes with the filters and after each commit so stale edits are never replayed
+    editor_key = f"batch_editor_p{part.number}_{version}_{hash(filters)}"
+    with st.form(f"batch_map_p{part.number}_{version}"):
+        st.caption(f"{len(fields)} fields - pick a schema and field per row, clear the schema to unmap; "
+                   f"nothing changes until you commit. Custom fields are set with the subfield action or Map button.")
+        edited = st.data_editor(
+            table,
+            column_config={
+                "Schema": st.column_config.SelectboxColumn(options=[""] + list(DATABASE_SCHEMA.keys())),
+                "DB Field": st.column_config.SelectboxColumn(options=[""] + all_paths),
+            },
+            disabled=["Number", "Label", "Type"],
+            hide_index=True,
+            use_container_width=True,
+            key=editor_key
+        )
+        submitted = st.form_submit_button("💾 Commit mappings", type="primary", use_container_width=True)
+    
+    if submitted:
+        result = apply_batch_mappings(part, [
+            {"id": unique_id, "schema": row["Schema"], "db_field": row["DB Field"]}
+            for unique_id, row in edited.iterrows()
+        ])
+        message = f"✅ {result['mapped']} mapped, {result['cleared']} cleared, {result['unchanged']} unchanged"
+        if result["invalid"]:
+            message += f" - not applied (field not in schema): {', '.join(result['invalid'])}"
+        st.session_state[f"batch_result_p{part.number}"] = message
+        st.session_state[version_key] = version + 1
+        # One rerun per commit so the sidebar counts catch up
+        st.rerun()
+
+def mapping_summary(mapped: List[USCISField]) -> Dict[str, int]:
+    """Mapped field count per database object"""
+    summary = {}
+    for field in mapped:
+        summary[field.db_object] = summary.get(field.db_object, 0) + 1
+    return summary
+
 def export_universal_data(part: FormPart, export_type: str, form_info: Dict) -> str:
     """Export data with universal structure"""
     base_info = {
@@ -1446,7 +3153,7 @@ def export_universal_data(part: FormPart, export_type: str, form_info: Dict) ->
     }
     
     if export_type == "mapped_fields":
-        mapped = [f for f in part.fields if f.is_mapped and not f.is_parent]
+        mapped = part.mapped_fields()
         data = {
             **base_info,
             "mapped_fields": [
@@ -1463,14 +3170,11 @@ def export_universal_data(part: FormPart, export_type: str, form_info: Dict) ->
                 }
                 for f in mapped
             ],
-            "mapping_summary": {
-                schema: len([f for f in mapped if f.db_object == schema])
-                for schema in set(f.db_object for f in mapped)
-            }
+            "mapping_summary": mapping_summary(mapped)
         }
     
     elif export_type == "questionnaire":
-        quest_fields = [f for f in part.fields if f.in_questionnaire and not f.is_parent]
+        quest_fields = part.questionnaire_fields()
         data = {
             **base_info,
             "questionnaire_fields": [
@@ -1489,18 +3193,17 @@ def export_universal_data(part: FormPart, export_type: str, form_info: Dict) ->
     
     elif export_type == "db_objects":
         db_objects = {}
-        for field in part.fields:
-            if field.is_mapped and not field.is_parent:
-                if field.db_object not in db_objects:
-                    db_objects[field.db_object] = []
-                db_objects[field.db_object].append({
-                    "field_number": field.number,
-                    "field_label": field.label,
-                    "field_type": field.field_type,
-                    "field_pattern": field.field_pattern,
-                    "field_value": field.value,
-                    "db_field": field.db_field
-                })
+        for field in part.mapped_fields():
+            if field.db_object not in db_objects:
+                db_objects[field.db_object] = []
+            db_objects[field.db_object].append({
+                "field_number": field.number,
+                "field_label": field.label,
+                "field_type": field.field_type,
+                "field_pattern": field.field_pattern,
+                "field_value": field.value,
+                "db_field": field.db_field
+            })
         
         data = {
             **base_info,
@@ -1509,6 +3212,112 @@ def export_universal_data(part: FormPart, export_type: str, form_info: Dict) ->
     
     return json.dumps(data, indent=2, default=str)
 
+# ===== WHOLE-FORM EXPORT =====
+
+# Every part of every form is walked once and written as it is read: mapped and
+# questionnaire fields as they are met, then the part's DB objects. Only one
+# part's DB objects are held at a time and XLSX uses xlsxwriter's constant-memory
+# mode, so no intermediate row lists or DataFrames are built. st.download_button
+# needs the finished file in memory, so the output itself is held as bytes.
+EXPORT_COLUMNS = ["record", "form_number", "form_title", "part_number", "part_title",
+                  "field_number", "field_label", "field_type", "field_pattern", "field_value",
+                  "db_object", "db_field", "is_subfield", "parent_number"]
+EXPORT_SHEETS = {"mapped_field": "Mapped Fields", "questionnaire_field": "Questionnaire", "db_object": "DB Objects"}
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx")
+}
+
+def iter_form_export_records(forms: Sequence[USCISForm]) -> Iterator[Dict[str, Any]]:
+    """Form, mapped field, questionnaire field and DB object records in part and field order"""
+    for form in forms:
+        yield {"record": "form", "form_number": form.form_number, "form_title": form.title,
+               "edition_date": form.edition_date, "form_category": form.form_category,
+               "parts": len(form.parts), "timestamp": datetime.now().isoformat()}
+        
+        for part_number, part in sorted(form.parts.items()):
+            base = {"form_number": form.form_number, "form_title": form.title,
+                    "part_number": part_number, "part_title": part.title}
+            db_objects = {}
+            for field in part.fields:
+                if field.is_parent or not (field.is_mapped or field.in_questionnaire):
+                    continue
+                record = {
+                    **base,
+                    "field_number": field.number,
+                    "field_label": field.label,
+                    "field_type": field.field_type,
+                    "field_pattern": field.field_pattern,
+                    "field_value": field.value,
+                    "is_subfield": field.is_subfield,
+                    "parent_number": field.parent_number
+                }
+                if field.is_mapped:
+                    yield {"record": "mapped_field", **record, "db_object": field.db_object, "db_field": field.db_field}
+                    db_objects.setdefault(field.db_object, []).append(
+                        {"db_field": field.db_field, "field_number": field.number, "field_value": field.value})
+                if field.in_questionnaire:
+                    yield {"record": "questionnaire_field", **record}
+            
+            for db_object, object_fields in db_objects.items():
+                yield {"record": "db_object", **base, "db_object": db_object, "fields": object_fields}
+
+def export_rows(record: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Flat EXPORT_COLUMNS rows for a record; a DB object gives one row per field"""
+    if record["record"] == "db_object":
+        for object_field in record["fields"]:
+            yield {**record, **object_field}
+    elif record["record"] != "form":
+        yield record
+
+def write_form_export(forms: Sequence[USCISForm], export_format: str, handle) -> Dict[str, int]:
+    """Stream the whole-form export into a binary file object; returns record counts by type"""
+    counts = {}
+    if export_format == "xlsx":
+        if not XLSXWRITER_AVAILABLE:
+            raise ValueError("XLSX export needs xlsxwriter: pip install xlsxwriter")
+        workbook = xlsxwriter.Workbook(handle, {"constant_memory": True})
+        sheets = {}
+        next_rows = {}
+        for record_type, title in EXPORT_SHEETS.items():
+            sheets[record_type] = workbook.add_worksheet(title)
+            sheets[record_type].write_row(0, 0, EXPORT_COLUMNS[1:])
+            next_rows[record_type] = 1
+        for record in iter_form_export_records(forms):
+            counts[record["record"]] = counts.get(record["record"], 0) + 1
+            for row in export_rows(record):
+                sheet = sheets[row["record"]]
+                sheet.write_row(next_rows[row["record"]], 0, [row.get(column, "") for column in EXPORT_COLUMNS[1:]])
+                next_rows[row["record"]] += 1
+        workbook.close()
+        return counts
+    
+    text = io.TextIOWrapper(handle, encoding="utf-8", newline="")
+    try:
+        if export_format == "ndjson":
+            for record in iter_form_export_records(forms):
+                counts[record["record"]] = counts.get(record["record"], 0) + 1
+                text.write(json.dumps(record, default=str) + "\n")
+        elif export_format == "csv":
+            writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for record in iter_form_export_records(forms):
+                counts[record["record"]] = counts.get(record["record"], 0) + 1
+                writer.writerows(export_rows(record))
+        else:
+            raise ValueError(f"Unknown export format: {export_format}")
+    finally:
+        text.flush()
+        text.detach()
+    return counts
+
+def build_form_export(forms: Sequence[USCISForm], export_format: str):
+    """Whole-form export as bytes for st.download_button, with its record counts"""
+    output = io.BytesIO()
+    counts = write_form_export(forms, export_format, output)
+    return output.getvalue(), counts
+
 # ===== MAIN APPLICATION =====
 
 def main():
@@ -1555,16 +3364,16 @@ def main():
                 st.metric("Processing Time", f"{form.processing_time:.1f}s")
             
             with col2:
-                total_fields = sum(len(p.fields) for p in form.parts.values())
-                mapped_fields = sum(1 for p in form.parts.values() 
-                                  for f in p.fields if f.is_mapped)
+                part_counts = [p.counts() for p in form.parts.values()]
+                total_fields = sum(c["total"] for c in part_counts)
+                mapped_fields = sum(c["mapped"] for c in part_counts)
                 st.metric("Total Fields", total_fields)
                 st.metric("Mapped Fields", mapped_fields)
             
             # Parts overview
             st.markdown("### 📋 Parts Overview")
             for part_num, part in sorted(form.parts.items()):
-                field_count = len([f for f in part.fields if not f.is_subfield and not f.is_choice])
+                field_count = part.counts()["top_level"]
                 confidence = part.extraction_confidence
                 confidence_color = "🟢" if confidence > 0.8 else "🟡" if confidence > 0.5 else "🔴"
                 
@@ -1595,24 +3404,57 @@ def main():
         
         uploaded_file = st.file_uploader("Choose USCIS PDF file", type=['pdf'])
         
+        structure_cache = st.session_state.processor.structure_cache
+        use_cache = st.checkbox("⚡ Reuse cached structure for previously analyzed editions", value=True,
+                                help="Skips the AI analysis when this exact form text was processed before. "
+                                     "Field values and mappings are never cached.")
+        use_widgets = st.checkbox("🧩 Read fillable form widgets when the PDF has them", value=True,
+                                  help="Builds fields from the PDF's AcroForm widgets in under a second instead of "
+                                       "analyzing the text with the AI agent.")
+        clean_labels = st.checkbox("🧹 AI cleanup of labels derived from widget names", value=True,
+                                   disabled=not use_widgets)
+        use_edition_diff = st.checkbox("♻️ Re-analyze only parts changed since a cached edition", value=True,
+                                       help="Diffs each part against the newest cached edition of the same form "
+                                            "and reuses the analyzed fields of unchanged parts.")
+        
+        with st.expander("🗄️ Form Structure Cache"):
+            cache_stats = structure_cache.stats()
+            st.caption(f"{cache_stats['entries']} cached form editions, {cache_stats['hits']} hits this process")
+            for key in cache_stats["keys"]:
+                st.caption(f"• {key}")
+            if st.button("🗑️ Clear Structure Cache"):
+                structure_cache.clear()
+                st.rerun()
+        
         if uploaded_file:
             if st.button("🚀 Process with Enhanced AI Agent", type="primary", use_container_width=True):
-                form = st.session_state.processor.process_pdf(uploaded_file)
+                # Fields stream into the Field Mapping tab while the parts are analyzed
+                form = st.session_state.processor.process_pdf(uploaded_file, use_cache=use_cache,
+                                                              use_widgets=use_widgets, clean_labels=clean_labels,
+                                                              live_view=tab2.empty(),
+                                                              use_edition_diff=use_edition_diff)
                 
                 if form:
                     st.session_state.form = form
                     st.success(f"✅ Successfully processed {form.form_number}: {form.title}")
+                    if form.from_cache:
+                        st.info(f"⚡ Structure loaded from cache in {form.processing_time * 1000:.0f} ms - no AI calls made")
+                    elif form.baseline_edition:
+                        reused = sum(1 for part in form.parts.values() if part.reused_from_edition)
+                        st.info(f"♻️ Reused {reused} of {len(form.parts)} unchanged parts from edition "
+                                f"{form.baseline_edition} - {form.llm_calls_saved} LLM calls saved")
                     
                     st.markdown("### 📋 Enhanced AI Analysis Results")
                     
                     # Detailed part analysis
                     for part_num, part in sorted(form.parts.items()):
                         with st.expander(f"📁 Part {part_num}: {part.title}", expanded=True):
-                            parent_fields = len([f for f in part.fields if f.is_parent])
-                            subfields = len([f for f in part.fields if f.is_subfield])
-                            questions = len([f for f in part.fields if f.field_type == "question"])
-                            choices = len([f for f in part.fields if f.is_choice])
-                            regular_fields = len([f for f in part.fields if not f.is_parent and not f.is_subfield and not f.is_choice])
+                            counts = part.counts()
+                            parent_fields = counts["parents"]
+                            subfields = counts["subfields"]
+                            questions = counts["questions"]
+                            choices = counts["choices"]
+                            regular_fields = counts["regular"]
                             
                             col1, col2, col3 = st.columns(3)
                             with col1:
@@ -1630,7 +3472,11 @@ def main():
                                 st.caption(f"🔍 Patterns detected: {patterns}")
                                 
                             st.caption(f"📝 Text length: {part.text_length:,} characters")
+                            st.caption(f"⏱️ Analysis time: {part.analysis_time:.1f}s"
+                                       + (f" ({part.analysis_windows} windows)" if part.analysis_windows > 1 else ""))
                             st.caption(f"🎯 Extraction confidence: {part.extraction_confidence:.0%}")
+                            if part.reused_from_edition:
+                                st.caption(f"♻️ Unchanged since edition {part.reused_from_edition} - fields reused")
                 else:
                     st.error("❌ Failed to process form")
     
@@ -1645,7 +3491,7 @@ def main():
             part_options = []
             for part_num in part_numbers:
                 part = form.parts[part_num]
-                field_count = len([f for f in part.fields if not f.is_subfield and not f.is_choice])
+                field_count = part.counts()["top_level"]
                 confidence = part.extraction_confidence
                 status_icon = "🟢" if confidence > 0.8 else "🟡" if confidence > 0.5 else "🔴"
                 part_options.append(f"{status_icon} Part {part_num}: {part.title} ({field_count} fields)")
@@ -1658,21 +3504,15 @@ def main():
                 part = form.parts[selected_part]
                 
                 st.markdown(f"#### Part {part.number}: {part.title}")
-                st.info(f"📊 {len(part.fields)} total fields | Confidence: {part.extraction_confidence:.0%}")
+                st.info(f"📊 {part.counts()['total']} total fields | Confidence: {part.extraction_confidence:.0%}")
                 
-                # Display fields with enhanced organization
-                displayed = set()
-                for field in sorted(part.fields, key=lambda f: st.session_state.processor.agent._get_sort_key(f.number)):
-                    if field.number not in displayed:
-                        if field.is_parent or not field.is_subfield:
-                            display_universal_field(field, f"map_p{part.number}")
-                            displayed.add(field.number)
-                            
-                            # Show related subfields
-                            for child in part.fields:
-                                if child.parent_number == field.number and child.number not in displayed:
-                                    display_universal_field(child, f"map_p{part.number}")
-                                    displayed.add(child.number)
+                mode = st.radio("Mapping mode", ["Field by field", "Batch editor"], horizontal=True,
+                                key=f"map_mode_p{part.number}")
+                rows, filters = field_filter_controls(part, st.session_state.processor.agent._get_sort_key)
+                if mode == "Batch editor":
+                    show_batch_mapping_editor(part, rows, filters)
+                else:
+                    show_field_page(part, rows, filters)
         else:
             st.info("👆 Upload and process any USCIS form first")
     
@@ -1683,7 +3523,7 @@ def main():
             form = st.session_state.form
             
             for part_num, part in sorted(form.parts.items()):
-                quest_fields = [f for f in part.fields if f.in_questionnaire and not f.is_parent]
+                quest_fields = part.questionnaire_fields()
                 
                 if quest_fields:
                     st.markdown(f"#### Part {part_num}: {part.title}")
@@ -1706,7 +3546,7 @@ def main():
                         
                         st.markdown("---")
             
-            if not any(f.in_questionnaire for p in form.parts.values() for f in p.fields):
+            if not any(p.questionnaire_fields() for p in form.parts.values()):
                 st.info("No fields added to questionnaire yet. Go to Field Mapping tab to add fields.")
         else:
             st.info("👆 Upload and process any USCIS form first")
@@ -1729,7 +3569,7 @@ def main():
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    mapped_count = len([f for f in part.fields if f.is_mapped and not f.is_parent])
+                    mapped_count = len(part.mapped_fields())
                     if mapped_count > 0:
                         mapped_data = export_universal_data(part, "mapped_fields", form_info)
                         st.download_button(
@@ -1744,7 +3584,7 @@ def main():
                         st.button(f"📋 Mapped Fields (0)", disabled=True, key=f"disabled_mapped_{part_num}", use_container_width=True)
                 
                 with col2:
-                    quest_count = len([f for f in part.fields if f.in_questionnaire and not f.is_parent])
+                    quest_count = len(part.questionnaire_fields())
                     if quest_count > 0:
                         quest_data = export_universal_data(part, "questionnaire", form_info)
                         st.download_button(
@@ -1759,7 +3599,7 @@ def main():
                         st.button(f"📝 Questionnaire (0)", disabled=True, key=f"disabled_quest_{part_num}", use_container_width=True)
                 
                 with col3:
-                    db_objects = set(f.db_object for f in part.fields if f.is_mapped and not f.is_parent)
+                    db_objects = set(f.db_object for f in part.mapped_fields())
                     if db_objects:
                         db_data = export_universal_data(part, "db_objects", form_info)
                         st.download_button(
@@ -1775,6 +3615,24 @@ def main():
                 
                 st.markdown('</div>', unsafe_allow_html=True)
             
+            st.markdown("#### 🚚 Whole-Form Export")
+            formats = [name for name in EXPORT_FORMATS if name != "xlsx" or XLSXWRITER_AVAILABLE]
+            export_format = st.radio("Format", formats, horizontal=True, format_func=str.upper,
+                                     help="Mapped fields, questionnaire fields and DB objects of every part in one file")
+            if st.button("🚚 Build Whole-Form Export", use_container_width=True):
+                export_start = time.perf_counter()
+                export_data, counts = build_form_export([form], export_format)
+                mime, extension = EXPORT_FORMATS[export_format]
+                st.caption(f"{counts.get('mapped_field', 0)} mapped, {counts.get('questionnaire_field', 0)} questionnaire, "
+                           f"{counts.get('db_object', 0)} DB object records in {time.perf_counter() - export_start:.2f}s")
+                st.download_button(
+                    f"📥 Download {export_format.upper()}",
+                    export_data,
+                    f"{form.form_number}_export.{extension}",
+                    mime,
+                    key="export_whole_form"
+                )
+            
             st.markdown("#### 📦 Complete Form Export")
             if st.button("📥 Download Complete Form Analysis", type="primary", use_container_width=True):
                 full_export = {
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+CASE DOCKET BENCHMARK
+=====================
+Fills a scratch docket database with synthetic cases, 10k-100k of them, in
+batch-import sized chunks. It then times the queries the docket view runs
+on every rerun: the deadline priority queue, a receipt-number lookup and the
+header counts. Query plans are printed so you can confirm the receipt and
+(status, deadline) indexes are used rather than a table scan.
+
+Run from the repository root:
+    python benchmarks/bench_docket.py
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402  (module-level Streamlit calls run in bare mode)
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+CASE_COUNTS = [10_000, 50_000, 100_000]
+IMPORT_CHUNK = 500
+SERVICE_CENTERS = ["EAC", "WAC", "SRC", "MSC", "NBC", "IOE"]
+ISSUES = ["Specialty Occupation", "Beneficiary Qualifications", "Employer-Employee Relationship", "Ability to Pay"]
+
+def synthetic_records(count, rng):
+    today = date.today()
+    for number in range(count):
+        yield app.build_docket_record(
+            f"{rng.choice(SERVICE_CENTERS)}{2190000000 + number}",
+            deadline=(today + timedelta(days=rng.randint(-30, 120))).strftime("%m/%d/%Y") if rng.random() < 0.9 else None,
+            issues=rng.sample(ISSUES, rng.randint(1, 3)),
+            visa_category="H-1B",
+            petitioner=f"Petitioner {number % 997}",
+            source_document=f"rfe_{number}.pdf"
+        )
+
+def best_of(func, repeats=20):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    rng = random.Random(7)
+    print(f"{'cases':>8} {'import s':>9} {'queue(25) ms':>13} {'lookup ms':>10} {'stats ms':>9} {'db MB':>7}")
+
+    for count in CASE_COUNTS:
+        with tempfile.TemporaryDirectory() as scratch:
+            db_path = os.path.join(scratch, "docket.db")
+            records = list(synthetic_records(count, rng))
+
+            start = time.perf_counter()
+            for offset in range(0, count, IMPORT_CHUNK):
+                app.upsert_docket_cases(records[offset:offset + IMPORT_CHUNK], db_path)
+            import_time = time.perf_counter() - start
+
+            queue_time, queue = best_of(lambda: app.get_upcoming_deadlines(limit=25, db_path=db_path))
+            receipt = records[count // 2]["receipt_number"]
+            lookup_time, case = best_of(lambda: app.find_docket_case(receipt, db_path=db_path))
+            stats_time, _ = best_of(lambda: app.get_docket_stats(db_path=db_path), repeats=5)
+            assert case and case["receipt_number"] == receipt
+            assert [c["deadline"] for c in queue] == sorted(c["deadline"] for c in queue)
+
+            print(f"{count:>8,} {import_time:>9.2f} {queue_time * 1000:>13.2f} {lookup_time * 1000:>10.2f} "
+                  f"{stats_time * 1000:>9.2f} {os.path.getsize(db_path) / 1e6:>7.1f}")
+
+            if count == CASE_COUNTS[-1]:
+                conn = app.open_docket(db_path)
+                print()
+                for label, sql, params in [
+                    ("priority queue", "SELECT * FROM docket_cases WHERE status = ? AND deadline IS NOT NULL ORDER BY deadline LIMIT 25", ("open",)),
+                    ("receipt lookup", "SELECT * FROM docket_cases WHERE receipt_number = ?", (receipt,)),
+                ]:
+                    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                    print(f"{label}: " + " | ".join(row[-1] for row in plan))
+                conn.close()
+
+if __name__ == "__main__":
+    main()
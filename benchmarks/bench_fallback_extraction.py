@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+FALLBACK EXTRACTOR BENCHMARK
+============================
+Times the single-pass tokenizer behind UniversalUSCISAgent._fallback_extraction
+on synthetic full-form text of 20k-320k characters. It is compared against the
+previous implementation, reproduced below: seven re.finditer passes, a reversed
+copy of the preceding text for every orphan sub-item, and a 1,000-character
+rescan per match. The legacy extractor only read the first 20,000 characters,
+so it is timed both as shipped (capped) and uncapped on the same text. The
+per-character cost of the tokenizer should stay flat as the text grows.
+
+Run from the repository root:
+    python benchmarks/bench_fallback_extraction.py
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_PDFC  # noqa: E402  (module-level Streamlit calls run in bare mode)
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+TEXT_SIZES = [20_000, 40_000, 80_000, 160_000, 320_000]
+LEGACY_CAP = 20_000
+
+ITEM_BLOCKS = [
+    "{n}. Your Full Legal Name\na. Family Name (Last Name)\nb. Given Name (First Name)\nc. Middle Name\n",
+    "{n}. Mailing Address\n  a. Street Number and Name\n  b. Apt. Ste. Flr. Number\n  c. City or Town\n  d. State\n  e. ZIP Code\n",
+    "{n}. Are you filing this petition for a beneficiary who is in the United States?\nA. Yes\nB. No\n",
+    "{n}. Date of Birth (mm/dd/yyyy)\n",
+    "{n}.a. U.S. Social Security Number (if any)\n{n}.b. USCIS Online Account Number (if any)\n",
+    "Item Number {n}. Provide the beneficiary's current nonimmigrant status and the date it expires.\n",
+    "NOTE: USCIS may deny the petition if the evidence does not establish eligibility under 8 CFR 214.2. "
+    "See the instructions for more information.\n",
+]
+
+def build_form_text(chars):
+    """Synthetic form text of about the requested size with numbered items, sub-items and choices"""
+    blocks = []
+    size = 0
+    item = 1
+    part = 1
+    while size < chars:
+        if item % 25 == 1:
+            blocks.append(f"Part {part}. Information About Section {part}\n")
+            part += 1
+        block = ITEM_BLOCKS[item % len(ITEM_BLOCKS)].format(n=item)
+        blocks.append(block)
+        size += len(block)
+        item += 1
+    return "".join(blocks)
+
+def legacy_should_be_parent_field(label, text, position):
+    label_lower = label.lower()
+    indicators = ["full name", "legal name", "your name", "beneficiary name", "petitioner name",
+                  "address", "mailing address", "physical address", "home address", "current address",
+                  "contact information", "phone numbers"]
+    if any(indicator in label_lower for indicator in indicators):
+        return True
+    return bool(re.search(r'[a-z]\.\s+[A-Z]', text[position:position + 1000]))
+
+def legacy_fallback_extraction(agent, text, part_number, cap=LEGACY_CAP):
+    """The previous _fallback_extraction (the shared missing-parent and basic-rule passes are the current ones)"""
+    fields = []
+    seen_numbers = set()
+    pattern_list = [
+        (r'(\d+)\.\s+([^\n]{3,400})', 'main'),
+        (r'(\d+)\.([a-z])\.\s+([^\n]{3,300})', 'subfield'),
+        (r'(\d+)([a-z])\.\s+([^\n]{3,300})', 'subfield_compact'),
+        (r'Item\s+Number\s+(\d+)[.\s]*([^\n]{3,400})', 'item'),
+        (r'Question\s+(\d+)[.\s]*([^\n]{3,400})', 'question'),
+        (r'^([A-Z])\.\s+([^\n]{3,300})', 'letter'),
+        (r'^\s*([a-z])\.\s+([^\n]{3,200})', 'orphan_sub'),
+    ]
+    scanned = text[:cap] if cap else text
+
+    for pattern_str, pattern_type in pattern_list:
+        for match in re.finditer(pattern_str, scanned, re.IGNORECASE | re.MULTILINE):
+            if pattern_type in ('subfield', 'subfield_compact'):
+                number = f"{match.group(1)}.{match.group(2)}"
+                label = match.group(3).strip()
+                is_subfield, parent_number, letter = True, match.group(1), match.group(2)
+            elif pattern_type == 'orphan_sub':
+                letter = match.group(1)
+                label = match.group(2).strip()
+                parent_match = re.search(r'(\d+)\.\s+[^\n]+', text[:match.start()][::-1])
+                if not parent_match:
+                    continue
+                parent_number = parent_match.group(1)[::-1]
+                number = f"{parent_number}.{letter.lower()}"
+                is_subfield = True
+            else:
+                number = match.group(1)
+                label = match.group(2).strip()
+                is_subfield, parent_number, letter = False, "", ""
+
+            if number in seen_numbers:
+                continue
+            seen_numbers.add(number)
+            label = re.sub(r'[.\s]+$', '', re.sub(r'^[.\-–\s]+', '', re.sub(r'\s+', ' ', label).strip()))
+            if len(label) < 3:
+                continue
+
+            should_be_parent = legacy_should_be_parent_field(label, text, match.start())
+            fields.append(app_PDFC.USCISField(
+                number=number,
+                label=label,
+                field_type="parent" if should_be_parent else agent._detect_field_type(label),
+                part_number=part_number,
+                is_subfield=is_subfield,
+                is_parent=should_be_parent,
+                parent_number=parent_number,
+                subfield_letter=letter if is_subfield else "",
+                extraction_method="fallback_pattern",
+                field_pattern=pattern_type
+            ))
+
+    agent._create_missing_parents(fields, part_number)
+    agent._apply_basic_subfield_rules(fields, part_number)
+    return fields
+
+def time_call(func, *args, repeats=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    agent = app_PDFC.UniversalUSCISAgent.__new__(app_PDFC.UniversalUSCISAgent)
+
+    print(f"{'chars':>8} {'legacy 20k ms':>14} {'legacy full ms':>15} {'tokenizer ms':>13} {'ns/char':>8} "
+          f"{'legacy fields':>14} {'fields':>7} {'parents':>8} {'subfields':>10} {'choices':>8}")
+
+    for size in TEXT_SIZES:
+        text = build_form_text(size)
+        capped_time, _ = time_call(legacy_fallback_extraction, agent, text, 1)
+        full_time, legacy_fields = time_call(legacy_fallback_extraction, agent, text, 1, None, repeats=1)
+        token_time, fields = time_call(agent._fallback_extraction, text, 1)
+
+        print(f"{len(text):>8,} {capped_time * 1000:>14.1f} {full_time * 1000:>15.1f} {token_time * 1000:>13.1f} "
+              f"{token_time / len(text) * 1e9:>8.0f} {len(legacy_fields):>14,} {len(fields):>7,} "
+              f"{sum(f.is_parent for f in fields):>8,} {sum(f.is_subfield for f in fields):>10,} "
+              f"{sum(f.is_choice for f in fields):>8,}")
+
+if __name__ == "__main__":
+    main()
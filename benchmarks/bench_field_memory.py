@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+FIELD MEMORY BENCHMARK
+======================
+Measures how much memory a session holding 50 analyzed forms retains per
+field in app_PDFC.py. Each form is built from synthetic Claude JSON with
+10 parts of plain items, parent items with subfields, and questions with
+choices, through the same _build_universal_fields path process_pdf uses. The
+current slotted USCISField is compared against the previous layout, reproduced
+below: a regular dataclass with a __dict__, two fresh lists per field, a
+uuid4 string id and un-interned strings from the JSON.
+
+Run from the repository root:
+    python benchmarks/bench_field_memory.py
+"""
+
+import os
+import sys
+import gc
+import json
+import uuid
+import logging
+import tracemalloc
+from dataclasses import dataclass, field as dataclass_field
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_PDFC  # noqa: E402  (module-level Streamlit calls run in bare mode)
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+FORMS = 50
+PARTS_PER_FORM = 10
+ITEMS_PER_PART = 30
+
+@dataclass
+class LegacyFieldChoice:
+    letter: str
+    label: str
+    value: str = ""
+    selected: bool = False
+
+@dataclass
+class LegacyUSCISField:
+    number: str
+    label: str
+    field_type: str = "text"
+    part_number: int = 1
+    is_parent: bool = False
+    is_subfield: bool = False
+    is_choice: bool = False
+    parent_number: str = ""
+    subfield_letter: str = ""
+    subfields: List['LegacyUSCISField'] = dataclass_field(default_factory=list)
+    choices: List[LegacyFieldChoice] = dataclass_field(default_factory=list)
+    ai_reasoning: str = ""
+    confidence: float = 1.0
+    field_pattern: str = ""
+    value: str = ""
+    is_mapped: bool = False
+    db_object: str = ""
+    db_field: str = ""
+    in_questionnaire: bool = False
+    pdf_field_name: str = ""
+    page_number: int = 0
+    bbox: List[float] = dataclass_field(default_factory=list)
+    unique_id: str = dataclass_field(default_factory=lambda: str(uuid.uuid4())[:8])
+    extraction_method: str = "ai_agent"
+
+    # The builder now calls these; they are plain appends, as the old call sites were
+    def add_subfield(self, subfield):
+        self.subfields.append(subfield)
+
+    def add_choice(self, choice):
+        self.choices.append(choice)
+
+def part_response(part_number):
+    """Claude JSON for one part, parsed fresh so every string is a new object"""
+    items = []
+    for n in range(1, ITEMS_PER_PART + 1):
+        kind = n % 3
+        if kind == 0:
+            items.append({"number": str(n), "label": "Your Full Legal Name", "type": "parent", "pattern": "name_pattern",
+                          "reasoning": "Name fields are split into family, given and middle name",
+                          "subfields": [{"letter": "a", "label": "Family Name (Last Name)", "type": "text"},
+                                        {"letter": "b", "label": "Given Name (First Name)", "type": "text"},
+                                        {"letter": "c", "label": "Middle Name", "type": "text"}]})
+        elif kind == 1:
+            items.append({"number": str(n), "label": "Has the beneficiary ever been in the United States?",
+                          "type": "question", "pattern": "yes_no_question", "reasoning": "Yes/No question",
+                          "choices": [{"letter": "a", "label": "Yes"}, {"letter": "b", "label": "No"}]})
+        else:
+            items.append({"number": str(n), "label": "Date of Birth (mm/dd/yyyy)", "type": "date",
+                          "pattern": "date_field", "reasoning": "Single date entry"})
+    return json.loads(json.dumps({"part": part_number, "fields": items}))["fields"]
+
+def build_forms(agent):
+    forms = []
+    for form_number in range(FORMS):
+        form = app_PDFC.USCISForm(form_number="I-129", title=f"Petition {form_number}")
+        for part_number in range(1, PARTS_PER_FORM + 1):
+            fields = agent._build_universal_fields(part_response(part_number), part_number)
+            form.parts[part_number] = app_PDFC.FormPart(number=part_number, title=f"Part {part_number}", fields=fields)
+        forms.append(form)
+    return forms
+
+def measure(agent, field_class, choice_class):
+    current = (app_PDFC.USCISField, app_PDFC.FieldChoice)
+    app_PDFC.USCISField, app_PDFC.FieldChoice = field_class, choice_class
+    try:
+        gc.collect()
+        tracemalloc.start()
+        forms = build_forms(agent)
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        app_PDFC.USCISField, app_PDFC.FieldChoice = current
+    field_count = sum(len(part.fields) for form in forms for part in form.parts.values())
+    sample = forms[0].parts[1].fields[0]
+    return retained, peak, field_count, sample
+
+def main():
+    agent = app_PDFC.UniversalUSCISAgent.__new__(app_PDFC.UniversalUSCISAgent)
+
+    print(f"{FORMS} forms x {PARTS_PER_FORM} parts x {ITEMS_PER_PART} items (fields include subfields and choices)")
+    print(f"{'layout':>8} {'fields':>8} {'retained MB':>12} {'peak MB':>8} {'bytes/field':>12} {'instance B':>11} {'id':>10}")
+
+    results = {}
+    for name, field_class, choice_class in [("legacy", LegacyUSCISField, LegacyFieldChoice),
+                                            ("slotted", app_PDFC.USCISField, app_PDFC.FieldChoice)]:
+        retained, peak, field_count, sample = measure(agent, field_class, choice_class)
+        instance = sys.getsizeof(sample) + (sys.getsizeof(sample.__dict__) if hasattr(sample, "__dict__") else 0)
+        results[name] = retained / field_count
+        print(f"{name:>8} {field_count:>8,} {retained / 1e6:>12.2f} {peak / 1e6:>8.2f} {retained / field_count:>12.0f} "
+              f"{instance:>11} {sample.unique_id!r:>10}")
+
+    print(f"\nper-field footprint: {results['slotted'] / results['legacy']:.0%} of legacy "
+          f"(includes the shared FormPart index and form containers)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+PART SPAN INDEX BENCHMARK
+=========================
+Times part-text extraction in app_PDFC.py on synthetic USCIS form packets of
+25-100 pages. The single-pass PartSpanIndex plus one slice per part is
+compared against the previous per-part pattern search: two header regexes over
+the whole document, up to nine follow-up searches for the next part's header
+and a line-by-line truncation pass. Both must agree on where every part starts.
+
+Run from the repository root:
+    python benchmarks/bench_part_spans.py
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_PDFC  # noqa: E402  (module-level Streamlit calls run in bare mode)
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+PAGE_COUNTS = [25, 50, 100]
+PARTS = 10
+CHARS_PER_PAGE = 3000
+
+ITEM_LINES = [
+    "{n}. Your Full Legal Name",
+    "a. Family Name (Last Name)",
+    "b. Given Name (First Name)",
+    "{n}. Mailing Address",
+    "a. Street Number and Name",
+    "{n}. Are you filing this petition for a beneficiary who is in the United States? Yes No",
+    "{n}. Date of Birth (mm/dd/yyyy)",
+    "NOTE: If you need extra space to complete any item within this petition, see Part 11. Additional Information.",
+]
+
+def build_packet(pages):
+    """Synthetic form text with PARTS parts spread over the pages and continued headers"""
+    text = []
+    pages_per_part = max(1, pages // PARTS)
+    for page in range(pages):
+        part = min(PARTS, page // pages_per_part + 1)
+        first_page = page % pages_per_part == 0 and page // pages_per_part < PARTS
+        header = f"Part {part}. Information About Section {part}" + ("" if first_page else " (continued)")
+        lines = [f"=== PAGE {page + 1} ===", header]
+        item = 1
+        while sum(len(line) + 1 for line in lines) < CHARS_PER_PAGE:
+            lines.append(ITEM_LINES[item % len(ITEM_LINES)].format(n=item))
+            item += 1
+        lines.append("Form I-129 Edition 01/17/25 Page {0} of {1}".format(page + 1, pages))
+        text.append("\n".join(lines))
+    return "\n\n".join(text)
+
+def legacy_find_parts(text):
+    """Part header positions as the old extract_parts STEP 1 found them"""
+    positions = []
+    for pattern, flags in [
+        (r'(?:^|\n)\s*(Part\s+(\d+)\.?\s*([A-Z][^\n]{0,100}))', re.IGNORECASE | re.MULTILINE),
+        (r'(?:^|\n)\s*(PART\s+(\d+)\.?\s*([A-Z][^\n]{0,100}))', re.MULTILINE),
+    ]:
+        for match in re.finditer(pattern, text, flags):
+            positions.append((int(match.group(2)), match.start()))
+    return sorted(set(number for number, _ in positions))
+
+def legacy_part_text(full_text, part_number):
+    """Old _extract_part_text_enhanced fallback path, without the Streamlit messages"""
+    start_pos = -1
+    part_header = ""
+    for pattern in [rf"(?:^|\n)\s*(Part\s+{part_number}\.?\s*[A-Z][^\n]*)",
+                    rf"(?:^|\n)\s*(PART\s+{part_number}\.?\s*[A-Z][^\n]*)"]:
+        match = re.search(pattern, full_text, re.IGNORECASE | re.MULTILINE)
+        if match:
+            start_pos = match.start()
+            part_header = match.group(1).strip()
+            break
+    if start_pos == -1:
+        return ""
+
+    end_pos = len(full_text)
+    for next_part_num in range(part_number + 1, part_number + 10):
+        for pattern in [rf"(?:^|\n)\s*Part\s+{next_part_num}\.?\s*[A-Z]",
+                        rf"(?:^|\n)\s*PART\s+{next_part_num}\.?\s*[A-Z]"]:
+            search_start = start_pos + max(100, len(part_header))
+            match = re.search(pattern, full_text[search_start:], re.IGNORECASE | re.MULTILINE)
+            if match:
+                end_pos = search_start + match.start()
+                break
+        if end_pos < len(full_text):
+            break
+
+    clean_lines = []
+    for i, line in enumerate(full_text[start_pos:end_pos].split('\n')):
+        if i > 5 and re.match(r'^\s*Part\s+\d+\.?\s*[A-Z]', line, re.IGNORECASE):
+            break
+        clean_lines.append(line)
+    return '\n'.join(clean_lines)
+
+def legacy_extract_all(text):
+    return {number: legacy_part_text(text, number) for number in legacy_find_parts(text)}
+
+def indexed_extract_all(text):
+    span_index = app_PDFC.PartSpanIndex(text)
+    return {part["number"]: span_index.slice(text, part["number"]) for part in span_index.parts()}
+
+def time_call(func, *args, repeats=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    print(f"{'pages':>6} {'chars':>10} {'parts':>6} {'legacy ms':>10} {'index ms':>9} {'speedup':>8}")
+
+    for pages in PAGE_COUNTS:
+        text = build_packet(pages)
+        legacy_time, legacy_parts = time_call(legacy_extract_all, text)
+        index_time, indexed_parts = time_call(indexed_extract_all, text)
+
+        assert sorted(legacy_parts) == sorted(indexed_parts), (sorted(legacy_parts), sorted(indexed_parts))
+        for number, part_text in indexed_parts.items():
+            assert part_text.startswith(f"Part {number}."), number
+            assert text.find(legacy_parts[number].strip()) >= 0
+
+        print(f"{pages:>6} {len(text):>10,} {len(indexed_parts):>6} {legacy_time * 1000:>10.2f} "
+              f"{index_time * 1000:>9.2f} {legacy_time / index_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
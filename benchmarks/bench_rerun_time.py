@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+APP RERUN TIME BENCHMARK
+========================
+Times full script reruns of app.py with Streamlit's AppTest harness while the
+user stays on the first tab, which is what every widget interaction in the
+research, RFE and expert-letter tabs costs. It reports the median and best
+rerun time and how many markdown elements each rerun sends, so the static
+reference tabs can be measured before and after a change.
+
+Run from the repository root:
+    python benchmarks/bench_rerun_time.py [app_file] [reruns]
+"""
+
+import os
+import sys
+import time
+import logging
+import statistics
+
+from streamlit.testing.v1 import AppTest
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RERUNS = 30
+
+def main():
+    app_file = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else os.path.join(ROOT, "app.py")
+    reruns = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RERUNS
+
+    at = AppTest.from_file(app_file, default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - start
+    if at.exception:
+        raise SystemExit(f"App raised: {at.exception[0].value}")
+
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+
+    markdown_elements = len(at.markdown)
+    markdown_chars = sum(len(element.value) for element in at.markdown)
+
+    print(f"App: {os.path.relpath(app_file, ROOT)}")
+    print(f"First run:           {first_run * 1000:8.1f} ms")
+    print(f"Rerun median ({reruns}):   {statistics.median(timings) * 1000:8.1f} ms")
+    print(f"Rerun best:          {min(timings) * 1000:8.1f} ms")
+    print(f"Markdown per rerun:  {markdown_elements:8d} elements, {markdown_chars:,} chars")
+
+if __name__ == "__main__":
+    main()
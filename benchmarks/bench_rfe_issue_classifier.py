@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+RFE ISSUE CLASSIFIER BENCHMARK
+==============================
+Times the single-pass taxonomy automaton used by analyze_rfe_document on
+combined RFE texts of 50-500 pages. It compares the automaton against a
+per-keyword scan of the same taxonomy. The per-character cost of the
+automaton should stay flat as the text grows, and it should not depend on
+how many issue types the taxonomy holds.
+
+Run from the repository root:
+    python benchmarks/bench_rfe_issue_classifier.py
+"""
+
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402  (module-level Streamlit calls run in bare mode)
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+PAGE_SIZES = [50, 100, 250, 500]
+CHARS_PER_PAGE = 3000
+TAXONOMY_SCALES = [1, 2, 5, 10]
+
+RFE_PARAGRAPHS = [
+    "USCIS has reviewed the petition and the evidence of record. The evidence does not establish that the "
+    "proffered position qualifies as a specialty occupation under 8 CFR 214.2(h)(4)(iii)(A).",
+    "The petitioner has not demonstrated that the beneficiary possesses the required education and "
+    "experience. Submit a credential evaluation and experience letters from former employers.",
+    "The record does not establish an employer-employee relationship or the right to control the "
+    "beneficiary's work at the client site. Provide the statement of work and an itinerary.",
+    "Submit evidence of the petitioner's ability to pay the proffered wage, such as federal tax returns "
+    "and audited financial statements for the relevant years.",
+    "The certified Labor Condition Application lists a wage level and SOC code that do not correspond "
+    "to the duties described. Explain the occupational classification selected.",
+    "Your response must be received by the due date shown on this notice. Failure to respond will result "
+    "in a decision based on the current record. Receipt Number EAC2190012345.",
+]
+
+def build_rfe_text(pages):
+    """Synthetic combined RFE text of roughly the requested page count"""
+    page = ""
+    index = 0
+    while len(page) < CHARS_PER_PAGE:
+        page += RFE_PARAGRAPHS[index % len(RFE_PARAGRAPHS)] + "\n\n"
+        index += 1
+    return page * pages
+
+def per_keyword_scan(text, taxonomy):
+    """Reference implementation: one find loop per keyword"""
+    lowered = text.lower()
+    matches = 0
+    for issue in taxonomy:
+        for keyword in issue["keywords"]:
+            keyword = keyword.lower()
+            position = lowered.find(keyword)
+            while position != -1:
+                matches += 1
+                position = lowered.find(keyword, position + 1)
+    return matches
+
+def scale_taxonomy(taxonomy, factor):
+    """Grow the taxonomy with rarely-matching variant issue types"""
+    scaled = list(taxonomy)
+    for copy in range(1, factor):
+        for issue in taxonomy:
+            scaled.append({
+                "label": f"{issue['label']} (variant {copy})",
+                "keywords": [f"{keyword} variant{copy}" for keyword in issue["keywords"]]
+            })
+    return scaled
+
+def time_call(func, *args, repeats=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    taxonomy = app.load_issue_taxonomy()
+    automaton = app.IssueKeywordAutomaton(taxonomy)
+    keyword_count = len(automaton.keywords)
+
+    print(f"Taxonomy: {len(taxonomy)} issue types, {keyword_count} keywords, {len(automaton.goto)} automaton states")
+    print(f"{'pages':>6} {'chars':>11} {'automaton s':>12} {'ns/char':>9} {'per-keyword s':>14} {'matches':>9}")
+
+    for pages in PAGE_SIZES:
+        text = build_rfe_text(pages)
+        automaton_time, details = time_call(app.classify_rfe_issues, text, automaton)
+        keyword_time, keyword_matches = time_call(per_keyword_scan, text, taxonomy)
+        automaton_matches = sum(issue["match_count"] for issue in details)
+        assert automaton_matches == keyword_matches, (automaton_matches, keyword_matches)
+
+        print(f"{pages:>6} {len(text):>11,} {automaton_time:>12.3f} "
+              f"{automaton_time / len(text) * 1e9:>9.1f} {keyword_time:>14.3f} {automaton_matches:>9,}")
+
+    text = build_rfe_text(100)
+    print()
+    print(f"Taxonomy size scaling on a 100-page text ({len(text):,} chars)")
+    print(f"{'keywords':>9} {'states':>8} {'automaton s':>12} {'per-keyword s':>14}")
+
+    for factor in TAXONOMY_SCALES:
+        scaled = scale_taxonomy(taxonomy, factor)
+        scaled_automaton = app.IssueKeywordAutomaton(scaled)
+        automaton_time, _ = time_call(app.classify_rfe_issues, text, scaled_automaton)
+        keyword_time, _ = time_call(per_keyword_scan, text, scaled)
+        print(f"{len(scaled_automaton.keywords):>9,} {len(scaled_automaton.goto):>8,} "
+              f"{automaton_time:>12.3f} {keyword_time:>14.3f}")
+
+if __name__ == "__main__":
+    main()